@@ -18,9 +18,12 @@ let sortSettings = {
     direction: 'desc'
 };
 
-// 原始Docker列表数据
+// 原始Docker列表数据（已加载的各页）
 let originalDockerList = [];
 
+// 下一页的游标，没有更多运行记录时为null
+let nextCursor = null;
+
 // 页面加载完成后执行
 document.addEventListener('DOMContentLoaded', function() {
     console.log('页面已加载完成');
@@ -220,34 +223,50 @@ function hideDockerDetailSection() {
 }
 
 /**
- * 加载用户的Docker列表
+ * 加载用户的Docker列表（按创建时间分页）
  * @param {string} username - 用户名
+ * @param {boolean} append - 为true时加载下一页并追加到已加载的列表之后
  * @returns {Promise} - 加载完成的Promise
  */
-async function loadDockerList(username) {
+async function loadDockerList(username, append = false) {
     try {
         const dockerListElement = document.getElementById('dockerList');
         if (!dockerListElement) return;
         
-        // 显示加载中提示
-        dockerListElement.innerHTML = `
-            <div class="loading-overlay">
-                <div class="loading-spinner"></div>
-                <div class="loading-text">正在加载数据...</div>
-            </div>
-        `;
+        if (append) {
+            // 加载下一页时保留已显示的列表，只更新按钮状态
+            const loadMoreButton = document.getElementById('loadMoreButton');
+            if (loadMoreButton) {
+                loadMoreButton.disabled = true;
+                loadMoreButton.textContent = '正在加载...';
+            }
+        } else {
+            // 显示加载中提示
+            dockerListElement.innerHTML = `
+                <div class="loading-overlay">
+                    <div class="loading-spinner"></div>
+                    <div class="loading-text">正在加载数据...</div>
+                </div>
+            `;
+        }
         
-        // 调用API获取Docker列表
-        const response = await fetch(`${API_BASE_URL}/api/docker/list/${username}`);
+        // 调用API获取Docker列表，加载下一页时带上游标
+        const query = append && nextCursor ? `?cursor=${encodeURIComponent(nextCursor)}` : '';
+        const response = await fetch(`${API_BASE_URL}/api/docker/list/${username}${query}`);
         
         if (!response.ok) {
             throw new Error(`HTTP错误: ${response.status}`);
         }
         
-        const dockerList = await response.json();
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || '未知错误');
+        }
         
-        // 保存原始数据
-        originalDockerList = dockerList;
+        // 保存原始数据和下一页的游标
+        const page = result.data || [];
+        originalDockerList = append ? [...originalDockerList, ...page] : page;
+        nextCursor = result.nextCursor || null;
         
         // 排序并显示Docker列表
         sortAndDisplayDockerList();
@@ -423,6 +442,21 @@ function sortAndDisplayDockerList() {
     
     table.appendChild(tbody);
     dockerListElement.appendChild(table);
+    
+    // 还有更多运行记录时显示"加载更多"按钮
+    if (nextCursor) {
+        const loadMoreContainer = document.createElement('div');
+        loadMoreContainer.className = 'load-more';
+        const loadMoreButton = document.createElement('button');
+        loadMoreButton.id = 'loadMoreButton';
+        loadMoreButton.className = 'btn';
+        loadMoreButton.textContent = `加载更多（已加载 ${originalDockerList.length} 条）`;
+        loadMoreButton.addEventListener('click', function() {
+            loadDockerList(currentUsername, true);
+        });
+        loadMoreContainer.appendChild(loadMoreButton);
+        dockerListElement.appendChild(loadMoreContainer);
+    }
 }
 
 /**
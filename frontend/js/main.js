@@ -552,6 +552,7 @@ async function runScenario() {
         
         // 准备请求数据
         const requestData = {
+            wait: true,
             dockerName: currentScenario.image || 'ubuntu:latest',
             username: username,
             options: {
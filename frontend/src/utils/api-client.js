@@ -159,14 +159,22 @@ const ApiClient = {
   },
   
   /**
-   * 获取用户的Docker容器列表
+   * 按创建时间分页获取用户的Docker容器列表
    * @param {string} username - 用户名
-   * @returns {Promise<Object>} 包含Docker列表的响应对象
+   * @param {Object} params - 可选的分页和筛选参数 { limit, cursor, status, scenarioId, from, to, order }
+   * @returns {Promise<Object>} 包含Docker列表和下一页游标（nextCursor）的响应对象
    */
-  async getDockerList(username) {
+  async getDockerList(username, params = {}) {
     // showLoading('获取Docker列表中...', 'getDockerList');
     try {
-      const response = await fetch(`${getApiBaseUrl()}/docker/list/${username}`)
+      const query = new URLSearchParams()
+      for (const [key, value] of Object.entries(params)) {
+        if (value !== undefined && value !== null && value !== '') {
+          query.set(key, value)
+        }
+      }
+      const queryString = query.toString()
+      const response = await fetch(`${getApiBaseUrl()}/docker/list/${username}${queryString ? `?${queryString}` : ''}`)
       const result = await response.json()
       
       if (!result.success) {
@@ -272,6 +280,31 @@ const ApiClient = {
     }
   },
   
+  /**
+   * 获取运行快照：状态、日志游标之后新写入的内容和有变化的输出
+   * @param {string} dockerId - Docker容器ID
+   * @param {number} logCursor - 已读取的日志字节数
+   * @param {string} outputVersion - 已持有的输出版本
+   * @returns {Promise<Object>} 包含status、logs、output的响应对象
+   */
+  async getDockerSnapshot(dockerId, logCursor = 0, outputVersion = '') {
+    try {
+      const params = new URLSearchParams({ logCursor: String(logCursor), outputVersion })
+      const response = await fetch(`${getApiBaseUrl()}/docker/snapshot/${dockerId}?${params}`)
+      const result = await response.json()
+      
+      if (!result.success) {
+        console.error(`获取Docker ${dockerId} 快照失败:`, result.error || '未知错误')
+        return { success: false, error: result.error || '未知错误' }
+      }
+      
+      return result
+    } catch (error) {
+      console.error(`获取Docker ${dockerId} 快照失败:`, error)
+      return { success: false, error: error.message }
+    }
+  },
+  
   /**
    * 调整Docker容器的状态
    * @param {string} dockerId - Docker容器ID
@@ -331,6 +364,11 @@ const ApiClient = {
         return { success: false, error: result.error || '未知错误' }
       }
       
+      // 启动请求进入队列（202），轮询任务状态直到启动完成
+      if (response.status === 202 && result.data && result.data.runId) {
+        return await this.waitForRunJob(result.data.runId)
+      }
+      
       return result
     } catch (error) {
       console.error(`启动Docker ${dockerName} 失败:`, error)
@@ -340,6 +378,56 @@ const ApiClient = {
     }
   },
 
+  /**
+   * 获取启动任务的状态
+   * @param {string} runId - 启动任务ID
+   * @returns {Promise<Object>} 包含任务状态的响应对象
+   */
+  async getRunJob(runId) {
+    try {
+      const response = await fetch(`${getApiBaseUrl()}/docker/jobs/${runId}`)
+      const result = await response.json()
+      
+      if (!result.success) {
+        console.error(`获取启动任务 ${runId} 状态失败:`, result.error || '未知错误')
+        return { success: false, error: result.error || '未知错误' }
+      }
+      
+      return result
+    } catch (error) {
+      console.error(`获取启动任务 ${runId} 状态失败:`, error)
+      return { success: false, error: error.message }
+    }
+  },
+
+  /**
+   * 轮询启动任务直到启动完成或失败
+   * @param {string} runId - 启动任务ID
+   * @param {number} interval - 轮询间隔（毫秒）
+   * @param {number} timeout - 最长等待时间（毫秒）
+   * @returns {Promise<Object>} 启动成功时data中包含containerId
+   */
+  async waitForRunJob(runId, interval = 1000, timeout = 10 * 60 * 1000) {
+    const deadline = Date.now() + timeout
+    while (Date.now() < deadline) {
+      const result = await this.getRunJob(runId)
+      if (!result.success) {
+        return result
+      }
+      
+      const job = result.data
+      if (job.status === 'started') {
+        return { success: true, data: { ...job, containerId: job.dockerId } }
+      }
+      if (job.status === 'failed') {
+        return { success: false, error: job.error || '未知错误' }
+      }
+      
+      await new Promise(resolve => setTimeout(resolve, interval))
+    }
+    return { success: false, error: `启动任务 ${runId} 仍在排队中，请稍后在历史记录中查看` }
+  },
+
   /**
    * 获取全局配置
    * @returns {Promise<Object>} 包含全局配置的响应对象
@@ -0,0 +1,247 @@
+/**
+ * 准入控制模块
+ *
+ * 按运行的资源请求记录每台Docker主机已承诺的容量，启动前在容量足够的主机上预留：
+ * - 主机容量为 docker info 的CPU核数和内存乘以 ADMISSION_CPU_RATIO / ADMISSION_MEMORY_RATIO
+ * - 预留保存在Redis哈希 capacity:<host> 中（字段为预留ID，值为 "毫核,字节,预留时间"），
+ *   检查和写入在同一个Lua脚本中完成，多个后端副本之间不会超额承诺
+ * - 运行退出、被删除或启动失败时释放预留；重新启动的运行再次计入（不检查容量）
+ * - 所有主机都没有足够容量时，等待到超时（队列启动）或立即拒绝（同步启动）
+ * - 领导者定期回收没有对应运行中容器的预留（例如后端在启动过程中崩溃）
+ */
+const crypto = require('crypto');
+
+// 主机容量相对于实际CPU核数和内存的比例
+const CPU_RATIO = Number(process.env.ADMISSION_CPU_RATIO) || 1;
+const MEMORY_RATIO = Number(process.env.ADMISSION_MEMORY_RATIO) || 0.9;
+
+// 容量不足时重新尝试的间隔（毫秒）
+const RETRY_INTERVAL = 1000;
+
+// 主机容量的缓存时间（毫秒）
+const CAPACITY_TTL = 60000;
+
+// 回收预留的检查间隔（毫秒）和预留的宽限期（毫秒，启动中的运行还没有容器）
+const RECONCILE_INTERVAL = Number(process.env.ADMISSION_RECONCILE_INTERVAL) || 60000;
+const RESERVATION_GRACE = 10 * 60 * 1000;
+
+// 检查容量并预留：KEYS[1]=capacity:<host>，ARGV=预留ID、毫核、字节、CPU容量、内存容量、当前时间
+const RESERVE_SCRIPT = `
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+  return 1
+end
+local cpu, memory = 0, 0
+for _, value in ipairs(redis.call('HVALS', KEYS[1])) do
+  local c, m = string.match(value, '^(%d+),(%d+)')
+  cpu = cpu + tonumber(c)
+  memory = memory + tonumber(m)
+end
+if cpu + tonumber(ARGV[2]) > tonumber(ARGV[4]) or memory + tonumber(ARGV[3]) > tonumber(ARGV[5]) then
+  return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. ',' .. ARGV[3] .. ',' .. ARGV[6])
+return 1`;
+
+/**
+ * 主机容量的Redis键
+ * @param {string} host - 主机名称
+ * @returns {string}
+ */
+function capacityKey(host) {
+  return `capacity:${host}`;
+}
+
+const Admission = {
+    // 依赖，由API模块注入
+    hosts: null,
+    redisClient: null,
+    // 当前副本是否为领导者：() => boolean
+    isLeader: null,
+
+    // 主机容量缓存：host -> { cpu, memory, at }
+    capacities: new Map(),
+
+    timer: null,
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { hosts, redisClient, isLeader }
+     */
+    configure({ hosts, redisClient, isLeader }) {
+        this.hosts = hosts;
+        this.redisClient = redisClient;
+        this.isLeader = isLeader;
+    },
+
+    /**
+     * 主机的可承诺容量
+     * @param {string} host - 主机名称
+     * @returns {Promise<object>} { cpu, memory }，cpu为毫核，memory为字节
+     */
+    async capacity(host) {
+        const cached = this.capacities.get(host);
+        if (cached && Date.now() - cached.at < CAPACITY_TTL) {
+            return cached;
+        }
+        const info = await this.hosts.get(host).info();
+        const capacity = {
+            cpu: Math.floor(info.NCPU * 1000 * CPU_RATIO),
+            memory: Math.floor(info.MemTotal * MEMORY_RATIO),
+            at: Date.now()
+        };
+        this.capacities.set(host, capacity);
+        return capacity;
+    },
+
+    /**
+     * 在主机上预留容量
+     * @param {string} host - 主机名称
+     * @param {string} reservation - 预留ID
+     * @param {object} requests - { cpu, memory }
+     * @returns {Promise<boolean>} 是否预留成功
+     */
+    async reserve(host, reservation, requests) {
+        const { cpu, memory } = await this.capacity(host);
+        const reply = await this.redisClient.eval(RESERVE_SCRIPT, {
+            keys: [capacityKey(host)],
+            arguments: [reservation, String(requests.cpu), String(requests.memory), String(cpu), String(memory), String(Date.now())]
+        });
+        return reply === 1;
+    },
+
+    /**
+     * 选择有足够容量的主机并预留，按负载从低到高依次尝试
+     * @param {object} requests - 资源请求 { cpu, memory }
+     * @param {object} options - { wait } 所有主机都已满时的最长等待时间（毫秒），0表示立即拒绝
+     * @returns {Promise<object>} { host, reservation }
+     */
+    async admit(requests, { wait = 0 } = {}) {
+        const reservation = crypto.randomUUID();
+        const deadline = Date.now() + wait;
+        for (;;) {
+            for (const host of await this.hosts.rank()) {
+                try {
+                    if (await this.reserve(host, reservation, requests)) {
+                        return { host, reservation };
+                    }
+                } catch (error) {
+                    console.error(`在Docker主机 ${host} 上预留容量失败: ${error.message}`);
+                }
+            }
+            if (Date.now() + RETRY_INTERVAL > deadline) {
+                throw new Error(`所有Docker主机的容量已满（请求 CPU ${requests.cpu / 1000} 核、内存 ${Math.round(requests.memory / 1024 / 1024)}MiB），请稍后重试`);
+            }
+            await new Promise(resolve => setTimeout(resolve, RETRY_INTERVAL));
+        }
+    },
+
+    /**
+     * 释放预留（重复释放没有影响）
+     * @param {string} host - 主机名称
+     * @param {string} reservation - 预留ID
+     * @returns {Promise<void>}
+     */
+    async release(host, reservation) {
+        if (!reservation) return;
+        await this.redisClient.hDel(capacityKey(host || this.hosts.primaryName()), reservation);
+    },
+
+    /**
+     * 运行的容量预留所在的Redis键
+     * @param {object} runInfo - Redis中的docker信息（host）
+     * @returns {string}
+     */
+    capacityKeyFor(runInfo) {
+        return capacityKey(runInfo.host || this.hosts.primaryName());
+    },
+
+    /**
+     * 把运行的预留写入pipeline（重新启动的运行，不检查容量）
+     * @param {object} pipeline - Redis multi/pipeline
+     * @param {object} runInfo - Redis中的docker信息（host、reservation、cpuRequest、memoryRequest）
+     */
+    recommit(pipeline, runInfo) {
+        if (!runInfo.reservation || !runInfo.cpuRequest) return;
+        pipeline.hSetNX(this.capacityKeyFor(runInfo), runInfo.reservation,
+            `${runInfo.cpuRequest},${runInfo.memoryRequest || 0},${Date.now()}`);
+    },
+
+    /**
+     * 把运行的预留释放写入pipeline
+     * @param {object} pipeline - Redis multi/pipeline
+     * @param {object} runInfo - Redis中的docker信息（host、reservation）
+     */
+    releaseRun(pipeline, runInfo) {
+        if (!runInfo.reservation) return;
+        pipeline.hDel(this.capacityKeyFor(runInfo), runInfo.reservation);
+    },
+
+    /**
+     * 各主机的容量和已承诺的资源
+     * @returns {Promise<Array<object>>} [{ host, capacity: { cpu, memory }, committed: { cpu, memory }, runs }]
+     */
+    async usage() {
+        return Promise.all(this.hosts.names().map(async host => {
+            const values = Object.values(await this.redisClient.hGetAll(capacityKey(host)));
+            const committed = { cpu: 0, memory: 0 };
+            for (const value of values) {
+                const [cpu, memory] = value.split(',').map(Number);
+                committed.cpu += cpu;
+                committed.memory += memory;
+            }
+            let capacity = null;
+            try {
+                const { cpu, memory } = await this.capacity(host);
+                capacity = { cpu, memory };
+            } catch (error) {
+                console.error(`获取Docker主机 ${host} 的容量失败: ${error.message}`);
+            }
+            return { host, capacity, committed, runs: values.length };
+        }));
+    },
+
+    /**
+     * 开始定期回收预留（只会启动一次，只在领导者上执行）
+     */
+    start() {
+        if (this.timer) return;
+        this.timer = setInterval(() => {
+            if (!this.isLeader()) return;
+            this.reconcile().catch(error => console.error(`回收容量预留失败: ${error.message}`));
+        }, RECONCILE_INTERVAL);
+    },
+
+    /**
+     * 回收超过宽限期、且没有对应运行中容器的预留
+     */
+    async reconcile() {
+        for (const host of this.hosts.names()) {
+            const entries = await this.redisClient.hGetAll(capacityKey(host));
+            if (Object.keys(entries).length === 0) continue;
+
+            const containers = await this.hosts.get(host).listContainers({
+                filters: { label: ['workmate.managed'], status: ['running', 'paused'] }
+            });
+            const live = new Set();
+            if (containers.length > 0) {
+                const pipeline = this.redisClient.multi();
+                for (const item of containers) {
+                    pipeline.hGet(`docker:${item.Id}`, 'reservation');
+                }
+                for (const reservation of await pipeline.execAsPipeline()) {
+                    if (reservation) live.add(reservation);
+                }
+            }
+
+            for (const [reservation, value] of Object.entries(entries)) {
+                const reservedAt = Number(value.split(',')[2] || 0);
+                if (!live.has(reservation) && Date.now() - reservedAt > RESERVATION_GRACE) {
+                    await this.redisClient.hDel(capacityKey(host), reservation);
+                    console.log(`回收Docker主机 ${host} 上没有运行中容器的容量预留 ${reservation}`);
+                }
+            }
+        }
+    }
+};
+
+module.exports = Admission;
@@ -1,10 +1,27 @@
 /**
  * API 接口封装
  */
-const Docker = require('dockerode');
-const e = require('express');
 const { createClient } = require('redis');
 const schedule = require('node-schedule');
+const volumeReader = require('./volume-reader');
+const { mapWithConcurrency } = require('./concurrency');
+const containerState = require('./container-state');
+const imageManager = require('./image-manager');
+const runQueue = require('./run-queue');
+const runIndex = require('./run-index');
+const metrics = require('./metrics');
+const launchTrace = require('./launch-trace');
+const warmPool = require('./warm-pool');
+const runWorkspace = require('./run-workspace');
+const distributedLock = require('./distributed-lock');
+const leaderElection = require('./leader-election');
+const dockerHosts = require('./docker-hosts');
+const runResources = require('./run-resources');
+const admission = require('./admission');
+const runRegistry = require('./run-registry');
+const resultStore = require('./result-store');
+const logArchive = require('./log-archive');
+const logRetention = require('./log-retention');
 
 const API = {
     // 基础配置
@@ -13,21 +30,53 @@ const API = {
         gitlabUrl: '',
         apiUrl: '',
         accessToken: '',
-        controlProjectId: null
+        controlProjectId: null,
+        // 获取Docker列表时并发inspect容器的最大数量
+        inspectConcurrency: Number(process.env.DOCKER_INSPECT_CONCURRENCY) || 8,
+        // 清理过期运行时并发删除容器和卷的最大数量
+        cleanupConcurrency: Number(process.env.DOCKER_CLEANUP_CONCURRENCY) || 4,
+        // 清理时每批从索引中读取的过期运行数量
+        cleanupBatchSize: 200,
+        // 显式指定的共享卷名称，为空时从后端容器的挂载或compose标签自动确定
+        sharedVolumeName: process.env.SHARED_VOLUME_NAME || '',
+        // 快照接口单次返回的最大日志字节数，剩余部分由下一次轮询继续读取
+        snapshotLogChunk: 1024 * 1024,
+        // 队列启动时等待主机容量的最长时间（毫秒），同步启动在容量不足时立即失败
+        admissionQueueWait: Number(process.env.ADMISSION_QUEUE_WAIT) || 10 * 60 * 1000,
+        // 运行历史每页的默认条数和最大条数
+        historyPageSize: Number(process.env.HISTORY_PAGE_SIZE) || 50,
+        historyMaxPageSize: 200,
+        // 按状态筛选时，一次请求最多检查的运行数量（相对于每页条数的倍数）
+        historyScanFactor: 10,
+        // 运行结果保存到结果存储后立即删除已退出的容器和volume
+        reclaimVolumes: process.env.RESULT_RECLAIM_VOLUMES !== 'false',
+        // 保存运行结果时等待该容器的锁的最长时间（毫秒），以及领导者补存未保存结果的检查间隔（毫秒）
+        resultLockWait: 30000,
+        resultSweepInterval: Number(process.env.RESULT_SWEEP_INTERVAL) || 5 * 60 * 1000,
+        // 定时清理删除创建时间超过该天数的运行的容器、volume和记录（日志归档和结果文件按日志保留期限删除）
+        runRetentionDays: Number(process.env.RUN_RETENTION_DAYS) || 1,
+        // 不带分段参数读取日志时最多返回的末尾字节数
+        logReadLimit: Number(process.env.LOG_READ_LIMIT) || 4 * 1024 * 1024,
+        // 一次批量启动最多包含的运行数量
+        batchMaxItems: Number(process.env.BATCH_MAX_ITEMS) || 500
     },
     
-    // Docker相关依赖
+    // 主Docker主机的客户端（运行所在的主机见 dockerHosts.forRun）
     docker: null,
     
     // Redis客户端
     redisClient: null,
     
+    // 共享卷名称（进程内缓存，只在Docker报告卷不存在时重新确定）
+    sharedVolumeName: null,
+    sharedVolumeResolving: null,
+    
     // 初始化Redis客户端
     async initRedisClient() {
         if (!this.redisClient) {
-            this.redisClient = createClient({
+            this.redisClient = metrics.instrumentRedis(createClient({
                 url: 'redis://redis:6379'
-            });
+            }));
             
             try {
                 await this.redisClient.connect();
@@ -46,22 +95,22 @@ const API = {
             const fs = require('fs');
             const path = require('path');
             
+            // 日志文件名会拼接进镜像目录路径，只允许简单文件名
+            if (!/^[\w.\-]+$/.test(logFile)) {
+                throw new Error(`无效的日志文件名: ${logFile}`);
+            }
+            
             // 初始化Docker连接（如果尚未初始化）
             if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
-                });
+                this.docker = dockerHosts.get();
             }
             
             // 确保Redis客户端已初始化
             await this.initRedisClient();
             
             // 从Redis获取子docker对应的volume信息
-            const volumeKey = `docker:${dockerId}`;
-            const {volumeName, containerName} = await this.redisClient.hGetAll(volumeKey) ; 
-            // const volumeName = await this.redisClient.hget(volumeKey, 'volumeName');
-            // const containerName = await this.redisClient.hget(volumeKey, 'containerName') ; 
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
+            const {volumeName, containerName} = dockerInfo;
             
             if (!volumeName) {
                 throw new Error(`未找到Docker ${dockerId}对应的volume信息`);
@@ -69,100 +118,153 @@ const API = {
             
             console.log(`获取到Docker ${dockerId}的volume: ${volumeName}`);
             
+            // 已保存结果的运行从结果存储读取，否则由卷读取器把日志同步到共享卷中的镜像目录
+            const runFiles = await this.runFiles(dockerId, dockerInfo);
             
-            sharedVolumeName = await this.getSharedVolumeName() ; 
-            // 使用共享卷路径
-            const sharedMountsPath = '/shared-mounts';
-            const containerMountPath = path.join(sharedMountsPath, containerName);
-            const logDirPath = path.join(containerMountPath, 'logs');
+            // 读取同步后的日志文件
+            const logPath = runFiles.path('logs', logFile);
             
-            // 确保目录存在
-            if (!fs.existsSync(logDirPath)) {
-                fs.mkdirSync(logDirPath, { recursive: true, mode: 0o777 });
-                console.log(`创建日志目录: ${logDirPath}`);
+            // 检查文件是否存在
+            if (!fs.existsSync(logPath)) {
+                throw new Error(`日志文件 ${logPath} 不存在或尚未同步`);
             }
             
-            // 创建一个busybox容器来复制日志
-            try {
-                // 生成唯一的容器名称
-                const randomSuffix = Math.random().toString(36).substring(2, 8);
-                const busyboxName = `copy-logs-${dockerId}-${randomSuffix}`;
-                
-                console.log(`创建busybox容器 ${busyboxName} 来复制日志文件`);
-                
-                // 创建busybox容器
-                const busyboxContainer = await this.docker.createContainer({
-                    Image: 'busybox:latest',
-                    name: busyboxName,
-                    Cmd: ['sh', '-c', `cp -f /source/logs/${logFile} /dest/${containerName}/logs/ 2>/dev/null || echo "日志文件不存在"`],
-                    HostConfig: {
-                        Binds: [
-                            `${volumeName}:/source`,
-                            `${sharedVolumeName}:/dest`
-                        ],
-                        AutoRemove: true
-                    }
-                });
-                
-                // 启动busybox容器并等待完成
-                await busyboxContainer.start();
-                
-                // 等待容器完成复制操作
-                const stream = await busyboxContainer.wait();
-                const data = await stream;
-                
-                console.log(`Busybox容器退出状态码: ${data.StatusCode}`);
-                
-                // 即使状态码不为0也继续，因为可能是日志文件不存在的情况
-            } catch (copyError) {
-                console.error(`使用Busybox复制日志文件失败: ${copyError.message}`);
-                // 不抛出错误，继续尝试读取文件（如果存在）
+            // 只读取日志末尾不超过logReadLimit字节的完整行（已归档的日志边读边解压），完整日志通过分段读取接口获取
+            const { size } = await runFiles.stat('logs', logFile);
+            const start = Math.max(0, size - this.config.logReadLimit);
+            let content = await logArchive.readRange(logPath, start, size);
+            if (start > 0) {
+                content = content.subarray(content.indexOf(0x0a) + 1);
+            }
+            
+            const result = {
+                success: true,
+                data: content.toString('utf8')
+            };
+            if (start > 0) {
+                result.truncated = true;
+            }
+            return result;
+        } catch (error) {
+            console.error(`获取Docker日志失败: ${error.message}`);
+            return {
+                success: false,
+                error: error.message
+            };
+        }
+    },
+
+    // 打开Docker日志的流式读取（从since字节偏移量开始，运行中的容器会持续跟踪新写入的内容）
+    async openDockerLogStream(dockerId, logFile = 'run.log', since = 0) {
+        try {
+            const path = require('path');
+            const logStream = require('./log-stream');
+
+            // 日志文件名会拼接进镜像目录路径，只允许简单文件名
+            if (!/^[\w.\-]+$/.test(logFile)) {
+                throw new Error(`无效的日志文件名: ${logFile}`);
+            }
+
+            // 初始化Docker连接（如果尚未初始化）
+            if (!this.docker) {
+                this.docker = dockerHosts.get();
+            }
+
+            // 确保Redis客户端已初始化
+            await this.initRedisClient();
+
+            // 从Redis获取子docker对应的volume信息
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
+            if (!dockerInfo.volumeName) {
+                throw new Error(`未找到Docker ${dockerId}对应的volume信息`);
             }
+
+            // 卷读取器持续把日志同步到本地镜像目录（已保存结果的运行直接读结果存储），这里只需要跟踪本地文件
+            const runFiles = await this.runFiles(dockerId, dockerInfo);
+            const logPath = runFiles.path('logs', logFile);
+
+            // 子docker退出且读取器完成最终同步后，读到文件末尾即结束；已归档的日志边解压边推送
+            const isFinished = () => runFiles.isFinal();
+            const { stream, close } = logArchive.isCompressed(logPath)
+                ? logStream.readArchived(logPath, since)
+                : logStream.tailFile(logPath, since, isFinished);
+
+            return {
+                success: true,
+                data: { stream, follow: !isFinished(), close }
+            };
+        } catch (error) {
+            console.error(`打开Docker日志流失败: ${error.message}`);
+            return {
+                success: false,
+                error: error.message
+            };
+        }
+    },
+
+    // 获取运行中logs或outputs目录下某个文件的状态（用于条件请求，不读取文件内容）
+    async getDockerFileInfo(dockerId, dirName, fileName) {
+        try {
+            const fs = require('fs');
+            const path = require('path');
             
-            // 读取复制后的日志文件
-            const logPath = path.join(logDirPath, logFile);
+            // 文件名会拼接进镜像目录路径，只允许简单文件名
+            if (!/^[\w.\-]+$/.test(fileName)) {
+                throw new Error(`无效的文件名: ${fileName}`);
+            }
             
-            // 检查文件是否存在
-            if (!fs.existsSync(logPath)) {
-                throw new Error(`日志文件 ${logPath} 不存在或无法复制`);
+            // 确保Redis客户端已初始化
+            await this.initRedisClient();
+            
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
+            if (!dockerInfo.volumeName) {
+                throw new Error(`未找到Docker ${dockerId}对应的volume信息`);
             }
             
-            // 读取日志文件内容
-            const logContent = fs.readFileSync(logPath, 'utf8');
+            const runFiles = await this.runFiles(dockerId, dockerInfo);
+            const filePath = runFiles.path(dirName, fileName);
+            const stat = await runFiles.stat(dirName, fileName);
             
             return {
                 success: true,
-                data: logContent
+                data: {
+                    path: filePath,
+                    size: stat.size,
+                    mtimeMs: stat.mtimeMs,
+                    archived: logArchive.isCompressed(filePath),
+                    retention: stat.tier || null,
+                    scenarioId: dockerInfo.scenarioId || ''
+                }
             };
         } catch (error) {
-            console.error(`获取Docker日志失败: ${error.message}`);
             return {
                 success: false,
                 error: error.message
             };
         }
     },
-    
+
     // 读取Docker输出
     async getDockerOutput(dockerId, outputFile = 'output.json') {
         try {
             const fs = require('fs');
             const path = require('path');
             
+            // 输出文件名会拼接进镜像目录路径，只允许简单文件名
+            if (!/^[\w.\-]+$/.test(outputFile)) {
+                throw new Error(`无效的输出文件名: ${outputFile}`);
+            }
+            
             // 初始化Docker连接（如果尚未初始化）
             if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
-                });
+                this.docker = dockerHosts.get();
             }
             
             // 确保Redis客户端已初始化
             await this.initRedisClient();
             
             // 从Redis获取子docker对应的volume信息和scenarioID
-            const volumeKey = `docker:${dockerId}`;
-            const dockerInfo = await this.redisClient.hGetAll(volumeKey);
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
             const {volumeName, containerName, scenarioId} = dockerInfo;
             
             if (!volumeName) {
@@ -171,61 +273,15 @@ const API = {
             
             console.log(`获取到Docker ${dockerId}的volume: ${volumeName}, scenarioId: ${scenarioId || '无'}`);
             
-            sharedVolumeName = await this.getSharedVolumeName();
-            // 使用共享卷路径
-            const sharedMountsPath = '/shared-mounts';
-            const containerMountPath = path.join(sharedMountsPath, containerName);
-            const outputDirPath = path.join(containerMountPath, 'outputs');
-            
-            // 确保目录存在
-            if (!fs.existsSync(outputDirPath)) {
-                fs.mkdirSync(outputDirPath, { recursive: true, mode: 0o777 });
-                console.log(`创建输出目录: ${outputDirPath}`);
-            }
-            
-            // 创建一个busybox容器来复制输出文件
-            try {
-                // 生成唯一的容器名称
-                const randomSuffix = Math.random().toString(36).substring(2, 8);
-                const busyboxName = `copy-outputs-${dockerId}-${randomSuffix}`;
-                
-                console.log(`创建busybox容器 ${busyboxName} 来复制输出文件`);
-                
-                // 创建busybox容器
-                const busyboxContainer = await this.docker.createContainer({
-                    Image: 'busybox:latest',
-                    name: busyboxName,
-                    Cmd: ['sh', '-c', `cp -f /source/outputs/${outputFile} /dest/${containerName}/outputs/ 2>/dev/null || echo "输出文件不存在"`],
-                    HostConfig: {
-                        Binds: [
-                            `${volumeName}:/source`,
-                            `${sharedVolumeName}:/dest`
-                        ],
-                        AutoRemove: true
-                    }
-                });
-                
-                // 启动busybox容器并等待完成
-                await busyboxContainer.start();
-                
-                // 等待容器完成复制操作
-                const stream = await busyboxContainer.wait();
-                const data = await stream;
-                
-                console.log(`Busybox容器退出状态码: ${data.StatusCode}`);
-                
-                // 即使状态码不为0也继续，因为可能是输出文件不存在的情况
-            } catch (copyError) {
-                console.error(`使用Busybox复制输出文件失败: ${copyError.message}`);
-                // 不抛出错误，继续尝试读取文件（如果存在）
-            }
+            // 已保存结果的运行从结果存储读取，否则由卷读取器把输出同步到共享卷中的镜像目录
+            const runFiles = await this.runFiles(dockerId, dockerInfo);
             
-            // 读取复制后的输出文件
-            const outputPath = path.join(outputDirPath, outputFile);
+            // 读取同步后的输出文件
+            const outputPath = runFiles.path('outputs', outputFile);
             
             // 检查文件是否存在
             if (!fs.existsSync(outputPath)) {
-                throw new Error(`输出文件 ${outputPath} 不存在或无法复制`);
+                throw new Error(`输出文件 ${outputPath} 不存在或尚未同步`);
             }
             
             // 读取输出文件内容
@@ -235,12 +291,9 @@ const API = {
             let scenarioOutputs = null;
             if (scenarioId) {
                 try {
+                    // 从内存中的scenario目录获取已解析的配置
                     const scenarioManager = require('./scenario-manager');
-                    const scenarioYaml = await scenarioManager.getScenarioYaml(scenarioId);
-                    
-                    // 简单解析YAML以获取outputs配置
-                    const yaml = require('js-yaml');
-                    const scenarioConfig = yaml.load(scenarioYaml);
+                    const scenarioConfig = await scenarioManager.getScenario(scenarioId);
                     if (scenarioConfig && scenarioConfig.outputs) {
                         scenarioOutputs = scenarioConfig.outputs;
                     }
@@ -295,59 +348,54 @@ const API = {
         }
     },
     
-    // 获取用户的Docker列表
-    async getUserDockers(username) {
+    // 按创建时间分页获取用户的Docker列表
+    // query：{ limit, after, status, scenarioId, from, to, order }，after为上一页的游标（runIndex.decodeCursor的结果），
+    // status为状态列表，from/to为创建时间范围（毫秒）
+    async getUserDockers(username, query = {}) {
         try {
             // 初始化Docker连接（如果尚未初始化）
             if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
-                });
+                this.docker = dockerHosts.get();
             }
             // 确保Redis客户端已初始化
             await this.initRedisClient();
             
-            // 从Redis获取用户的Docker列表
-            const key = `user:${username}:dockers`;
-            const dockerIds = await this.redisClient.sMembers(key);
-            
-            // 如果没有找到Docker列表，返回空数组
-            if (!dockerIds || dockerIds.length === 0) {
-                return {
-                    success: true,
-                    data: []
-                };
-            }
-            
-            // 获取每个Docker的详细信息
-            const dockerDetails = [];
-            for (const dockerId of dockerIds) {
-                try {                 
-                    const dockerKey = `docker:${dockerId}`;
-                    const dockerInfo = await this.redisClient.hGetAll(dockerKey);
-                    const updatedInfo = await this.docker.getContainer(dockerId).inspect() ;    
-
-                    
-            // 检查退出状态
-                    let exitStatus = "Success";
-                    if (updatedInfo.State.Status === "exited" && updatedInfo.State.ExitCode !== 0) {
-                        exitStatus = "Failure";
-                    }
-                    
-                    if (Object.keys(dockerInfo).length > 0) {
-                        dockerDetails.push({...dockerInfo, status: updatedInfo.State.Status,
-                        exitStatus: exitStatus,
-                        exitCode: updatedInfo.State.ExitCode});
+            const limit = Math.min(query.limit || this.config.historyPageSize, this.config.historyMaxPageSize);
+            const statuses = query.status && query.status.length > 0 ? new Set(query.status) : null;
+            // 状态不在索引中，按状态筛选时最多检查一定数量的运行，页中的条数可能少于limit
+            const scanLimit = statuses ? limit * this.config.historyScanFactor : limit;
+            
+            const page = [];
+            let position = query.after || null;
+            let scanned = 0;
+            let hasMore = true;
+            while (page.length < limit && hasMore && scanned < scanLimit) {
+                const batch = await runIndex.pageForUser(this.redisClient, username, {
+                    scenarioId: query.scenarioId,
+                    from: query.from,
+                    to: query.to,
+                    order: query.order,
+                    after: position,
+                    count: Math.min(limit - page.length, scanLimit - scanned)
+                });
+                hasMore = batch.hasMore;
+                scanned += batch.entries.length;
+                
+                const details = await this.describeRuns(batch.entries.map(entry => entry.dockerId));
+                for (let index = 0; index < batch.entries.length; index++) {
+                    position = batch.entries[index];
+                    const detail = details[index];
+                    if (detail && (!statuses || statuses.has(detail.status))) {
+                        page.push(detail);
                     }
-                } catch (error) { 
-                    console.log(`获取${dockerId}容器当前状态的时候遇到错误：${error}`) ; 
                 }
             }
             
             return {
                 success: true,
-                data: dockerDetails
+                data: page,
+                // 下一页的游标，没有更多运行时为null
+                nextCursor: hasMore && position ? runIndex.encodeCursor(position) : null
             };
         } catch (error) {
             console.error('获取用户Docker列表失败:', error);
@@ -357,225 +405,598 @@ const API = {
             };
         }
     },
-
-    async getSharedVolumeName() {
-        let sharedVolumeName = '/shared-docker-mounts';
+    
+    // 读取一组运行的Docker信息和当前状态，运行信息或容器已不存在时对应位置为null
+    async describeRuns(dockerIds) {
+        // 一次管道请求取回所有Docker的详细信息
+        const dockerInfos = await runRegistry.getMany(this.redisClient, dockerIds);
+        
+        // 从容器状态缓存读取当前状态，缓存未命中时以有限并发数回退到inspect
+        const stateCache = await this.getContainerState();
+        return mapWithConcurrency(dockerIds, this.config.inspectConcurrency, async (dockerId, index) => {
+            const dockerInfo = dockerInfos[index];
+            if (!dockerInfo || Object.keys(dockerInfo).length === 0) {
+                return null;
+            }
+            
             try {
-                const volumes = await this.docker.listVolumes();
-                console.log('获取Docker volumes列表成功');
-                
-                // 查找包含"shared-docker-mounts"的volume
-                const sharedVolume = volumes.Volumes.find(volume => 
-                    volume.Name.includes('shared-docker-mounts'));
+                // 容器已被回收的运行使用保存的最终状态，不访问Docker
+                const state = runRegistry.storedState(dockerInfo) || await stateCache.get(dockerId);
+                if (!state) {
+                    throw new Error(`容器 ${dockerId} 不存在`);
+                }
                 
-                if (sharedVolume) {
-                    console.log(`找到共享卷: ${sharedVolume.Name}`);
-                    sharedVolumeName = sharedVolume.Name;
-                } else {
-                    console.log('未找到包含shared-docker-mounts的卷，使用默认路径');
+                // 检查退出状态
+                let exitStatus = "Success";
+                if (state.status === "exited" && state.exitCode !== 0) {
+                    exitStatus = "Failure";
                 }
-            } catch (error) {
-                console.error('获取Docker volumes列表失败:', error.message);
-            } 
-        return sharedVolumeName ; 
+                
+                return {...dockerInfo, status: state.status,
+                    exitStatus: exitStatus,
+                    exitCode: state.exitCode};
+            } catch (error) { 
+                console.log(`获取${dockerId}容器当前状态的时候遇到错误：${error}`) ; 
+                return null;
+            }
+        });
     },
-    // 启动Docker容器
-    async startDocker(imageName, options = {}, username = 'default', scenarioId = '') {
-        try {
-            // 初始化Docker连接（如果尚未初始化）
-            if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
+
+    // 获取共享卷名称（首次调用时确定并缓存）
+    async getSharedVolumeName() {
+        if (this.sharedVolumeName) {
+            return this.sharedVolumeName;
+        }
+        if (!this.sharedVolumeResolving) {
+            this.sharedVolumeResolving = this.resolveSharedVolume()
+                .then(name => {
+                    this.sharedVolumeName = name;
+                    console.log(`使用共享卷: ${name}`);
+                    return name;
+                })
+                .finally(() => {
+                    this.sharedVolumeResolving = null;
                 });
+        }
+        return this.sharedVolumeResolving;
+    },
+    
+    // 确定共享卷名称：显式配置 > 后端容器挂载在/shared-mounts的卷 > compose标签
+    async resolveSharedVolume() {
+        // 初始化Docker连接（如果尚未初始化）
+        if (!this.docker) {
+            this.docker = dockerHosts.get();
+        }
+        
+        const explicitName = this.config.sharedVolumeName;
+        if (explicitName) {
+            try {
+                await this.docker.getVolume(explicitName).inspect();
+            } catch (error) {
+                throw new Error(`配置的共享卷 ${explicitName} 不可用: ${error.message}`);
             }
-            
-            // 确保Redis客户端已初始化
-            await this.initRedisClient();
-            
-            const fs = require('fs');
-            const path = require('path');
-            const os = require('os');
-            
-            // 获取Docker volumes列表
-            
-            sharedVolumeName = await this.getSharedVolumeName() ; 
-            
-            //pull 容器
-            try { 
-                await this.docker.pull(imageName) ; 
-                await this.docker.pull('busybox:latest') ; 
-            } catch (error) { 
-                throw new Error(`无法拉取镜像 ${imageName}: ${error.message}`);
+            return explicitName;
+        }
+        
+        // 在compose中运行时主机名就是后端容器的ID
+        let composeProject = null;
+        try {
+            const self = await this.docker.getContainer(require('os').hostname()).inspect();
+            const mount = (self.Mounts || []).find(item =>
+                item.Type === 'volume' && item.Destination === '/shared-mounts');
+            if (mount) {
+                return mount.Name;
+            }
+            composeProject = (self.Config.Labels || {})['com.docker.compose.project'] || null;
+        } catch (error) {
+            console.log(`无法通过后端容器确定共享卷，改用compose标签查找: ${error.message}`);
+        }
+        
+        const labels = ['com.docker.compose.volume=shared-docker-mounts'];
+        if (composeProject) {
+            labels.push(`com.docker.compose.project=${composeProject}`);
+        }
+        const { Volumes: volumes } = await this.docker.listVolumes({ filters: { label: labels } });
+        if (!volumes || volumes.length === 0) {
+            throw new Error('找不到带有compose标签的shared-docker-mounts卷，请通过SHARED_VOLUME_NAME指定');
+        }
+        if (volumes.length > 1) {
+            throw new Error(`找到多个shared-docker-mounts卷（${volumes.map(volume => volume.Name).join(', ')}），请通过SHARED_VOLUME_NAME指定`);
+        }
+        return volumes[0].Name;
+    },
+    
+    // Docker报告卷不存在时重新确定共享卷，返回是否值得重试
+    async revalidateSharedVolume(error) {
+        if (!this.sharedVolumeName || !/no such volume/i.test(error.message || '')) {
+            return false;
+        }
+        const previousName = this.sharedVolumeName;
+        this.sharedVolumeName = null;
+        const currentName = await this.getSharedVolumeName();
+        console.log(`共享卷已重新确定: ${previousName} -> ${currentName}`);
+        return true;
+    },
+    
+    // 启动自检：确定共享卷，失败时抛出错误
+    async initSharedVolume() {
+        return this.getSharedVolumeName();
+    },
+
+    // 获取卷读取器（确保Docker和Redis连接以及读取器依赖的容器状态缓存已初始化）
+    async getVolumeReader() {
+        await this.getContainerState();
+        
+        volumeReader.configure({
+            hosts: dockerHosts,
+            redisClient: this.redisClient,
+            getSharedVolumeName: () => this.getSharedVolumeName(),
+            revalidateSharedVolume: (error) => this.revalidateSharedVolume(error),
+            onFinalized: (runInfo) => this.storeRunResults(runInfo.containerId)
+        });
+        return volumeReader;
+    },
+    
+    // 运行的日志和输出文件：已保存结果的运行从日志归档和结果存储读取，否则由卷读取器同步到本地镜像目录
+    // 返回 { path(dirName, fileName), stat(dirName, fileName), isFinal() }
+    // 归档的日志是压缩文件，stat返回解压后的大小，内容通过log-archive模块的读取函数读取
+    async runFiles(dockerId, dockerInfo) {
+        const fs = require('fs');
+        const path = require('path');
+        const files = runRegistry.storedResults(dockerInfo);
+        if (files) {
+            const logs = runRegistry.storedLogs(dockerInfo) || {};
+            const archived = (dirName, fileName) => (dirName === 'logs' ? logs[fileName] : null);
+            // 清单中没有的文件返回存储中一个不存在的路径，调用方按文件不存在处理
+            const filePath = (dirName, fileName) => {
+                const entry = archived(dirName, fileName);
+                if (entry) {
+                    return logArchive.filePath(dockerId, entry);
+                }
+                return resultStore.filePath(files, dirName, fileName)
+                    || path.join(resultStore.STORE_PATH, 'missing', dirName, fileName);
+            };
+            return {
+                path: filePath,
+                stat: async (dirName, fileName) => {
+                    const entry = archived(dirName, fileName);
+                    if (entry) {
+                        // 归档文件不会原地修改，转入下一个保留级别时写入新文件
+                        return { size: entry.size, mtimeMs: Date.parse(entry.archivedAt), tier: entry.tier };
+                    }
+                    return fs.promises.stat(filePath(dirName, fileName));
+                },
+                isFinal: () => true
+            };
+        }
+        const reader = await this.getVolumeReader();
+        const containerMountPath = await reader.ensureSynced({ containerId: dockerId, ...dockerInfo });
+        return {
+            path: (dirName, fileName) => path.join(containerMountPath, dirName, fileName),
+            stat: (dirName, fileName) => fs.promises.stat(path.join(containerMountPath, dirName, fileName)),
+            isFinal: () => reader.isFinal(dockerInfo.containerName)
+        };
+    },
+    
+    // 运行退出并完成最终同步后，把日志压缩归档、输出保存到结果存储，之后删除本地镜像目录并回收容器和volume
+    // 持有该容器的锁，与状态调整和清理互斥；等待锁超时后抛出错误，由领导者定期补存（storePendingResults）
+    async storeRunResults(dockerId) {
+        const fs = require('fs');
+        const path = require('path');
+        await this.initRedisClient();
+        return distributedLock.withLock(this.redisClient, `docker:${dockerId}`, async () => {
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
+            if (!dockerInfo.containerName || dockerInfo.resultsStoredAt) {
+                return;
+            }
+            // 确认容器仍处于退出状态（可能刚被重新启动）
+            const stateCache = await this.getContainerState();
+            const state = await stateCache.inspect(dockerId);
+            if (!state || (state.status !== 'exited' && state.status !== 'dead')) {
+                return;
             }
-                       
-            const alphaNumeric = imageName.replace(/[^a-zA-Z0-9\-]/g, '');
-            const randomSuffix = Math.random().toString(36).substring(2, 12);
-            const containerName = `${alphaNumeric}-${randomSuffix}`;
             
-            // 使用共享卷路径
-            const sharedMountsPath = '/shared-mounts';
+            const reader = await this.getVolumeReader();
+            const mirrorDir = reader.mirrorPath(dockerInfo.containerName);
+            const files = await resultStore.capture(mirrorDir);
+            const logs = await logArchive.archive(dockerId, path.join(mirrorDir, 'logs'));
+            if (!(await runRegistry.storeResults(this.redisClient, dockerId, files, logs, state, mirrorDir))) {
+                // 运行已被删除
+                await logArchive.remove(dockerId);
+                return;
+            }
+            const logSize = Object.values(logs).reduce((sum, entry) => sum + entry.size, 0);
+            const storedSize = Object.values(logs).reduce((sum, entry) => sum + entry.storedSize, 0);
+            console.log(`运行 ${dockerId} 的 ${Object.keys(files).length} 个输出文件已保存到结果存储，` +
+                `${Object.keys(logs).length} 个日志文件已压缩归档（${logSize} -> ${storedSize} 字节）`);
             
-            // 第一步：在主docker的volume中，对应子docker的文件夹中，把需要mount到子docker的内容准备好
-            // 为当前容器创建专属目录
-            const containerMountPath = path.join(sharedMountsPath, containerName);
-            const logDirPath = path.join(containerMountPath, 'logs');
-            const inputDirPath = path.join(containerMountPath, 'input');
-            const outputDirPath = path.join(containerMountPath, 'outputs');
+            // 之后的读取都由结果存储提供，本地镜像目录不再需要
+            await fs.promises.rm(mirrorDir, { recursive: true, force: true });
             
-            // 确保目录存在，添加适当的权限设置
-            try {
-                if (!fs.existsSync(containerMountPath)) {
-                    fs.mkdirSync(containerMountPath, { recursive: true, mode: 0o777 });
-                    console.log(`创建容器挂载目录: ${containerMountPath}`);
-                }
-                
-                if (!fs.existsSync(logDirPath)) {
-                    fs.mkdirSync(logDirPath, { recursive: true, mode: 0o777 });
-                    console.log(`创建日志目录: ${logDirPath}`);
-                }
-                
-                if (!fs.existsSync(inputDirPath)) {
-                    fs.mkdirSync(inputDirPath, { recursive: true, mode: 0o777 });
-                    console.log(`创建输入目录: ${inputDirPath}`);
+            if (this.config.reclaimVolumes) {
+                await this.reclaimRun(dockerId, dockerInfo);
+            }
+            return true;
+        }, { ttl: 60000, wait: this.config.resultLockWait });
+    },
+    
+    // 补存已完成最终同步、但结果没有保存的运行（保存时锁被占用或后端在保存途中重启）
+    // 只检查保留期限内结束的运行，更早的运行会被定时清理删除
+    async storePendingResults() {
+        await this.initRedisClient();
+        const since = Date.now() - this.config.runRetentionDays * 24 * 60 * 60 * 1000;
+        let stored = 0;
+        for (let offset = 0; ; offset += this.config.cleanupBatchSize) {
+            const dockerIds = await this.redisClient.zRange(runIndex.FINISHED_INDEX, since, '+inf', {
+                BY: 'SCORE',
+                LIMIT: { offset, count: this.config.cleanupBatchSize }
+            });
+            if (dockerIds.length === 0) {
+                break;
+            }
+            const runInfos = await runRegistry.getMany(this.redisClient, dockerIds);
+            for (const [index, runInfo] of runInfos.entries()) {
+                if (!runInfo.readerFinalizedAt || runInfo.resultsStoredAt || runInfo.reclaimedAt) {
+                    continue;
                 }
-                
-                if (!fs.existsSync(outputDirPath)) {
-                    fs.mkdirSync(outputDirPath, { recursive: true, mode: 0o777 });
-                    console.log(`创建输出目录: ${outputDirPath}`);
+                try {
+                    if (await this.storeRunResults(dockerIds[index])) {
+                        stored++;
+                    }
+                } catch (error) {
+                    console.error(`补存运行 ${dockerIds[index]} 的结果失败: ${error.message}`);
                 }
-            } catch (dirError) {
-                console.error(`创建目录失败: ${dirError.message}`);
-                throw new Error(`无法创建必要的目录: ${dirError.message}`);
             }
-            
-            // 处理输入数据
-            if (options.inputs) {
-                // 写入输入数据到共享卷中的文件
-                const inputFilePath = path.join(inputDirPath, 'input.json');
-                fs.writeFileSync(inputFilePath, options.inputs);
-                console.log(`写入输入数据到: ${inputFilePath}`);
+        }
+        if (stored > 0) {
+            console.log(`已补存 ${stored} 个运行的结果`);
+        }
+        return stored;
+    },
+    
+    // 开始定期补存未保存的运行结果（由领导者执行）
+    initResultSweep() {
+        if (this.resultSweepTimer) return;
+        this.resultSweepTimer = setInterval(() => {
+            if (!leaderElection.isLeader()) return;
+            this.storePendingResults().catch(error => console.error(`补存运行结果失败: ${error.message}`));
+        }, this.config.resultSweepInterval);
+    },
+    
+    // 删除已保存结果的运行的容器、卷读取器和volume，运行记录和结果保留到过期清理
+    async reclaimRun(dockerId, dockerInfo) {
+        // 先记录回收，状态查询从此使用保存的最终状态，不会在删除容器期间报告容器不存在
+        await runRegistry.markReclaimed(this.redisClient, dockerId);
+        const docker = dockerHosts.forRun(dockerInfo);
+        const reader = await this.getVolumeReader();
+        await reader.release(dockerInfo);
+        try {
+            await docker.getContainer(dockerId).remove({ force: true });
+        } catch (removeError) {
+            if (removeError.statusCode !== 404) {
+                throw removeError;
             }
-            
-            // 第二步：创建一个临时的volume，volume的名字就用volume+子docker的id
-            const tempVolumeName = `volume-${containerName}`;
+        }
+        if (dockerInfo.volumeName) {
             try {
-                await this.docker.createVolume({
-                    Name: tempVolumeName,
-                    Driver: 'local'
-                });
-                console.log(`创建临时卷成功: ${tempVolumeName}`);
-                
-                // 将临时卷信息存储到Redis
-                const volumeKey = `docker:${containerName}:volume`;
-                await this.redisClient.set(volumeKey, tempVolumeName);
-                console.log(`临时卷信息已存储到Redis: ${volumeKey} -> ${tempVolumeName}`);
+                await docker.getVolume(dockerInfo.volumeName).remove();
             } catch (volumeError) {
-                console.error(`创建临时卷失败: ${volumeError.message}`);
-                throw new Error(`无法创建临时卷: ${volumeError.message}`);
+                console.log(`回收卷时出现非致命错误: ${volumeError.message}`);
             }
-            
-            // 第三步：创建一个busybox超小型docker，把主docker的volume和临时volume都mount到busybox，把需要mount的内容复制过去
-            try {
-                
-                // 创建busybox容器
-                const busyboxContainer = await this.docker.createContainer({
-                    Image: 'busybox:latest',
-                    name: `copy-to-volume-${containerName}`,
-                    Cmd: ['sh', '-c', `cp -r /source/${containerName}/* /dest/ && chmod -R 777 /dest/`],
-                    HostConfig: {
-                        Binds: [
-                            `${sharedVolumeName}:/source`,
-                            `${tempVolumeName}:/dest`
-                        ],
-                        AutoRemove: true
-                    }
-                });
-                
-                // 启动busybox容器并等待完成
-                await busyboxContainer.start();
-                
-                // 等待容器完成复制操作
-                const stream = await busyboxContainer.wait();
-                const data = await stream;
-                
-                if (data.StatusCode !== 0) {
-                    throw new Error(`Busybox容器退出状态码非0: ${data.StatusCode}`);
-                }
-                
-                console.log(`Busybox容器成功将文件从共享卷复制到临时卷`);
-            } catch (copyError) {
-                console.error(`使用Busybox复制文件失败: ${copyError.message}`);
-                throw new Error(`无法复制文件到临时卷: ${copyError.message}`);
+        }
+        console.log(`运行 ${dockerId} 的容器和卷 ${dockerInfo.volumeName} 已回收`);
+    },
+
+    // 接管后端重启前已存在的卷读取器
+    async initVolumeReaders() {
+        const reader = await this.getVolumeReader();
+        return reader.adopt();
+    },
+
+    // 获取容器状态缓存（确保Docker和Redis连接已初始化）
+    async getContainerState() {
+        // 初始化Docker连接（如果尚未初始化）
+        if (!this.docker) {
+            this.docker = dockerHosts.get();
+        }
+        
+        // 确保Redis客户端已初始化
+        await this.initRedisClient();
+        
+        containerState.configure({
+            hosts: dockerHosts,
+            redisClient: this.redisClient
+        });
+        return containerState;
+    },
+
+    // 获取镜像管理器（确保Docker连接已初始化）
+    getImageManager() {
+        // 初始化Docker连接（如果尚未初始化）
+        if (!this.docker) {
+            this.docker = dockerHosts.get();
+        }
+        
+        imageManager.configure({ hosts: dockerHosts });
+        return imageManager;
+    },
+
+    // 订阅Docker事件流，启动容器状态缓存
+    async initContainerState() {
+        const stateCache = await this.getContainerState();
+        stateCache.on('change', (containerId, state) => {
+            this.indexRunState(containerId, state).catch(error => {
+                console.error(`更新运行 ${containerId} 的时间索引失败: ${error.message}`);
+            });
+        });
+        await stateCache.start();
+    },
+
+    // 容器结束或重新运行时更新运行的结束时间索引和容量预留
+    async indexRunState(dockerId, state) {
+        await runRegistry.applyState(this.redisClient, dockerId, state);
+    },
+
+    // 为索引建立之前的历史运行回填时间索引（只执行一次）
+    async initRunIndex() {
+        await this.initRedisClient();
+        const indexed = await runIndex.backfill(this.redisClient);
+        if (indexed > 0) {
+            console.log(`运行时间索引回填完成，共 ${indexed} 个运行`);
+        }
+    },
+    // 获取启动队列（确保Redis连接已初始化）
+    async getRunQueue() {
+        // 确保Redis客户端已初始化
+        await this.initRedisClient();
+        
+        runQueue.configure({
+            redisClient: this.redisClient,
+            launch: ({ dockerName, options, username, scenarioId, pullPolicy }) =>
+                this.startDocker(dockerName, options, username, scenarioId,
+                    { admissionWait: this.config.admissionQueueWait, pullPolicy })
+        });
+        return runQueue;
+    },
+
+    // 启动处理启动队列的worker池
+    async initRunQueue() {
+        const queue = await this.getRunQueue();
+        await queue.start();
+    },
+
+    // 参与领导者选举，只有领导者执行定时清理任务
+    async initLeaderElection() {
+        await this.initRedisClient();
+        leaderElection.configure({ redisClient: this.redisClient });
+        await leaderElection.start();
+    },
+
+    // 退出领导者选举，让其他副本立即接任
+    async stopLeaderElection() {
+        await leaderElection.stop();
+    },
+
+    // 获取准入控制（确保Redis连接已初始化）
+    async getAdmission() {
+        await this.initRedisClient();
+        admission.configure({
+            hosts: dockerHosts,
+            redisClient: this.redisClient,
+            isLeader: () => leaderElection.isLeader()
+        });
+        return admission;
+    },
+
+    // 开始定期回收容量预留
+    async initAdmission() {
+        const controller = await this.getAdmission();
+        controller.start();
+    },
+
+    // 开始定期执行日志归档的保留期限（由领导者执行）
+    async initLogRetention() {
+        await this.initRedisClient();
+        logRetention.configure({
+            redisClient: this.redisClient,
+            isLeader: () => leaderElection.isLeader()
+        });
+        logRetention.start();
+    },
+
+    // 获取各Docker主机的容量和已承诺的资源
+    async getCapacity() {
+        try {
+            const controller = await this.getAdmission();
+            return {
+                success: true,
+                data: await controller.usage()
+            };
+        } catch (error) {
+            console.error('获取主机容量失败:', error.message);
+            return {
+                success: false,
+                error: `获取主机容量失败: ${error.message}`
+            };
+        }
+    },
+
+    // 获取预热池（确保Docker和Redis连接已初始化）
+    async getWarmPool() {
+        // 确保Redis客户端已初始化
+        await this.initRedisClient();
+        
+        const images = this.getImageManager();
+        const scenarioManager = require('./scenario-manager');
+        warmPool.configure({
+            docker: this.docker,
+            redisClient: this.redisClient,
+            ensureImage: (imageName, policy) => images.ensureImage(imageName, policy),
+            listScenarios: () => scenarioManager.getScenarioConfigs()
+        });
+        return warmPool;
+    },
+
+    // 核对并开始后台补充预热池
+    async initWarmPool() {
+        const pool = await this.getWarmPool();
+        await pool.start();
+    },
+
+    // 把Docker启动请求加入队列，立即返回任务信息
+    async enqueueDocker(imageName, options = {}, username = 'default', scenarioId = '') {
+        try {
+            const queue = await this.getRunQueue();
+            const job = await queue.enqueue({ dockerName: imageName, options, username, scenarioId });
+            console.log(`启动请求已加入队列: ${job.runId} (${imageName}, 用户 ${username})`);
+            return {
+                success: true,
+                data: job
+            };
+        } catch (error) {
+            console.error('加入启动队列失败:', error.message);
+            return {
+                success: false,
+                error: `加入启动队列失败: ${error.message}`
+            };
+        }
+    },
+
+    // 把同一个scenario的一组输入作为一个批次加入启动队列，立即返回批次信息
+    // 各运行共用的准备只有读取scenario配置；镜像由各运行启动时按scenario的拉取策略确认
+    async enqueueDockerBatch(imageName, { inputs, settings } = {}, username = 'default', scenarioId = '') {
+        try {
+            if (!Array.isArray(inputs) || inputs.length === 0) {
+                throw new Error('inputs必须为非空数组');
+            }
+            if (inputs.length > this.config.batchMaxItems) {
+                throw new Error(`一次最多启动 ${this.config.batchMaxItems} 个运行`);
             }
             
-            // 创建绑定列表
-            const binds = [`${tempVolumeName}:/workmate`];
+            let scenarioConfig = null;
+            if (scenarioId) {
+                const scenarioManager = require('./scenario-manager');
+                scenarioConfig = await scenarioManager.getScenario(scenarioId);
+            }
+            const pullPolicy = scenarioConfig && scenarioConfig.docker && scenarioConfig.docker.imagePullPolicy;
+            
+            // 不在请求中等待拉取镜像：各运行启动时按scenario的拉取策略确认镜像，同时启动的运行共享同一次拉取
+            const queue = await this.getRunQueue();
+            const batch = await queue.enqueueBatch({
+                dockerName: imageName,
+                // 与单个启动一样写入input/input.json，对象按JSON保存
+                inputs: inputs.map(input => (typeof input === 'string' ? input : JSON.stringify(input))),
+                settings,
+                username,
+                scenarioId,
+                pullPolicy
+            });
+            console.log(`批量启动已加入队列: ${batch.batchId} (${imageName}, ${inputs.length} 个运行, 用户 ${username})`);
+            return {
+                success: true,
+                data: batch
+            };
+        } catch (error) {
+            console.error('批量启动加入队列失败:', error.message);
+            return {
+                success: false,
+                error: `批量启动加入队列失败: ${error.message}`
+            };
+        }
+    },
 
-            let container;
+    // 查询批量启动的汇总进度和各运行的结果
+    async getRunBatch(batchId) {
+        try {
+            const queue = await this.getRunQueue();
+            const batch = await queue.getBatch(batchId);
+            if (!batch) {
+                return {
+                    success: false,
+                    error: `批量启动 ${batchId} 不存在`
+                };
+            }
+            return {
+                success: true,
+                data: batch
+            };
+        } catch (error) {
+            console.error('获取批量启动状态失败:', error.message);
+            return {
+                success: false,
+                error: `获取批量启动状态失败: ${error.message}`
+            };
+        }
+    },
 
-            //createContainer
-            try {
-                // 生成容器名称：从镜像名称中提取字母和数字，并添加随机后缀
-                
-                // 创建容器配置
-                const containerConfig = {
-                    Image: imageName,
-                    name: containerName,
-                    Tty: true,
-                    HostConfig: {
-                        Binds: binds,
-                        NetworkMode: 'host',
-                    }
+    // 查询启动任务状态
+    async getRunJob(runId) {
+        try {
+            const queue = await this.getRunQueue();
+            const job = await queue.getJob(runId);
+            if (!job) {
+                return {
+                    success: false,
+                    error: `启动任务 ${runId} 不存在`
                 };
-                
-                // 如果有环境变量设置，添加到配置中
-                if (options.settings) {
-                    const env = [];
-                    for (const [key, value] of Object.entries(options.settings)) {
-                        env.push(`${key.toUpperCase()}=${value}`);
-                    }
-                    containerConfig.Env = env;
-                }
-            
-                // console.log(containerConfig.Env) ; 
-                // 创建容器
-                container = await this.docker.createContainer(containerConfig);
-            } catch (error) {
-                throw new Error(`创建容器遇到错误:${error.message}`) ; 
-            } 
-            
-            // 获取容器ID
-            await container.start();
-            
-            // 获取最新容器信息
-            
-            const updatedInfo = await container.inspect();
-            const dockerId = updatedInfo.Id;
-            
-            // 创建Docker信息对象
-            const dockerInfo = {
-                containerId: updatedInfo.Id,
-                containerName: containerName,
-                name: imageName,
-                status: updatedInfo.State.Status,
-                startedAt: updatedInfo.State.StartedAt,
-                username: username,
-                createdAt: new Date().toISOString(),
-                volumeName: tempVolumeName, // 添加卷信息
-                scenarioId: scenarioId // 添加scenarioID信息
+            }
+            return {
+                success: true,
+                data: job
             };
+        } catch (error) {
+            console.error('获取启动任务状态失败:', error.message);
+            return {
+                success: false,
+                error: `获取启动任务状态失败: ${error.message}`
+            };
+        }
+    },
+
+    // 启动Docker容器
+    // admissionWait：所有主机容量已满时等待的最长时间（毫秒），0表示立即失败
+    // pullPolicy：覆盖scenario配置的镜像拉取策略（批量启动的任务记录了加入队列时读取的策略）
+    async startDocker(imageName, options = {}, username = 'default', scenarioId = '', { admissionWait = 0, pullPolicy } = {}) {
+        try {
+            // 初始化Docker连接（如果尚未初始化）
+            if (!this.docker) {
+                this.docker = dockerHosts.get();
+            }
+            
+            // 确保Redis客户端已初始化
+            await this.initRedisClient();
             
-            // 将Docker信息存储到Redis
-            // 1. 将Docker ID添加到用户的Docker集合中
-            const userDockerKey = `user:${username}:dockers`;
-            await this.redisClient.sAdd(userDockerKey, updatedInfo.Id);
+            // 记录各阶段的时间线，随docker信息一起保存
+            const trace = launchTrace.createTrace();
             
-            // 2. 将Docker详细信息存储为哈希表
-            const dockerKey = `docker:${updatedInfo.Id}`;
-            await this.redisClient.hSet(dockerKey, dockerInfo);
+            // scenario配置决定镜像拉取策略和资源请求/限制
+            let scenarioConfig = null;
+            if (scenarioId) {
+                try {
+                    const scenarioManager = require('./scenario-manager');
+                    scenarioConfig = await scenarioManager.getScenario(scenarioId);
+                } catch (scenarioError) {
+                    console.error(`获取scenario配置失败: ${scenarioError.message}`);
+                }
+            }
+            const resources = runResources.fromScenario(scenarioConfig);
             
-            console.log(`Docker信息已存储到Redis，用户: ${username}, Docker ID: ${updatedInfo.Id}`);
+            // 按负载从低到高选择有足够容量的Docker主机并预留，启动完成前在本进程内为其保留名额
+            const controller = await this.getAdmission();
+            const { host, reservation } = await trace.phase('place',
+                () => controller.admit(resources.requests, { wait: admissionWait }));
+            let dockerInfo;
+            try {
+                dockerInfo = await dockerHosts.reserve(host, () => this.startDockerOnHost(host, {
+                    imageName, options, username, scenarioId, trace, resources, reservation,
+                    pullPolicy: pullPolicy || (scenarioConfig && scenarioConfig.docker && scenarioConfig.docker.imagePullPolicy)
+                }));
+            } catch (launchError) {
+                await controller.release(host, reservation).catch(releaseError => {
+                    console.error(`释放容量预留失败: ${releaseError.message}`);
+                });
+                throw launchError;
+            }
             
             return {
                 success: true,
@@ -590,50 +1011,243 @@ const API = {
         }
     },
     
+    // 在选定的Docker主机上创建并启动运行容器，返回docker信息
+    // request：{ imageName, options, username, scenarioId, trace, resources, reservation, pullPolicy }
+    async startDockerOnHost(host, request) {
+        const { imageName, options, username, scenarioId, trace, resources, pullPolicy } = request;
+        const docker = dockerHosts.get(host);
+        const hostResources = runResources.hostConfig(resources);
+        
+        // 确保镜像可用：本地已有且足够新时跳过拉取，并发启动共享同一次拉取
+        let normalizedImage = imageName;
+        try {
+            const images = this.getImageManager();
+            const [image] = await trace.phase('pull', () => Promise.all([
+                images.ensureImage(imageName, pullPolicy, host),
+                // busybox只用于卷读取器，本地存在即可
+                images.ensureImage('busybox:latest', 'never', host)
+            ]));
+            normalizedImage = image.image;
+            console.log(`镜像 ${image.image} ${image.pulled ? '已拉取' : '使用本地缓存'}`);
+        } catch (error) { 
+            throw new Error(`无法拉取镜像 ${imageName}: ${error.message}`);
+        }
+        
+        // scenario有预热条目时直接使用预热的卷和容器，跳过创建卷和创建容器（预热池在主主机上）
+        if (scenarioId && host === dockerHosts.primaryName()) {
+            const warm = await trace.phase('warm_claim', async () => {
+                const pool = await this.getWarmPool();
+                return pool.claim({
+                    scenarioId,
+                    image: normalizedImage,
+                    inputs: options.inputs,
+                    env: this.settingsToEnv(options.settings),
+                    resources: hostResources,
+                    username
+                });
+            });
+            if (warm) {
+                console.log(`使用预热的运行容器 ${warm.containerName}`);
+                return this.launchContainer(warm.container, {
+                    containerName: warm.containerName,
+                    volumeName: warm.volumeName,
+                    host, ...request
+                });
+            }
+        }
+                   
+        const alphaNumeric = imageName.replace(/[^a-zA-Z0-9\-]/g, '');
+        const randomSuffix = Math.random().toString(36).substring(2, 12);
+        const containerName = `${alphaNumeric}-${randomSuffix}`;
+        
+        // 第一步：创建运行专用的volume，volume的名字就用volume+子docker的名称
+        const tempVolumeName = `volume-${containerName}`;
+        try {
+            await trace.phase('volume_create', () => docker.createVolume({
+                Name: tempVolumeName,
+                Driver: 'local'
+            }));
+            console.log(`创建临时卷成功: ${tempVolumeName}`);
+        } catch (volumeError) {
+            console.error(`创建临时卷失败: ${volumeError.message}`);
+            throw new Error(`无法创建临时卷: ${volumeError.message}`);
+        }
+        
+        // 第二步：创建挂载该volume的子docker
+        // 创建绑定列表
+        const binds = [`${tempVolumeName}:${runWorkspace.WORKMATE_PATH}`];
+
+        let container;
+
+        //createContainer
+        try {
+            // 生成容器名称：从镜像名称中提取字母和数字，并添加随机后缀
+            
+            // 创建容器配置
+            const containerConfig = {
+                Image: imageName,
+                name: containerName,
+                Tty: true,
+                // 受管容器标签，容器状态缓存据此识别事件
+                Labels: {
+                    'workmate.managed': 'true',
+                    'workmate.user': username,
+                    'workmate.scenario': scenarioId || ''
+                },
+                HostConfig: {
+                    Binds: binds,
+                    NetworkMode: 'host',
+                    // scenario声明的CPU、内存和进程数限制
+                    ...hostResources
+                }
+            };
+            
+            // 如果有环境变量设置，添加到配置中
+            if (options.settings) {
+                containerConfig.Env = this.settingsToEnv(options.settings);
+            }
+        
+            // console.log(containerConfig.Env) ; 
+            // 创建容器
+            container = await trace.phase('create', () => docker.createContainer(containerConfig));
+        } catch (error) {
+            await this.removeVolumeQuietly(docker, tempVolumeName);
+            throw new Error(`创建容器遇到错误:${error.message}`) ; 
+        } 
+        
+        // 第三步：通过Docker的archive接口把目录结构和输入数据直接写入volume，不再经过共享卷和busybox复制
+        try {
+            await trace.phase('input', () => runWorkspace.stage(container, { inputs: options.inputs }));
+        } catch (stageError) {
+            // 先删除容器，再删除它挂载的运行volume
+            await container.remove({ force: true }).catch(() => {});
+            await this.removeVolumeQuietly(docker, tempVolumeName);
+            throw new Error(`无法写入输入数据: ${stageError.message}`);
+        }
+        
+        return this.launchContainer(container, {
+            containerName,
+            volumeName: tempVolumeName,
+            host, ...request
+        });
+    },
+    
+    // 删除启动失败的运行创建的volume（已不存在时忽略），失败只记录日志，不掩盖启动失败的原因
+    async removeVolumeQuietly(docker, volumeName) {
+        try {
+            await docker.getVolume(volumeName).remove();
+        } catch (error) {
+            if (error.statusCode !== 404) {
+                console.error(`删除运行卷 ${volumeName} 失败: ${error.message}`);
+            }
+        }
+    },
+    
+    // 把settings转换为容器环境变量，键名转换为大写
+    settingsToEnv(settings) {
+        return Object.entries(settings || {}).map(([key, value]) => `${key.toUpperCase()}=${value}`);
+    },
+    
+    // 启动已创建的运行容器，记录docker信息并启动卷读取器
+    async launchContainer(container, { containerName, volumeName, imageName, username, scenarioId, host, trace, resources, reservation }) {
+        // 启动容器并获取最新容器信息
+        await trace.phase('start', () => container.start());
+        const updatedInfo = await trace.phase('inspect', () => container.inspect());
+        const dockerId = updatedInfo.Id;
+        
+        // 创建Docker信息对象
+        const dockerInfo = {
+            containerId: updatedInfo.Id,
+            containerName: containerName,
+            name: imageName,
+            status: updatedInfo.State.Status,
+            startedAt: updatedInfo.State.StartedAt,
+            username: username,
+            createdAt: new Date().toISOString(),
+            volumeName: volumeName, // 添加卷信息
+            scenarioId: scenarioId, // 添加scenarioID信息
+            host: host, // 运行所在的Docker主机
+            // 资源请求（毫核、字节）和准入控制的容量预留
+            cpuRequest: String(resources.requests.cpu),
+            memoryRequest: String(resources.requests.memory),
+            reservation: reservation
+        };
+        
+        // 在一个事务中登记运行：用户的Docker集合、Docker信息、创建时间索引和启动时间线
+        await runRegistry.register(this.redisClient, dockerInfo, trace);
+        
+        console.log(`Docker信息已存储到Redis，用户: ${username}, Docker ID: ${updatedInfo.Id}`);
+        
+        // 立即为新运行启动卷读取器，不阻塞启动请求
+        const reader = await this.getVolumeReader();
+        reader.ensureSynced(dockerInfo).catch(readerError => {
+            console.error(`为 ${containerName} 启动卷读取器失败: ${readerError.message}`);
+        });
+        
+        return dockerInfo;
+    },
+    
+    // 读取运行的启动时间线，首次日志时间尚未记录时从卷读取器的标记中补充
+    async getLaunchTrace(dockerId, dockerInfo) {
+        try {
+            const trace = await launchTrace.read(this.redisClient, dockerId);
+            if (trace && !trace.firstLogAt && dockerInfo.containerName) {
+                const reader = await this.getVolumeReader();
+                const firstLogAt = reader.firstLogTime(dockerInfo.containerName);
+                if (firstLogAt) {
+                    const pipeline = this.redisClient.multi();
+                    launchTrace.recordFirstLog(pipeline, dockerId, firstLogAt);
+                    await pipeline.exec();
+                    return launchTrace.read(this.redisClient, dockerId);
+                }
+            }
+            return trace;
+        } catch (error) {
+            console.error(`读取运行 ${dockerId} 的启动时间线失败: ${error.message}`);
+            return null;
+        }
+    },
+    
     // 获取Docker容器状态
     async getDockerStatus(dockerId) {
         try {
             // 初始化Docker连接（如果尚未初始化）
             if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
-                });
+                this.docker = dockerHosts.get();
             }
             
             
             // 确保Redis客户端已初始化
             await this.initRedisClient();
-            // 获取容器
-            const container = this.docker.getContainer(dockerId);
-            const containerInfo = await container.inspect();
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
             
-                             
-            const dockerKey = `docker:${dockerId}`;
-            const dockerInfo = await this.redisClient.hGetAll(dockerKey);
+            // 从容器状态缓存获取容器状态，容器已被回收的运行使用保存的最终状态
+            const stateCache = await this.getContainerState();
+            const state = runRegistry.storedState(dockerInfo) || await stateCache.get(dockerId);
+            if (!state) {
+                throw new Error(`容器 ${dockerId} 不存在`);
+            }
 
             // 检查退出状态
             let exitStatus = "Success";
-            if (containerInfo.State.Status === "exited" && containerInfo.State.ExitCode !== 0) {
+            if (state.status === "exited" && state.exitCode !== 0) {
                 exitStatus = "Failure";
             }
 
             let returnData = {
                 ...dockerInfo, 
-                status: containerInfo.State.Status,
+                status: state.status,
                 exitStatus: exitStatus,
-                exitCode: containerInfo.State.ExitCode
+                exitCode: state.exitCode,
+                trace: await this.getLaunchTrace(dockerId, dockerInfo)
             };
             
             const scenarioId = dockerInfo.scenarioId;
             if (scenarioId) {
                 try {
+                    // 从内存中的scenario目录获取已解析的配置
                     const scenarioManager = require('./scenario-manager');
-                    const scenarioYaml = await scenarioManager.getScenarioYaml(scenarioId);
-                    
-                    // 简单解析YAML以获取outputs配置
-                    const yaml = require('js-yaml');
-                    const scenarioConfig = yaml.load(scenarioYaml);
+                    const scenarioConfig = await scenarioManager.getScenario(scenarioId);
                     returnData = {...returnData, scenarioName: scenarioConfig.name} ; 
                 } catch (scenarioError) {
                     console.error(`获取scenario配置失败: ${scenarioError.message}`);
@@ -653,80 +1267,107 @@ const API = {
         }
     },
     
+    // 获取详情页所需的运行快照：状态、日志游标之后的新内容、有变化的输出，只访问一次卷读取器
+    async getDockerSnapshot(dockerId, { logFile = 'run.log', logCursor = 0, outputFile = 'output.json', outputVersion = '' } = {}) {
+        try {
+            const fs = require('fs');
+            const path = require('path');
+            const httpCache = require('./http-cache');
+            const { utf8CompleteLength } = require('./log-stream');
+            
+            // 文件名会拼接进镜像目录路径，只允许简单文件名
+            for (const fileName of [logFile, outputFile]) {
+                if (!/^[\w.\-]+$/.test(fileName)) {
+                    throw new Error(`无效的文件名: ${fileName}`);
+                }
+            }
+            
+            const statusResult = await this.getDockerStatus(dockerId);
+            if (!statusResult.success) {
+                return statusResult;
+            }
+            const status = statusResult.data;
+            if (!status.volumeName) {
+                throw new Error(`未找到Docker ${dockerId}对应的volume信息`);
+            }
+            
+            const runFiles = await this.runFiles(dockerId, status);
+            
+            // 日志：从游标开始读取新写入的字节，游标超出文件大小（日志被替换）时从头读取
+            let logs = null;
+            const logPath = runFiles.path('logs', logFile);
+            if (fs.existsSync(logPath)) {
+                const { size } = await runFiles.stat('logs', logFile);
+                const start = logCursor > size ? 0 : logCursor;
+                const length = Math.min(size - start, this.config.snapshotLogChunk);
+                const chunk = await logArchive.readRange(logPath, start, start + length);
+                // 不把多字节字符拆在两次返回之间
+                const complete = chunk.subarray(0, utf8CompleteLength(chunk));
+                logs = {
+                    cursor: start + complete.length,
+                    size,
+                    reset: start === 0,
+                    data: complete.toString('utf8')
+                };
+            }
+            
+            // 输出：内容哈希与客户端持有的版本相同时不返回内容
+            let output = null;
+            const outputPath = runFiles.path('outputs', outputFile);
+            if (fs.existsSync(outputPath)) {
+                const stat = await fs.promises.stat(outputPath);
+                const version = await httpCache.fileHash(outputPath, stat);
+                output = { version, changed: version !== outputVersion };
+                if (output.changed) {
+                    const outputContent = await fs.promises.readFile(outputPath, 'utf8');
+                    try {
+                        output.data = JSON.parse(outputContent);
+                    } catch (jsonError) {
+                        output.data = outputContent;
+                        output.warning = '输出内容不是有效的JSON格式';
+                    }
+                }
+            }
+            
+            return {
+                success: true,
+                data: {
+                    status,
+                    logs,
+                    output,
+                    finished: runFiles.isFinal()
+                }
+            };
+        } catch (error) {
+            console.error(`获取Docker快照失败: ${error.message}`);
+            return {
+                success: false,
+                error: `获取Docker快照失败: ${error.message}`
+            };
+        }
+    },
+    
     // 调整Docker容器状态
     async updateDockerState(dockerId, action, username) {
         try {
             // 初始化Docker连接（如果尚未初始化）
             if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
-                });
+                this.docker = dockerHosts.get();
             }
             
             // 确保Redis客户端已初始化
             await this.initRedisClient();
             
             // 验证用户权限（检查该Docker是否属于该用户）
-            const userDockerKey = `user:${username}:dockers`;
-            const isUserDocker = await this.redisClient.sIsMember(userDockerKey, dockerId);
+            const isUserDocker = await this.redisClient.sIsMember(runRegistry.userKey(username), dockerId);
             
             if (!isUserDocker) {
                 throw new Error(`用户 ${username} 无权操作Docker ${dockerId}`);
             }
             
-            // 获取容器
-            const container = this.docker.getContainer(dockerId);
-            
-            // 根据action执行相应操作
-            let result;
-            switch (action) {
-                case 'start':
-                    result = await container.start();
-                    break;
-                case 'stop':
-                    result = await container.stop();
-                    break;
-                case 'restart':
-                    result = await container.restart();
-                    break;
-                case 'pause':
-                    result = await container.pause();
-                    break;
-                case 'unpause':
-                    result = await container.unpause();
-                    break;
-                case 'kill':
-                    result = await container.kill();
-                    break;
-                case 'remove':
-                    result = await container.remove({ force: true });
-                    // 从Redis中删除该Docker信息
-                    await this.redisClient.sRem(userDockerKey, dockerId);
-                    await this.redisClient.del(`docker:${dockerId}`);
-                    break;
-                default:
-                    throw new Error(`不支持的操作: ${action}`);
-            }
-            
-            // 获取更新后的容器信息（如果容器未被删除）
-            let updatedInfo = null;
-            if (action !== 'remove') {
-                updatedInfo = await container.inspect();
-                
-                // 更新Redis中的Docker状态
-                const dockerKey = `docker:${dockerId}`;
-                await this.redisClient.hSet(dockerKey, 'status', updatedInfo.State.Status);
-            }
-            
-            return {
-                success: true,
-                data: {
-                    action,
-                    containerId: dockerId,
-                    status: updatedInfo ? updatedInfo.State.Status : 'removed'
-                }
-            };
+            // 多个后端副本可能同时收到同一容器的操作请求，按容器串行执行
+            return await distributedLock.withLock(this.redisClient, `docker:${dockerId}`,
+                () => this.applyDockerState(dockerId, action));
         } catch (error) {
             console.error(`Docker ${action} 操作失败:`, error.message);
             return {
@@ -736,15 +1377,111 @@ const API = {
         }
     },
     
+    // 执行容器操作并等待状态更新（调用方需持有该容器的锁）
+    async applyDockerState(dockerId, action) {
+        // 容器已被回收的运行只保留结果，只能删除
+        const runInfo = await runRegistry.get(this.redisClient, dockerId);
+        if (runInfo.reclaimedAt && action !== 'remove') {
+            throw new Error(`运行 ${dockerId} 的容器已在结果保存后回收，只能查看结果或删除`);
+        }
+        
+        // 获取容器（在运行所在的Docker主机上）
+        const stateCache = await this.getContainerState();
+        const container = dockerHosts.get(await stateCache.hostOf(dockerId)).getContainer(dockerId);
+        
+        // 根据action执行相应操作
+        let result;
+        switch (action) {
+            case 'start':
+                result = await container.start();
+                break;
+            case 'stop':
+                result = await container.stop();
+                break;
+            case 'restart':
+                result = await container.restart();
+                break;
+            case 'pause':
+                result = await container.pause();
+                break;
+            case 'unpause':
+                result = await container.unpause();
+                break;
+            case 'kill':
+                result = await container.kill();
+                break;
+            case 'remove': {
+                if (!runInfo.reclaimedAt) {
+                    result = await container.remove({ force: true });
+                }
+                // 一次删除该Docker的全部记录（用户集合、Docker信息、时间线、时间索引和容量预留）
+                const removedInfo = await runRegistry.remove(this.redisClient, dockerId);
+                // 释放卷读取器
+                if (removedInfo.containerName) {
+                    const reader = await this.getVolumeReader();
+                    await reader.release(removedInfo);
+                }
+                break;
+            }
+            default:
+                throw new Error(`不支持的操作: ${action}`);
+        }
+        
+        // 等待事件流送达操作后的状态（如果容器未被删除）
+        let updatedState = null;
+        if (action !== 'remove') {
+            const expectedStatus = {
+                start: 'running',
+                restart: 'running',
+                unpause: 'running',
+                stop: 'exited',
+                kill: 'exited',
+                pause: 'paused'
+            }[action];
+            updatedState = await stateCache.waitForStatus(dockerId, expectedStatus);
+            if (!updatedState) {
+                throw new Error(`容器 ${dockerId} 不存在`);
+            }
+            
+            // 更新Redis中的Docker状态和结束时间索引
+            await runRegistry.updateStatus(this.redisClient, dockerId, updatedState);
+            
+            // 容器重新运行后之前保存的结果已过时，需要重新同步日志和输出
+            if ((action === 'start' || action === 'restart') && updatedState.status === 'running') {
+                await runRegistry.clearResults(this.redisClient, dockerId);
+                const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
+                const reader = await this.getVolumeReader();
+                await reader.reopen({ containerId: dockerId, ...dockerInfo });
+                reader.ensureSynced({ containerId: dockerId, ...dockerInfo }).catch(readerError => {
+                    console.error(`为 ${dockerId} 启动卷读取器失败: ${readerError.message}`);
+                });
+            }
+        }
+        
+        return {
+            success: true,
+            data: {
+                action,
+                containerId: dockerId,
+                status: updatedState ? updatedState.status : 'removed'
+            }
+        };
+    },
+    
     // 初始化定时清理任务
     initCleanupScheduler(interval = '0 0 * * *') {
         console.log('初始化Docker和Volume定时清理任务');
         
         // 默认每天午夜执行一次清理任务
         this.cleanupJob = schedule.scheduleJob(interval, async () => {
+            // 每个副本都设置了定时任务，只由领导者执行
+            if (!leaderElection.isLeader()) {
+                console.log('当前副本不是领导者，跳过定时清理任务');
+                return;
+            }
             try {
                 console.log('开始执行Docker和Volume定时清理任务');
-                const result = await this.cleanupDockerResources();
+                const result = await this.cleanupDockerResources(this.config.runRetentionDays);
                 console.log(`清理任务完成: ${result.success ? '成功' : '失败'}, 清理了 ${result.data?.cleanedCount || 0} 个资源`);
             } catch (error) {
                 console.error('执行清理任务时发生错误:', error);
@@ -755,15 +1492,28 @@ const API = {
         return this.cleanupJob;
     },
     
-    // 清理Docker资源（容器和卷）
+    // 清理Docker资源（容器和卷），并记录清理耗时
+    // 定时任务和手动触发可能在不同副本上同时发生，同一时间只允许一个清理任务
     async cleanupDockerResources(maxAgeInDays = 1) {
+        try {
+            await this.initRedisClient();
+            return await distributedLock.withLock(this.redisClient, 'cleanup',
+                () => metrics.timeCleanup(() => this.cleanupExpiredRuns(maxAgeInDays)),
+                { ttl: 60000, wait: 0 });
+        } catch (error) {
+            return {
+                success: false,
+                error: `清理Docker资源失败: ${error.message}`
+            };
+        }
+    },
+    
+    // 清理创建时间早于保留期限的运行
+    async cleanupExpiredRuns(maxAgeInDays) {
         try {
             // 初始化Docker连接（如果尚未初始化）
             if (!this.docker) {
-                this.docker = new Docker({
-                    host: 'docker-socket-proxy',
-                    port: 2375
-                });
+                this.docker = dockerHosts.get();
             }
             
             // 确保Redis客户端已初始化
@@ -778,100 +1528,40 @@ const API = {
             
             console.log(`清理截止时间: ${cutoffTimeStr}`);
             
-            // 获取所有用户
-            const userKeys = await this.redisClient.keys('user:*:dockers');
-            let cleanedCount = 0;
+            // 历史运行可能还没有进入时间索引
+            await runIndex.backfill(this.redisClient);
             
-            // 遍历每个用户的Docker列表
-            for (const userKey of userKeys) {
-                const username = userKey.split(':')[1];
-                console.log(`检查用户 ${username} 的Docker资源`);
+            let cleanedCount = 0;
+            let failedCount = 0;
+            
+            // 按创建时间从索引中分批取出过期的运行，清理失败的运行留在索引中，下次再试
+            for (;;) {
+                const dockerIds = await runIndex.findCreatedBefore(
+                    this.redisClient, cutoffTime.getTime(), failedCount, this.config.cleanupBatchSize
+                );
+                if (dockerIds.length === 0) {
+                    break;
+                }
                 
-                // 获取用户的Docker ID列表
-                const dockerIds = await this.redisClient.sMembers(userKey);
+                const results = await mapWithConcurrency(dockerIds, this.config.cleanupConcurrency,
+                    dockerId => this.cleanupRunLocked(dockerId));
                 
-                // 遍历每个Docker ID
-                for (const dockerId of dockerIds) {
-                    try {
-                        // 获取Docker详细信息
-                        const dockerKey = `docker:${dockerId}`;
-                        const dockerInfo = await this.redisClient.hGetAll(dockerKey);
-                        
-                        // 如果没有找到Docker信息，跳过
-                        if (!dockerInfo || Object.keys(dockerInfo).length === 0) {
-                            console.log(`未找到Docker ${dockerId} 的信息，跳过`);
-                            continue;
-                        }
-                        
-                        // 检查Docker是否超过最大保留时间
-                        const startedAt = dockerInfo.startedAt || dockerInfo.createdAt;
-                        
-                        if (startedAt && startedAt < cutoffTimeStr) {
-                            console.log(`Docker ${dockerId} (${dockerInfo.name}) 已超过保留时间，开始清理`);
-                            
-                            try {
-                                // 获取容器
-                                const container = this.docker.getContainer(dockerId);
-                                
-                                // 检查容器是否存在
-                                try {
-                                    await container.inspect();
-                                    
-                                    // 停止并删除容器
-                                    console.log(`停止容器 ${dockerId}`);
-                                    try {
-                                        await container.stop();
-                                    } catch (stopError) {
-                                        // 容器可能已经停止，忽略错误
-                                        console.log(`停止容器时出现非致命错误: ${stopError.message}`);
-                                    }
-                                    
-                                    console.log(`删除容器 ${dockerId}`);
-                                    await container.remove({ force: true });
-                                } catch (inspectError) {
-                                    console.log(`容器 ${dockerId} 不存在或无法访问: ${inspectError.message}`);
-                                }
-                                
-                                // 删除相关的volume
-                                if (dockerInfo.volumeName) {
-                                    try {
-                                        console.log(`删除卷 ${dockerInfo.volumeName}`);
-                                        const volume = this.docker.getVolume(dockerInfo.volumeName);
-                                        await volume.remove();
-                                    } catch (volumeError) {
-                                        console.log(`删除卷时出现非致命错误: ${volumeError.message}`);
-                                    }
-                                }
-                                
-                                // 从Redis中删除Docker信息
-                                console.log(`从Redis中删除Docker ${dockerId} 的信息`);
-                                await this.redisClient.sRem(userKey, dockerId);
-                                await this.redisClient.del(dockerKey);
-                                
-                                // 删除volume信息
-                                const volumeKey = `docker:${dockerId}:volume`;
-                                await this.redisClient.del(volumeKey);
-                                
-                                cleanedCount++;
-                                console.log(`Docker ${dockerId} 清理完成`);
-                            } catch (cleanupError) {
-                                console.error(`清理Docker ${dockerId} 时出错: ${cleanupError.message}`);
-                            }
-                        } else {
-                            console.log(`Docker ${dockerId} (${dockerInfo.name}) 未超过保留时间，保留`);
-                        }
-                    } catch (dockerError) {
-                        console.error(`处理Docker ${dockerId} 时出错: ${dockerError.message}`);
+                for (const cleaned of results) {
+                    if (cleaned) {
+                        cleanedCount++;
+                    } else {
+                        failedCount++;
                     }
                 }
             }
             
-            console.log(`清理任务完成，共清理了 ${cleanedCount} 个Docker资源`);
+            console.log(`清理任务完成，共清理了 ${cleanedCount} 个Docker资源，失败 ${failedCount} 个`);
             
             return {
                 success: true,
                 data: {
                     cleanedCount,
+                    failedCount,
                     cutoffTime: cutoffTimeStr
                 }
             };
@@ -883,6 +1573,78 @@ const API = {
             };
         }
     },
+    
+    // 持有容器的锁清理单个运行，避免与其他副本上进行中的容器操作冲突
+    async cleanupRunLocked(dockerId) {
+        try {
+            return await distributedLock.withLock(this.redisClient, `docker:${dockerId}`,
+                () => this.cleanupRun(dockerId));
+        } catch (error) {
+            console.error(`清理Docker ${dockerId} 时出错: ${error.message}`);
+            return false;
+        }
+    },
+    
+    // 清理单个过期运行的容器、卷和Redis记录，返回是否清理成功
+    async cleanupRun(dockerId) {
+        try {
+            const dockerInfo = await runRegistry.get(this.redisClient, dockerId);
+            
+            // Docker信息已不存在时只需移除索引
+            if (!dockerInfo || Object.keys(dockerInfo).length === 0) {
+                console.log(`未找到Docker ${dockerId} 的信息，从索引中移除`);
+                await runRegistry.remove(this.redisClient, dockerId);
+                return true;
+            }
+            
+            console.log(`Docker ${dockerId} (${dockerInfo.name}) 已超过保留时间，开始清理`);
+            
+            // 停止并删除运行所在主机上的容器（容器可能已经不存在）
+            const docker = dockerHosts.forRun(dockerInfo);
+            const container = docker.getContainer(dockerId);
+            try {
+                await container.stop();
+            } catch (stopError) {
+                // 容器可能已经停止，忽略错误
+                console.log(`停止容器时出现非致命错误: ${stopError.message}`);
+            }
+            try {
+                await container.remove({ force: true });
+                console.log(`删除容器 ${dockerId}`);
+            } catch (removeError) {
+                if (removeError.statusCode !== 404) {
+                    throw removeError;
+                }
+                console.log(`容器 ${dockerId} 不存在，跳过`);
+            }
+            
+            // 释放卷读取器，否则volume仍被占用
+            if (dockerInfo.containerName) {
+                const reader = await this.getVolumeReader();
+                await reader.release(dockerInfo);
+            }
+            
+            // 删除相关的volume
+            if (dockerInfo.volumeName) {
+                try {
+                    console.log(`删除卷 ${dockerInfo.volumeName}`);
+                    await docker.getVolume(dockerInfo.volumeName).remove();
+                } catch (volumeError) {
+                    console.log(`删除卷时出现非致命错误: ${volumeError.message}`);
+                }
+            }
+            
+            // 一次删除Docker的全部记录（用户集合、Docker信息、时间线、时间索引和容量预留），
+            // 仍在日志保留期限内的日志归档和结果文件由日志保留模块到期时删除
+            await runRegistry.remove(this.redisClient, dockerId, { retain: true });
+            
+            console.log(`Docker ${dockerId} 清理完成`);
+            return true;
+        } catch (error) {
+            console.error(`清理Docker ${dockerId} 时出错: ${error.message}`);
+            return false;
+        }
+    },
 
     // 保存用户在特定scenario下的设置
     async saveUserSettings(username, scenarioId, settings) {
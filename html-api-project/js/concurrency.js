@@ -0,0 +1,30 @@
+/**
+ * 并发控制工具模块
+ */
+
+/**
+ * 以有限并发数对数组中的每一项执行异步函数，结果顺序与输入一致
+ * @param {Array} items - 输入数组
+ * @param {number} limit - 最大并发数
+ * @param {Function} fn - 异步处理函数 (item, index) => Promise
+ * @returns {Promise<Array>} 每一项的处理结果
+ */
+async function mapWithConcurrency(items, limit, fn) {
+  const results = new Array(items.length);
+  let nextIndex = 0;
+
+  const worker = async () => {
+    while (nextIndex < items.length) {
+      const index = nextIndex++;
+      results[index] = await fn(items[index], index);
+    }
+  };
+
+  const workerCount = Math.max(1, Math.min(limit, items.length));
+  await Promise.all(Array.from({ length: workerCount }, worker));
+  return results;
+}
+
+module.exports = {
+  mapWithConcurrency
+};
@@ -0,0 +1,368 @@
+/**
+ * 容器状态缓存模块
+ *
+ * 订阅每台Docker主机的/events事件流，在内存中维护受管容器的状态表
+ * （status、exitCode、startedAt、finishedAt），并镜像到Redis的 docker:<id>:state 哈希中。
+ * 状态查询直接读取状态表，不再每次请求都调用container.inspect()。
+ *
+ * - 每台主机在启动和每次重连时用一次listContainers调用对账
+ * - 某台主机的事件流断开期间，该主机上容器的查询回退到inspect
+ */
+const EventEmitter = require('events');
+
+// 关心的容器事件
+const CONTAINER_EVENTS = ['create', 'start', 'restart', 'die', 'pause', 'unpause', 'destroy'];
+
+// 受管容器的标签（startDocker创建的容器都会带上）
+const MANAGED_LABEL = 'workmate.managed';
+
+// 重连间隔（毫秒），按指数退避增长
+const RECONNECT_MIN_DELAY = 1000;
+const RECONNECT_MAX_DELAY = 30000;
+
+/**
+ * 从listContainers返回的Status文本中解析退出码，例如 "Exited (137) 2 hours ago"
+ * @param {string} statusText - 容器状态描述
+ * @returns {number|null} 退出码
+ */
+function parseExitCode(statusText) {
+  const match = /^Exited \((-?\d+)\)/.exec(statusText || '');
+  return match ? Number(match[1]) : null;
+}
+
+/**
+ * 把Docker事件时间转换为毫秒时间戳
+ * @param {object} event - Docker事件
+ * @returns {number} 毫秒时间戳
+ */
+function eventTime(event) {
+  if (event.timeNano) {
+    return Math.floor(Number(event.timeNano) / 1e6);
+  }
+  return (event.time || 0) * 1000 || Date.now();
+}
+
+const ContainerState = Object.assign(new EventEmitter(), {
+    // Docker主机池和Redis客户端，由API模块注入
+    hosts: null,
+    redisClient: null,
+
+    // 状态表：containerId -> { host, status, exitCode, startedAt, finishedAt, version }
+    states: new Map(),
+
+    // 每台主机的事件流连接：host -> { connected, eventStream, reconnectDelay }
+    // 事件流离线时该主机上容器的查询回退到inspect
+    connections: new Map(),
+
+    started: false,
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { hosts, redisClient }
+     */
+    configure({ hosts, redisClient }) {
+        this.hosts = hosts;
+        this.redisClient = redisClient;
+    },
+
+    /**
+     * 启动所有主机的事件订阅（只会启动一次）
+     */
+    async start() {
+        if (this.started) return;
+        this.started = true;
+        await Promise.all(this.hosts.names().map(host => {
+            this.connections.set(host, { connected: false, eventStream: null, reconnectDelay: RECONNECT_MIN_DELAY });
+            return this.connect(host);
+        }));
+    },
+
+    /**
+     * 主机的事件流是否在线
+     * @param {string} host - 主机名称
+     * @returns {boolean}
+     */
+    isConnected(host) {
+        const connection = this.connections.get(host);
+        return Boolean(connection && connection.connected);
+    },
+
+    /**
+     * 订阅主机的事件流并对账，失败时按退避间隔重试
+     * @param {string} host - 主机名称
+     */
+    async connect(host) {
+        const connection = this.connections.get(host);
+        try {
+            // 先订阅再对账，避免对账期间发生的变化被遗漏
+            await this.subscribe(host);
+            await this.reconcile(host);
+            connection.connected = true;
+            connection.reconnectDelay = RECONNECT_MIN_DELAY;
+            console.log(`Docker主机 ${host} 的事件流已连接，容器状态缓存生效`);
+        } catch (error) {
+            console.error(`连接Docker主机 ${host} 的事件流失败: ${error.message}`);
+            this.scheduleReconnect(host);
+        }
+    },
+
+    /**
+     * 事件流断开后安排重连
+     * @param {string} host - 主机名称
+     */
+    scheduleReconnect(host) {
+        const connection = this.connections.get(host);
+        connection.connected = false;
+        if (connection.eventStream) {
+            connection.eventStream.removeAllListeners();
+            connection.eventStream.destroy();
+            connection.eventStream = null;
+        }
+        const delay = connection.reconnectDelay;
+        connection.reconnectDelay = Math.min(connection.reconnectDelay * 2, RECONNECT_MAX_DELAY);
+        console.log(`${delay}ms 后重连Docker主机 ${host} 的事件流，期间状态查询回退到inspect`);
+        setTimeout(() => this.connect(host), delay);
+    },
+
+    /**
+     * 订阅主机的容器事件
+     * @param {string} host - 主机名称
+     */
+    async subscribe(host) {
+        const stream = await this.hosts.get(host).getEvents({
+            filters: { type: ['container'], event: CONTAINER_EVENTS }
+        });
+        this.connections.get(host).eventStream = stream;
+
+        let buffer = '';
+        stream.on('data', (chunk) => {
+            buffer += chunk.toString();
+            let index;
+            while ((index = buffer.indexOf('\n')) !== -1) {
+                const line = buffer.slice(0, index).trim();
+                buffer = buffer.slice(index + 1);
+                if (!line) continue;
+                try {
+                    this.handleEvent(JSON.parse(line), host);
+                } catch (error) {
+                    console.error(`解析Docker事件失败: ${error.message}`);
+                }
+            }
+        });
+        stream.on('error', (error) => {
+            console.error(`Docker主机 ${host} 的事件流出错: ${error.message}`);
+            this.scheduleReconnect(host);
+        });
+        stream.on('end', () => {
+            console.error(`Docker主机 ${host} 的事件流已断开`);
+            this.scheduleReconnect(host);
+        });
+    },
+
+    /**
+     * 用一次listContainers调用对账主机上的容器
+     * @param {string} host - 主机名称
+     */
+    async reconcile(host) {
+        const containers = await this.hosts.get(host).listContainers({ all: true });
+
+        // 没有标签的旧容器通过Redis中是否存在 docker:<id> 判断是否受管
+        const pipeline = this.redisClient.multi();
+        for (const item of containers) {
+            pipeline.exists(`docker:${item.Id}`);
+            pipeline.hGetAll(`docker:${item.Id}:state`);
+        }
+        const replies = containers.length ? await pipeline.execAsPipeline() : [];
+
+        const seen = new Set();
+        containers.forEach((item, index) => {
+            const known = replies[index * 2] === 1;
+            const mirrored = replies[index * 2 + 1] || {};
+            if (!known && !(item.Labels && item.Labels[MANAGED_LABEL])) {
+                return;
+            }
+            seen.add(item.Id);
+
+            const previous = this.states.get(item.Id) || {};
+            const exitCode = item.State === 'exited' ? parseExitCode(item.Status) : null;
+            this.update(item.Id, {
+                host,
+                status: item.State,
+                exitCode: exitCode !== null ? exitCode : previous.exitCode !== undefined ? previous.exitCode : Number(mirrored.exitCode || 0),
+                startedAt: previous.startedAt || mirrored.startedAt || '',
+                finishedAt: previous.finishedAt || mirrored.finishedAt || ''
+            }, Date.now());
+        });
+
+        // 对账时该主机上已不存在的容器从状态表中移除
+        for (const [containerId, state] of this.states) {
+            if (state.host === host && !seen.has(containerId)) {
+                this.remove(containerId);
+            }
+        }
+
+        console.log(`Docker主机 ${host} 的容器状态对账完成，受管容器 ${seen.size} 个`);
+    },
+
+    /**
+     * 处理一条Docker事件
+     * @param {object} event - Docker事件
+     * @param {string} host - 事件来源的主机名称
+     */
+    handleEvent(event, host) {
+        const containerId = event.id || (event.Actor && event.Actor.ID);
+        const attributes = (event.Actor && event.Actor.Attributes) || {};
+        if (!containerId || (!this.states.has(containerId) && !attributes[MANAGED_LABEL])) {
+            return;
+        }
+
+        const time = eventTime(event);
+        const timeIso = new Date(time).toISOString();
+        const previous = this.states.get(containerId) || {};
+
+        switch (event.Action || event.status) {
+            case 'create':
+                this.update(containerId, { host, status: 'created', exitCode: 0 }, time);
+                break;
+            case 'start':
+            case 'restart':
+                this.update(containerId, { host, status: 'running', exitCode: 0, startedAt: timeIso }, time);
+                break;
+            case 'die':
+                this.update(containerId, {
+                    host,
+                    status: 'exited',
+                    exitCode: Number(attributes.exitCode || 0),
+                    finishedAt: timeIso
+                }, time);
+                break;
+            case 'pause':
+                this.update(containerId, { host, status: 'paused' }, time);
+                break;
+            case 'unpause':
+                this.update(containerId, { host, status: previous.status === 'paused' ? 'running' : previous.status }, time);
+                break;
+            case 'destroy':
+                this.remove(containerId);
+                break;
+            default:
+                break;
+        }
+    },
+
+    /**
+     * 更新状态表并镜像到Redis
+     * @param {string} containerId - 容器ID
+     * @param {object} changes - 变化的字段
+     * @param {number} time - 变化发生的时间（毫秒），同时作为状态版本号
+     */
+    update(containerId, changes, time) {
+        const previous = this.states.get(containerId) || { exitCode: 0, startedAt: '', finishedAt: '' };
+        const version = Math.max(time, (previous.version || 0) + 1);
+        const state = { ...previous, ...changes, version };
+        this.states.set(containerId, state);
+        this.emit('change', containerId, state);
+
+        this.redisClient.hSet(`docker:${containerId}:state`, {
+            status: state.status,
+            exitCode: String(state.exitCode),
+            startedAt: state.startedAt || '',
+            finishedAt: state.finishedAt || '',
+            version: String(state.version)
+        }).catch(error => console.error(`镜像容器 ${containerId} 状态到Redis失败: ${error.message}`));
+    },
+
+    /**
+     * 从状态表和Redis镜像中删除容器
+     * @param {string} containerId - 容器ID
+     */
+    remove(containerId) {
+        this.states.delete(containerId);
+        this.emit('change', containerId, null);
+        this.redisClient.del(`docker:${containerId}:state`)
+            .catch(error => console.error(`删除容器 ${containerId} 的状态镜像失败: ${error.message}`));
+    },
+
+    /**
+     * 确定容器所在的主机：状态表中已知时直接使用，否则读取Redis中运行记录的host字段
+     * @param {string} containerId - 容器ID
+     * @returns {Promise<string>} 主机名称
+     */
+    async hostOf(containerId) {
+        const known = this.states.get(containerId);
+        if (known && known.host) {
+            return known.host;
+        }
+        return (await this.redisClient.hGet(`docker:${containerId}`, 'host')) || this.hosts.primaryName();
+    },
+
+    /**
+     * 通过inspect获取容器状态并写入状态表
+     * @param {string} containerId - 容器ID
+     * @returns {Promise<object|null>} 容器状态，容器不存在时返回null
+     */
+    async inspect(containerId) {
+        try {
+            const host = await this.hostOf(containerId);
+            const info = await this.hosts.get(host).getContainer(containerId).inspect();
+            this.update(info.Id, {
+                host,
+                status: info.State.Status,
+                exitCode: info.State.ExitCode,
+                startedAt: info.State.StartedAt,
+                finishedAt: info.State.FinishedAt
+            }, Date.now());
+            return this.states.get(info.Id);
+        } catch (error) {
+            if (error.statusCode === 404) {
+                this.remove(containerId);
+                return null;
+            }
+            throw error;
+        }
+    },
+
+    /**
+     * 获取容器状态：所在主机的事件流在线时直接读状态表，否则回退到inspect
+     * @param {string} containerId - 容器ID
+     * @returns {Promise<object|null>} 容器状态，容器不存在时返回null
+     */
+    async get(containerId) {
+        const state = this.states.get(containerId);
+        if (state && this.isConnected(state.host)) {
+            return state;
+        }
+        return this.inspect(containerId);
+    },
+
+    /**
+     * 等待容器进入期望的状态（状态调整操作之后使用），超时后回退到inspect
+     * @param {string} containerId - 容器ID
+     * @param {string} expectedStatus - 期望的状态
+     * @param {number} timeout - 最长等待时间（毫秒）
+     * @returns {Promise<object|null>} 容器状态
+     */
+    async waitForStatus(containerId, expectedStatus, timeout = 2000) {
+        const current = this.states.get(containerId);
+        if (!current || !this.isConnected(current.host) || current.status === expectedStatus) {
+            return this.get(containerId);
+        }
+
+        return new Promise(resolve => {
+            const onChange = (changedId, state) => {
+                if (changedId === containerId && state && state.status === expectedStatus) {
+                    clearTimeout(timer);
+                    this.removeListener('change', onChange);
+                    resolve(state);
+                }
+            };
+            const timer = setTimeout(() => {
+                this.removeListener('change', onChange);
+                resolve(this.inspect(containerId));
+            }, timeout);
+            this.on('change', onChange);
+        });
+    }
+});
+
+module.exports = ContainerState;
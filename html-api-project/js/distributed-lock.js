@@ -0,0 +1,156 @@
+/**
+ * Redis分布式锁模块
+ *
+ * 多个后端副本同时运行时，用于串行化针对同一资源的操作（例如同一个容器的状态变更）：
+ * - 加锁：SET lock:<name> <token> NX PX <ttl>
+ * - 解锁和续期：Lua脚本比较token，只操作自己持有的锁
+ * - 持有期间每 ttl/3 自动续期，进程崩溃后锁在ttl后自动失效
+ */
+const crypto = require('crypto');
+
+// 锁的默认有效期（毫秒）
+const DEFAULT_TTL = 30000;
+
+// 获取锁的默认最长等待时间（毫秒）
+const DEFAULT_WAIT = 10000;
+
+// 重试获取锁的间隔（毫秒）
+const RETRY_INTERVAL = 100;
+
+// 只删除自己持有的锁
+const RELEASE_SCRIPT = `
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0`;
+
+// 只续期自己持有的锁
+const EXTEND_SCRIPT = `
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0`;
+
+/**
+ * 锁的Redis键
+ * @param {string} name - 锁名称
+ * @returns {string}
+ */
+function lockKey(name) {
+  return `lock:${name}`;
+}
+
+/**
+ * 尝试获取锁，在等待时间内重试
+ * @param {object} redisClient - Redis客户端
+ * @param {string} name - 锁名称
+ * @param {object} options - { ttl, wait } wait为0时只尝试一次
+ * @returns {Promise<string|null>} 锁的token，未获取到时返回null
+ */
+async function acquire(redisClient, name, { ttl = DEFAULT_TTL, wait = DEFAULT_WAIT } = {}) {
+  const token = crypto.randomUUID();
+  const deadline = Date.now() + wait;
+  for (;;) {
+    const reply = await redisClient.set(lockKey(name), token, { NX: true, PX: ttl });
+    if (reply === 'OK') {
+      return token;
+    }
+    if (Date.now() + RETRY_INTERVAL > deadline) {
+      return null;
+    }
+    await new Promise(resolve => setTimeout(resolve, RETRY_INTERVAL));
+  }
+}
+
+/**
+ * 释放锁（锁已过期并被他人持有时不做任何操作）
+ * @param {object} redisClient - Redis客户端
+ * @param {string} name - 锁名称
+ * @param {string} token - acquire返回的token
+ * @returns {Promise<boolean>} 是否释放了自己持有的锁
+ */
+async function release(redisClient, name, token) {
+  const reply = await redisClient.eval(RELEASE_SCRIPT, { keys: [lockKey(name)], arguments: [token] });
+  return reply === 1;
+}
+
+/**
+ * 续期锁
+ * @param {object} redisClient - Redis客户端
+ * @param {string} name - 锁名称
+ * @param {string} token - acquire返回的token
+ * @param {number} ttl - 新的有效期（毫秒）
+ * @returns {Promise<boolean>} 锁是否仍由自己持有
+ */
+async function extend(redisClient, name, token, ttl) {
+  const reply = await redisClient.eval(EXTEND_SCRIPT, { keys: [lockKey(name)], arguments: [token, String(ttl)] });
+  return reply === 1;
+}
+
+/**
+ * 在已持有锁的情况下执行操作，执行期间自动续期，结束后释放锁
+ * @param {object} redisClient - Redis客户端
+ * @param {string} name - 锁名称
+ * @param {string} token - acquire返回的token
+ * @param {number} ttl - 锁的有效期（毫秒）
+ * @param {Function} fn - 异步操作
+ * @returns {Promise<*>} 操作的返回值
+ */
+async function runHeld(redisClient, name, token, ttl, fn) {
+  const keepAlive = setInterval(() => {
+    extend(redisClient, name, token, ttl)
+      .then(held => {
+        if (!held) console.error(`锁 ${name} 已失效`);
+      })
+      .catch(error => console.error(`续期锁 ${name} 失败: ${error.message}`));
+  }, ttl / 3);
+
+  try {
+    return await fn();
+  } finally {
+    clearInterval(keepAlive);
+    await release(redisClient, name, token)
+      .catch(error => console.error(`释放锁 ${name} 失败: ${error.message}`));
+  }
+}
+
+/**
+ * 持有锁执行操作，执行期间自动续期
+ * @param {object} redisClient - Redis客户端
+ * @param {string} name - 锁名称
+ * @param {Function} fn - 异步操作
+ * @param {object} options - { ttl, wait }
+ * @returns {Promise<*>} 操作的返回值，等待超时时抛出错误
+ */
+async function withLock(redisClient, name, fn, { ttl = DEFAULT_TTL, wait = DEFAULT_WAIT } = {}) {
+  const token = await acquire(redisClient, name, { ttl, wait });
+  if (!token) {
+    throw new Error(`资源 ${name} 正被其他操作占用，请稍后重试`);
+  }
+  return runHeld(redisClient, name, token, ttl, fn);
+}
+
+/**
+ * 锁空闲时持有锁执行操作，锁已被占用时直接跳过（用于只需一个副本执行的后台维护）
+ * @param {object} redisClient - Redis客户端
+ * @param {string} name - 锁名称
+ * @param {Function} fn - 异步操作
+ * @param {object} options - { ttl }
+ * @returns {Promise<boolean>} 是否执行了操作
+ */
+async function ifUnlocked(redisClient, name, fn, { ttl = DEFAULT_TTL } = {}) {
+  const token = await acquire(redisClient, name, { ttl, wait: 0 });
+  if (!token) {
+    return false;
+  }
+  await runHeld(redisClient, name, token, ttl, fn);
+  return true;
+}
+
+module.exports = {
+  acquire,
+  release,
+  extend,
+  withLock,
+  ifUnlocked
+};
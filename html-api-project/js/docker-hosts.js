@@ -0,0 +1,166 @@
+/**
+ * Docker主机池模块
+ *
+ * 运行容器可以分布在多台Docker主机上，主机列表通过环境变量 DOCKER_HOSTS 配置：
+ *   DOCKER_HOSTS=local=docker-socket-proxy:2375,node2=10.0.0.12:2375
+ * 每一项为 名称=主机:端口（省略名称时以主机:端口作为名称），第一项为主主机。
+ * 未配置时只有一台主机 local（docker-socket-proxy:2375）。
+ *
+ * - 主主机承担共享卷确定、预热池等与具体运行无关的操作
+ * - 新运行按 rank() 的顺序放到受管容器运行数最少、且有足够容量的主机，主机记录在 docker:<id> 哈希的host字段中
+ * - 没有host字段的旧运行属于主主机
+ *
+ * 卷读取器在运行所在的主机上创建，每台主机都需要有名称相同、指向同一存储（例如NFS）的共享卷。
+ */
+const Docker = require('dockerode');
+const metrics = require('./metrics');
+
+// 未配置DOCKER_HOSTS时的默认主机
+const DEFAULT_HOSTS = 'local=docker-socket-proxy:2375';
+
+// 受管容器的标签
+const MANAGED_LABEL = 'workmate.managed';
+
+/**
+ * 解析主机列表配置
+ * @param {string} spec - 逗号分隔的 名称=主机:端口 列表
+ * @returns {Array<object>} [{ name, host, port }]
+ */
+function parseHosts(spec) {
+  const hosts = [];
+  for (const item of spec.split(',').map(part => part.trim()).filter(Boolean)) {
+    const separator = item.indexOf('=');
+    const address = separator === -1 ? item : item.slice(separator + 1);
+    const name = separator === -1 ? item : item.slice(0, separator);
+    const [host, port] = address.split(':');
+    if (!name || !host) {
+      throw new Error(`无效的Docker主机配置: ${item}`);
+    }
+    if (hosts.some(entry => entry.name === name)) {
+      throw new Error(`Docker主机名称重复: ${name}`);
+    }
+    hosts.push({ name, host, port: Number(port) || 2375 });
+  }
+  if (hosts.length === 0) {
+    throw new Error('DOCKER_HOSTS中没有可用的Docker主机');
+  }
+  return hosts;
+}
+
+const DockerHosts = {
+    // 主机配置：[{ name, host, port }]
+    hosts: parseHosts(process.env.DOCKER_HOSTS || DEFAULT_HOSTS),
+
+    // 已创建的客户端：name -> dockerode
+    clients: new Map(),
+
+    // 本进程已选定但尚未启动完成的运行数：name -> count，避免并发放置都选中同一台主机
+    reserved: new Map(),
+
+    /**
+     * 所有主机的名称
+     * @returns {Array<string>}
+     */
+    names() {
+        return this.hosts.map(entry => entry.name);
+    },
+
+    /**
+     * 主主机的名称
+     * @returns {string}
+     */
+    primaryName() {
+        return this.hosts[0].name;
+    },
+
+    /**
+     * 获取主机的Docker客户端
+     * @param {string} [name] - 主机名称，省略时返回主主机
+     * @returns {object} dockerode客户端
+     */
+    get(name) {
+        const hostName = name || this.primaryName();
+        if (!this.clients.has(hostName)) {
+            const entry = this.hosts.find(item => item.name === hostName);
+            if (!entry) {
+                throw new Error(`未知的Docker主机: ${hostName}`);
+            }
+            this.clients.set(hostName, metrics.instrumentDocker(new Docker({
+                host: entry.host,
+                port: entry.port
+            })));
+        }
+        return this.clients.get(hostName);
+    },
+
+    /**
+     * 获取运行所在主机的Docker客户端
+     * @param {object} runInfo - Redis中的docker信息
+     * @returns {object} dockerode客户端
+     */
+    forRun(runInfo) {
+        return this.get(runInfo && runInfo.host);
+    },
+
+    /**
+     * 统计主机上运行中的受管容器数量
+     * @param {string} name - 主机名称
+     * @returns {Promise<number>}
+     */
+    async load(name) {
+        const containers = await this.get(name).listContainers({
+            filters: { label: [MANAGED_LABEL], status: ['running'] }
+        });
+        return containers.length + (this.reserved.get(name) || 0);
+    },
+
+    /**
+     * 按负载从低到高排列主机，负载相同时按配置顺序
+     * 无法连接的主机不参与排列
+     * @returns {Promise<Array<string>>} 主机名称
+     */
+    async rank() {
+        const names = this.names();
+        if (names.length === 1) {
+            return names;
+        }
+        const loads = await Promise.all(names.map(name => this.load(name).catch(error => {
+            console.error(`获取Docker主机 ${name} 的负载失败: ${error.message}`);
+            return Infinity;
+        })));
+        return names
+            .map((name, index) => ({ name, index, load: loads[index] }))
+            .filter(entry => entry.load !== Infinity)
+            .sort((a, b) => a.load - b.load || a.index - b.index)
+            .map(entry => entry.name);
+    },
+
+    /**
+     * 为新运行选择主机：受管容器运行数最少的主机
+     * @returns {Promise<string>} 主机名称
+     */
+    async place() {
+        const [best] = await this.rank();
+        if (!best) {
+            throw new Error('没有可用的Docker主机');
+        }
+        return best;
+    },
+
+    /**
+     * 在运行启动完成前为主机保留一个名额，使并发的放置看到这次启动
+     * @param {string} name - 主机名称
+     * @param {Function} fn - 在该主机上启动运行的异步操作
+     * @returns {Promise<*>} fn的返回值
+     */
+    async reserve(name, fn) {
+        this.reserved.set(name, (this.reserved.get(name) || 0) + 1);
+        try {
+            return await fn();
+        } finally {
+            this.reserved.set(name, this.reserved.get(name) - 1);
+        }
+    }
+};
+
+module.exports = DockerHosts;
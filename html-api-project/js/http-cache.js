@@ -0,0 +1,170 @@
+/**
+ * HTTP条件请求工具模块
+ *
+ * 路由在做读取文件、序列化等工作之前先计算验证器（ETag / Last-Modified），
+ * 客户端的 If-None-Match 或 If-Modified-Since 命中时直接返回304。
+ * 响应带有 Cache-Control: no-cache，浏览器会缓存响应并在每次请求时自动带上验证器。
+ */
+const fs = require('fs');
+const crypto = require('crypto');
+const { pipeline } = require('stream');
+const logArchive = require('./log-archive');
+
+// 文件内容哈希缓存：filePath -> { size, mtimeMs, hash }
+const fileHashes = new Map();
+
+// 缓存的文件数量上限，超过后丢弃最早的条目
+const MAX_FILE_HASHES = 1000;
+
+/**
+ * 计算内容的短哈希
+ * @param {string|Buffer} content - 内容
+ * @returns {string} 十六进制哈希
+ */
+function hashContent(content) {
+  return crypto.createHash('sha1').update(content).digest('hex').substring(0, 16);
+}
+
+/**
+ * 生成强ETag
+ * @param {...(string|number)} parts - 组成ETag的部分
+ * @returns {string} 带引号的ETag
+ */
+function etag(...parts) {
+  return `"${parts.join('-')}"`;
+}
+
+/**
+ * 获取文件内容的哈希，文件大小和修改时间未变时直接使用缓存
+ * @param {string} filePath - 文件路径
+ * @param {fs.Stats} stat - 文件状态
+ * @returns {Promise<string>} 十六进制哈希
+ */
+async function fileHash(filePath, stat) {
+  const cached = fileHashes.get(filePath);
+  if (cached && cached.size === stat.size && cached.mtimeMs === stat.mtimeMs) {
+    return cached.hash;
+  }
+
+  const hash = hashContent(await fs.promises.readFile(filePath));
+  fileHashes.delete(filePath);
+  fileHashes.set(filePath, { size: stat.size, mtimeMs: stat.mtimeMs, hash });
+  if (fileHashes.size > MAX_FILE_HASHES) {
+    fileHashes.delete(fileHashes.keys().next().value);
+  }
+  return hash;
+}
+
+/**
+ * 设置验证器，请求的条件头命中时返回304
+ * @param {object} req - Express请求
+ * @param {object} res - Express响应
+ * @param {object} validators - { etag, lastModified }
+ * @returns {boolean} 是否已返回304
+ */
+function notModified(req, res, { etag: tag, lastModified }) {
+  res.set('Cache-Control', 'no-cache');
+  if (tag) {
+    res.set('ETag', tag);
+  }
+  if (lastModified) {
+    res.set('Last-Modified', new Date(lastModified).toUTCString());
+  }
+
+  // req.fresh 同时处理 If-None-Match 和 If-Modified-Since
+  if (req.fresh) {
+    res.status(304).end();
+    return true;
+  }
+  return false;
+}
+
+/**
+ * 以原始文件形式发送，支持Range断点续传和条件请求（由send模块处理）
+ * @param {object} res - Express响应
+ * @param {string} filePath - 文件路径
+ * @param {object} options - { contentType } 未指定时按扩展名推断
+ * @returns {Promise<void>}
+ */
+function sendRawFile(res, filePath, { contentType } = {}) {
+  const headers = { 'Cache-Control': 'no-cache' };
+  if (contentType) {
+    headers['Content-Type'] = contentType;
+  }
+
+  return new Promise(resolve => {
+    res.sendFile(filePath, { headers, acceptRanges: true, lastModified: true, dotfiles: 'allow' }, error => {
+      // 客户端中途断开时不需要处理
+      if (error && !res.headersSent) {
+        res.status(error.status || 500).json({ success: false, error: error.message });
+      }
+      resolve();
+    });
+  });
+}
+
+/**
+ * 以原始文件形式发送gzip归档中的内容，支持单个Range和条件请求
+ * 客户端接受gzip且没有Range请求头时直接发送压缩文件（Content-Encoding: gzip），不在服务器上解压
+ * @param {object} req - Express请求
+ * @param {object} res - Express响应
+ * @param {string} filePath - 归档文件路径
+ * @param {object} info - { size, mtimeMs, contentType }，size为解压后的大小
+ * @returns {Promise<void>}
+ */
+async function sendArchivedFile(req, res, filePath, { size, mtimeMs, contentType }) {
+  res.set('Accept-Ranges', 'bytes');
+  res.set('Vary', 'Accept-Encoding');
+  if (contentType) {
+    res.set('Content-Type', contentType);
+  }
+  if (notModified(req, res, { etag: etag('archive', size, Math.floor(mtimeMs)), lastModified: mtimeMs })) {
+    return;
+  }
+
+  let source;
+  const ranges = req.headers.range ? req.range(size) : undefined;
+  if (ranges === -1) {
+    res.status(416).set('Content-Range', `bytes */${size}`).end();
+    return;
+  }
+  if (Array.isArray(ranges) && ranges.type === 'bytes' && ranges.length === 1) {
+    const { start, end } = ranges[0];
+    res.status(206).set({ 'Content-Range': `bytes ${start}-${end}/${size}`, 'Content-Length': end - start + 1 });
+    source = logArchive.createReadStream(filePath, { start, end });
+  } else if (req.acceptsEncodings('gzip') === 'gzip') {
+    const { size: storedSize } = await fs.promises.stat(filePath);
+    res.status(200).set({ 'Content-Encoding': 'gzip', 'Content-Length': storedSize });
+    source = fs.createReadStream(filePath);
+  } else {
+    res.status(200).set('Content-Length', size);
+    source = logArchive.createReadStream(filePath);
+  }
+
+  if (req.method === 'HEAD') {
+    source.destroy();
+    res.end();
+    return;
+  }
+  await new Promise(resolve => {
+    pipeline(source, res, error => {
+      // 客户端中途断开时不需要处理
+      if (error && !res.headersSent) {
+        for (const header of ['Content-Encoding', 'Content-Length', 'Content-Range']) {
+          res.removeHeader(header);
+        }
+        res.status(500).json({ success: false, error: error.message });
+      }
+      resolve();
+    });
+  });
+}
+
+module.exports = {
+  hashContent,
+  etag,
+  fileHash,
+  notModified,
+  sendRawFile,
+  sendArchivedFile
+};
@@ -0,0 +1,201 @@
+/**
+ * 镜像管理模块
+ *
+ * 启动子docker前确保镜像在本地可用，只在必要时拉取：
+ * - 本地已有且在检查间隔内确认过的镜像直接使用
+ * - 超过检查间隔后，通过distribution接口比较远端digest，只有变化时才拉取
+ * - 多个请求同时需要同一个镜像时共享一次进行中的拉取
+ * - 每台Docker主机各自维护本地镜像，检查和拉取按主机分别进行
+ *
+ * 拉取策略：
+ * - always：每次都拉取（并发请求仍共享同一次拉取）
+ * - interval：按检查间隔比较远端digest（默认）
+ * - never：本地存在即使用，只在缺失时拉取；以digest引用的镜像总是按此策略处理
+ */
+
+// 默认拉取策略
+const DEFAULT_POLICY = process.env.IMAGE_PULL_POLICY || 'interval';
+
+// 远端digest检查间隔（秒）
+const CHECK_INTERVAL = Number(process.env.IMAGE_CHECK_INTERVAL) || 3600;
+
+// 支持的拉取策略
+const POLICIES = ['always', 'interval', 'never'];
+
+/**
+ * 补全镜像名称中省略的latest标签，保证同一镜像使用同一个键
+ * @param {string} imageName - 镜像名称
+ * @returns {string} 规范化的镜像名称
+ */
+function normalizeImageName(imageName) {
+    if (imageName.includes('@')) {
+        return imageName;
+    }
+    const lastSegment = imageName.slice(imageName.lastIndexOf('/') + 1);
+    return lastSegment.includes(':') ? imageName : `${imageName}:latest`;
+}
+
+const ImageManager = {
+    // Docker主机池，由API模块注入
+    hosts: null,
+
+    // 最近一次确认镜像为最新的时间：<host>|<imageName> -> 毫秒时间戳
+    checkedAt: new Map(),
+
+    // 进行中的确认/拉取操作：<host>|<imageName> -> Promise
+    inflight: new Map(),
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { hosts }
+     */
+    configure({ hosts }) {
+        this.hosts = hosts;
+    },
+
+    /**
+     * 确定镜像使用的拉取策略
+     * @param {string} imageName - 规范化的镜像名称
+     * @param {string} [policy] - 指定的策略（例如scenario配置中的imagePullPolicy）
+     * @returns {string} 拉取策略
+     */
+    resolvePolicy(imageName, policy) {
+        if (imageName.includes('@')) {
+            return 'never';
+        }
+        const resolved = policy || DEFAULT_POLICY;
+        if (!POLICIES.includes(resolved)) {
+            console.error(`未知的镜像拉取策略 ${resolved}，使用 interval`);
+            return 'interval';
+        }
+        return resolved;
+    },
+
+    /**
+     * 确保镜像在主机上可用，必要时拉取
+     * @param {string} imageName - 镜像名称
+     * @param {string} [policy] - 拉取策略
+     * @param {string} [host] - 主机名称，省略时为主主机
+     * @returns {Promise<object>} { image, pulled }
+     */
+    ensureImage(imageName, policy, host) {
+        const image = normalizeImageName(imageName);
+        const key = `${host || this.hosts.primaryName()}|${image}`;
+        if (this.inflight.has(key)) {
+            return this.inflight.get(key);
+        }
+
+        const operation = this.ensureFresh(image, this.resolvePolicy(image, policy), this.hosts.get(host), key)
+            .finally(() => this.inflight.delete(key));
+        this.inflight.set(key, operation);
+        return operation;
+    },
+
+    /**
+     * 按策略检查镜像并在需要时拉取
+     * @param {string} image - 规范化的镜像名称
+     * @param {string} policy - 拉取策略
+     * @param {object} docker - 主机的Docker客户端
+     * @param {string} key - 检查时间的记录键
+     * @returns {Promise<object>} { image, pulled }
+     */
+    async ensureFresh(image, policy, docker, key) {
+        const local = await this.inspectLocal(image, docker);
+
+        if (local && policy === 'never') {
+            return { image, pulled: false };
+        }
+
+        if (local && policy === 'interval') {
+            const checkedAt = this.checkedAt.get(key) || 0;
+            if (Date.now() - checkedAt < CHECK_INTERVAL * 1000) {
+                return { image, pulled: false };
+            }
+
+            try {
+                if (await this.isUpToDate(image, local, docker)) {
+                    this.checkedAt.set(key, Date.now());
+                    return { image, pulled: false };
+                }
+            } catch (error) {
+                // 仓库暂时不可用时继续使用本地镜像，下次请求再检查
+                console.error(`检查镜像 ${image} 的远端digest失败，使用本地镜像: ${error.message}`);
+                return { image, pulled: false };
+            }
+        }
+
+        try {
+            await this.pull(image, docker);
+        } catch (error) {
+            if (local) {
+                console.error(`拉取镜像 ${image} 失败，使用本地镜像: ${error.message}`);
+                return { image, pulled: false };
+            }
+            throw error;
+        }
+        this.checkedAt.set(key, Date.now());
+        return { image, pulled: true };
+    },
+
+    /**
+     * 查询本地镜像
+     * @param {string} image - 镜像名称
+     * @param {object} docker - 主机的Docker客户端
+     * @returns {Promise<object|null>} 镜像信息，本地不存在时返回null
+     */
+    async inspectLocal(image, docker) {
+        try {
+            return await docker.getImage(image).inspect();
+        } catch (error) {
+            if (error.statusCode === 404) {
+                return null;
+            }
+            throw error;
+        }
+    },
+
+    /**
+     * 比较本地镜像与仓库中同一标签的digest
+     * @param {string} image - 镜像名称
+     * @param {object} local - 本地镜像信息
+     * @param {object} docker - 主机的Docker客户端
+     * @returns {Promise<boolean>} 本地镜像是否为最新
+     */
+    async isUpToDate(image, local, docker) {
+        const repoDigests = local.RepoDigests || [];
+        if (repoDigests.length === 0) {
+            // 本地构建的镜像没有仓库digest，无法也无需比较
+            return true;
+        }
+        const distribution = await docker.getImage(image).distribution();
+        const remoteDigest = distribution.Descriptor && distribution.Descriptor.digest;
+        return repoDigests.some(digest => digest.endsWith(`@${remoteDigest}`));
+    },
+
+    /**
+     * 拉取镜像，并等待拉取流结束
+     * @param {string} image - 镜像名称
+     * @param {object} docker - 主机的Docker客户端
+     * @returns {Promise<void>}
+     */
+    async pull(image, docker) {
+        console.log(`开始拉取镜像: ${image}`);
+        const stream = await docker.pull(image);
+        await new Promise((resolve, reject) => {
+            docker.modem.followProgress(stream, (error, output) => {
+                if (error) {
+                    return reject(error);
+                }
+                // 拉取过程中的错误以 { error } 事件的形式出现在流中
+                const failed = (output || []).find(event => event && event.error);
+                if (failed) {
+                    return reject(new Error(failed.error));
+                }
+                resolve();
+            });
+        });
+        console.log(`镜像拉取完成: ${image}`);
+    }
+};
+
+module.exports = ImageManager;
@@ -0,0 +1,134 @@
+/**
+ * 运行启动时间线模块
+ *
+ * 记录每次启动在 API.startDocker 中各阶段的开始时间和耗时，以及首次出现日志和退出的时间，
+ * 保存在 docker:<id>:trace 哈希中，由 /api/docker/status 返回，用于在生产环境中定位慢启动。
+ *
+ * 哈希字段：
+ * - requestedAt: 开始启动的时间
+ * - launchedAt: 启动完成的时间
+ * - phases: JSON数组 [{ phase, startedAt, durationMs, error? }]
+ * - firstLogAt: 卷读取器首次同步到非空日志的时间
+ * - exitedAt: 容器最近一次退出的时间
+ */
+const metrics = require('./metrics');
+
+/**
+ * 时间线的Redis键
+ * @param {string} dockerId - Docker ID
+ * @returns {string}
+ */
+function traceKey(dockerId) {
+  return `docker:${dockerId}:trace`;
+}
+
+/**
+ * 创建一次启动的时间线，阶段同时计入Prometheus的启动阶段直方图
+ * @returns {object} { requestedAt, phases, phase(name, fn) }
+ */
+function createTrace() {
+  return {
+    requestedAt: new Date(),
+    phases: [],
+
+    /**
+     * 执行并记录一个阶段
+     * @param {string} name - 阶段名称
+     * @param {Function} fn - 异步操作
+     * @returns {Promise<*>} 操作的返回值
+     */
+    async phase(name, fn) {
+      const startedAt = new Date();
+      const entry = { phase: name, startedAt: startedAt.toISOString(), durationMs: 0 };
+      this.phases.push(entry);
+      try {
+        return await metrics.timePhase(name, fn);
+      } catch (error) {
+        entry.error = error.message;
+        throw error;
+      } finally {
+        entry.durationMs = Date.now() - startedAt.getTime();
+      }
+    }
+  };
+}
+
+/**
+ * 保存启动时间线（与docker信息在同一个multi中写入）
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ * @param {object} trace - createTrace的返回值
+ */
+function save(pipeline, dockerId, trace) {
+  pipeline.hSet(traceKey(dockerId), {
+    requestedAt: trace.requestedAt.toISOString(),
+    launchedAt: new Date().toISOString(),
+    phases: JSON.stringify(trace.phases)
+  });
+}
+
+/**
+ * 记录首次出现日志的时间（只保留最早的一次）
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ * @param {string} time - ISO时间
+ */
+function recordFirstLog(pipeline, dockerId, time) {
+  pipeline.hSetNX(traceKey(dockerId), 'firstLogAt', time);
+}
+
+/**
+ * 记录容器退出的时间
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ * @param {string} time - ISO时间
+ */
+function recordExit(pipeline, dockerId, time) {
+  pipeline.hSet(traceKey(dockerId), 'exitedAt', time);
+}
+
+/**
+ * 两个ISO时间之间的毫秒数
+ * @param {string} from - 开始时间
+ * @param {string} to - 结束时间
+ * @returns {number|null}
+ */
+function elapsed(from, to) {
+  if (!from || !to) {
+    return null;
+  }
+  const ms = Date.parse(to) - Date.parse(from);
+  return Number.isNaN(ms) ? null : ms;
+}
+
+/**
+ * 读取启动时间线
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<object|null>} 时间线，启动时间线功能上线之前的运行返回null
+ */
+async function read(redisClient, dockerId) {
+  const trace = await redisClient.hGetAll(traceKey(dockerId));
+  if (!trace || !trace.requestedAt) {
+    return null;
+  }
+
+  return {
+    requestedAt: trace.requestedAt,
+    launchedAt: trace.launchedAt || null,
+    phases: JSON.parse(trace.phases || '[]'),
+    firstLogAt: trace.firstLogAt || null,
+    exitedAt: trace.exitedAt || null,
+    launchMs: elapsed(trace.requestedAt, trace.launchedAt),
+    timeToFirstLogMs: elapsed(trace.requestedAt, trace.firstLogAt)
+  };
+}
+
+module.exports = {
+  traceKey,
+  createTrace,
+  save,
+  recordFirstLog,
+  recordExit,
+  read
+};
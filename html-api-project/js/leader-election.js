@@ -0,0 +1,92 @@
+/**
+ * 领导者选举模块
+ *
+ * 多个后端副本中只有一个负责定时任务（过期资源清理、预热池补充等）：
+ * - 每个副本定期尝试 SET leader:scheduler <id> NX PX <ttl>，成功者成为领导者
+ * - 领导者每 ttl/3 续期一次，续期失败（例如与Redis断开超过ttl）即放弃领导者身份
+ * - 领导者进程退出后，其他副本最迟在ttl后接任
+ */
+const os = require('os');
+const crypto = require('crypto');
+const distributedLock = require('./distributed-lock');
+
+// 领导者租约的有效期（毫秒）
+const LEASE_TTL = Number(process.env.LEADER_LEASE_TTL) || 15000;
+
+// 选举使用的锁名称
+const LEADER_LOCK = 'leader:scheduler';
+
+const LeaderElection = {
+    // Redis客户端，由API模块注入
+    redisClient: null,
+
+    // 当前副本的标识
+    id: `${os.hostname()}-${process.pid}-${crypto.randomBytes(3).toString('hex')}`,
+
+    // 作为领导者持有的锁token
+    token: null,
+    timer: null,
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { redisClient }
+     */
+    configure({ redisClient }) {
+        this.redisClient = redisClient;
+    },
+
+    /**
+     * 开始参与选举（只会启动一次）
+     */
+    async start() {
+        if (this.timer) return;
+        await this.campaign();
+        this.timer = setInterval(() => this.campaign(), LEASE_TTL / 3);
+    },
+
+    /**
+     * 续期租约，或在没有领导者时尝试成为领导者
+     */
+    async campaign() {
+        try {
+            if (this.token) {
+                if (!(await distributedLock.extend(this.redisClient, LEADER_LOCK, this.token, LEASE_TTL))) {
+                    this.token = null;
+                    console.log(`副本 ${this.id} 失去领导者身份`);
+                }
+                return;
+            }
+            this.token = await distributedLock.acquire(this.redisClient, LEADER_LOCK, { ttl: LEASE_TTL, wait: 0 });
+            if (this.token) {
+                console.log(`副本 ${this.id} 成为领导者，负责定时任务`);
+            }
+        } catch (error) {
+            // 无法确认租约时按失去领导者身份处理，避免两个副本同时执行定时任务
+            this.token = null;
+            console.error(`领导者选举失败: ${error.message}`);
+        }
+    },
+
+    /**
+     * 当前副本是否为领导者
+     * @returns {boolean}
+     */
+    isLeader() {
+        return this.token !== null;
+    },
+
+    /**
+     * 退出选举并释放租约，让其他副本立即接任
+     */
+    async stop() {
+        clearInterval(this.timer);
+        this.timer = null;
+        if (this.token) {
+            const token = this.token;
+            this.token = null;
+            await distributedLock.release(this.redisClient, LEADER_LOCK, token);
+        }
+    }
+};
+
+module.exports = LeaderElection;
@@ -0,0 +1,250 @@
+/**
+ * 日志归档模块
+ *
+ * 运行退出并完成最终同步后，把镜像目录中logs下的文件用gzip压缩保存到归档目录：
+ *   <LOG_ARCHIVE_PATH>/<dockerId>/<文件名>.gz
+ * 每个运行的归档清单（"run.log" -> { archive, size, storedSize, tier, archivedAt }）保存在Redis的
+ * docker:<id> 哈希的logs字段中，由run-registry模块维护；保留期限由log-retention模块执行：
+ * 超过期限的完整日志只保留末尾（<文件名>.tail.gz），再超过期限后删除。
+ *
+ * 读取函数对压缩和未压缩的文件都适用：压缩文件边读边解压，不会解压到磁盘或整个读入内存。
+ * 归档默认位于共享卷中，多个后端副本都能读到。
+ */
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+const crypto = require('crypto');
+const { Transform } = require('stream');
+const { pipeline } = require('stream/promises');
+
+// 归档目录（默认在共享卷中，与各运行的镜像目录并列；容器名称不会以点开头）
+const ARCHIVE_PATH = process.env.LOG_ARCHIVE_PATH || '/shared-mounts/.logs';
+
+// 压缩文件的扩展名
+const COMPRESSED_SUFFIX = '.gz';
+
+// 换行符
+const NEWLINE = 0x0a;
+
+/**
+ * 运行的归档目录
+ * @param {string} dockerId - Docker ID
+ * @returns {string}
+ */
+function runDir(dockerId) {
+  return path.join(ARCHIVE_PATH, dockerId);
+}
+
+/**
+ * 归档清单中某个日志文件的路径
+ * @param {string} dockerId - Docker ID
+ * @param {object} entry - 清单条目
+ * @returns {string}
+ */
+function filePath(dockerId, entry) {
+  return path.join(runDir(dockerId), entry.archive);
+}
+
+/**
+ * 判断文件是否为压缩的归档（镜像目录中以.gz结尾的日志按原样读取）
+ * @param {string} filePath - 文件路径
+ * @returns {boolean}
+ */
+function isCompressed(filePath) {
+  return filePath.startsWith(ARCHIVE_PATH + path.sep) && filePath.endsWith(COMPRESSED_SUFFIX);
+}
+
+/**
+ * 把源流压缩写入归档文件，先写临时文件再重命名，读取方不会看到写了一半的文件
+ * @param {stream.Readable} source - 未压缩的内容
+ * @param {string} target - 归档文件路径
+ * @returns {Promise<object>} { size, storedSize }
+ */
+async function writeCompressed(source, target) {
+  const temp = `${target}.${crypto.randomBytes(4).toString('hex')}.tmp`;
+  let size = 0;
+  const counter = new Transform({
+    transform(chunk, encoding, callback) {
+      size += chunk.length;
+      callback(null, chunk);
+    }
+  });
+  try {
+    await pipeline(source, counter, zlib.createGzip(), fs.createWriteStream(temp));
+    await fs.promises.rename(temp, target);
+  } catch (error) {
+    await fs.promises.rm(temp, { force: true });
+    throw error;
+  }
+  const { size: storedSize } = await fs.promises.stat(target);
+  return { size, storedSize };
+}
+
+/**
+ * 压缩归档运行的全部日志文件
+ * @param {string} dockerId - Docker ID
+ * @param {string} logDir - 镜像目录中的logs目录（卷读取器的最终同步结果）
+ * @returns {Promise<object>} 归档清单 { "run.log": { archive, size, storedSize, tier, archivedAt }, ... }
+ */
+async function archive(dockerId, logDir) {
+  let names;
+  try {
+    names = await fs.promises.readdir(logDir);
+  } catch (error) {
+    if (error.code === 'ENOENT') return {};
+    throw error;
+  }
+
+  const logs = {};
+  await fs.promises.mkdir(runDir(dockerId), { recursive: true });
+  for (const name of names) {
+    // 跳过读取器替换文件时留下的临时文件
+    if (name.endsWith('.tmp')) continue;
+    const source = path.join(logDir, name);
+    if (!(await fs.promises.stat(source)).isFile()) continue;
+    const entry = { archive: `${name}${COMPRESSED_SUFFIX}`, tier: 'full', archivedAt: new Date().toISOString() };
+    Object.assign(entry, await writeCompressed(fs.createReadStream(source), filePath(dockerId, entry)));
+    logs[name] = entry;
+  }
+  return logs;
+}
+
+/**
+ * 只保留日志末尾不超过tailBytes字节的完整行，写入新的归档文件（原文件由调用方在更新清单后删除）
+ * @param {string} dockerId - Docker ID
+ * @param {string} name - 日志文件名
+ * @param {object} entry - 完整日志的清单条目
+ * @param {number} tailBytes - 保留的最大字节数
+ * @returns {Promise<object>} 新的清单条目
+ */
+async function truncateToTail(dockerId, name, entry, tailBytes) {
+  const start = Math.max(0, entry.size - tailBytes);
+  let skipping = start > 0;
+  // 从保留范围内的第一个完整行开始
+  const lineStart = new Transform({
+    transform(chunk, encoding, callback) {
+      if (!skipping) {
+        return callback(null, chunk);
+      }
+      const index = chunk.indexOf(NEWLINE);
+      if (index === -1) {
+        return callback();
+      }
+      skipping = false;
+      callback(null, chunk.subarray(index + 1));
+    }
+  });
+
+  const tail = {
+    archive: `${name}.tail${COMPRESSED_SUFFIX}`,
+    tier: 'tail',
+    originalSize: entry.size,
+    archivedAt: new Date().toISOString()
+  };
+  const source = createReadStream(filePath(dockerId, entry), { start }).pipe(lineStart);
+  Object.assign(tail, await writeCompressed(source, filePath(dockerId, tail)));
+  return tail;
+}
+
+/**
+ * 删除归档文件
+ * @param {string} dockerId - Docker ID
+ * @param {object} entry - 清单条目
+ * @returns {Promise<void>}
+ */
+async function removeFile(dockerId, entry) {
+  await fs.promises.rm(filePath(dockerId, entry), { force: true });
+}
+
+/**
+ * 删除运行的全部归档
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<void>}
+ */
+async function remove(dockerId) {
+  await fs.promises.rm(runDir(dockerId), { recursive: true, force: true });
+}
+
+/**
+ * 读取文件中 [start, end] 范围内的字节（end包含在内，与fs.createReadStream一致），压缩文件边读边解压
+ * @param {string} filePath - 文件路径
+ * @param {object} [range] - { start, end }
+ * @returns {stream.Readable}
+ */
+function createReadStream(filePath, { start = 0, end = Infinity } = {}) {
+  if (!isCompressed(filePath)) {
+    return fs.createReadStream(filePath, { start, end });
+  }
+
+  const source = fs.createReadStream(filePath);
+  const decompress = zlib.createGunzip();
+  let position = 0;
+  let done = false;
+  const slice = new Transform({
+    transform(chunk, encoding, callback) {
+      if (done) {
+        return callback();
+      }
+      const from = Math.max(start - position, 0);
+      const to = Math.min(end + 1 - position, chunk.length);
+      position += chunk.length;
+      if (from < to) {
+        this.push(chunk.subarray(from, to));
+      }
+      // 读到范围末尾后不再解压剩余部分
+      if (position > end) {
+        done = true;
+        this.push(null);
+        source.destroy();
+        decompress.destroy();
+      }
+      callback();
+    }
+  });
+  source.on('error', error => slice.destroy(error));
+  decompress.on('error', error => slice.destroy(error));
+  slice.on('close', () => {
+    source.destroy();
+    decompress.destroy();
+  });
+  return source.pipe(decompress).pipe(slice);
+}
+
+/**
+ * 读取文件中 [start, end) 范围内的字节
+ * @param {string} filePath - 文件路径
+ * @param {number} start - 起始位置
+ * @param {number} end - 结束位置（不包含）
+ * @returns {Promise<Buffer>}
+ */
+async function readRange(filePath, start, end) {
+  if (end <= start) {
+    return Buffer.alloc(0);
+  }
+  if (!isCompressed(filePath)) {
+    const handle = await fs.promises.open(filePath, 'r');
+    try {
+      const { bytesRead, buffer } = await handle.read(Buffer.alloc(end - start), 0, end - start, start);
+      return buffer.subarray(0, bytesRead);
+    } finally {
+      await handle.close();
+    }
+  }
+  const chunks = [];
+  for await (const chunk of createReadStream(filePath, { start, end: end - 1 })) {
+    chunks.push(chunk);
+  }
+  return Buffer.concat(chunks);
+}
+
+module.exports = {
+  ARCHIVE_PATH,
+  filePath,
+  isCompressed,
+  archive,
+  truncateToTail,
+  removeFile,
+  remove,
+  createReadStream,
+  readRange
+};
@@ -0,0 +1,335 @@
+/**
+ * 日志分段读取模块
+ *
+ * 支持按字节范围、最后N行、按行分页读取日志，并以流的方式写出JSON响应：
+ * 日志内容边读边转义写入 "data" 字符串，不会把整个文件读入内存，
+ * 每个请求占用的内存与日志大小无关。已归档的压缩日志边读边解压，读取方式相同。
+ */
+const fs = require('fs');
+const { once } = require('events');
+const { StringDecoder } = require('string_decoder');
+const logArchive = require('./log-archive');
+
+// 从文件末尾向前查找换行符时每次读取的块大小
+const TAIL_BLOCK = 64 * 1024;
+
+// 按行分页时默认和最大的行数
+const DEFAULT_LINE_LIMIT = 1000;
+const MAX_LINE_LIMIT = 10000;
+
+// 换行符
+const NEWLINE = 0x0a;
+
+/**
+ * 解析非负整数查询参数
+ * @param {object} query - 查询参数
+ * @param {string} name - 参数名
+ * @returns {number|undefined} 参数值，未提供时返回undefined
+ */
+function parseCount(query, name) {
+  const value = query[name];
+  if (value === undefined || value === '') {
+    return undefined;
+  }
+  const number = Number(value);
+  if (!Number.isInteger(number) || number < 0) {
+    throw new Error(`无效的${name}参数，必须为非负整数`);
+  }
+  return number;
+}
+
+/**
+ * 解析日志读取方式
+ * - ?start=&end= 按字节范围读取（end不包含）
+ * - ?tail=N 读取最后N行
+ * - ?lineOffset=&lineLimit= 按行分页读取
+ * - 不带参数时读取末尾不超过readLimit字节的完整行
+ * @param {object} query - 查询参数
+ * @param {number} readLimit - 不带参数时最多读取的字节数
+ * @returns {object} 读取方式
+ */
+function parseLogQuery(query, readLimit) {
+  const start = parseCount(query, 'start');
+  const end = parseCount(query, 'end');
+  const tail = parseCount(query, 'tail');
+  const lineOffset = parseCount(query, 'lineOffset');
+  const lineLimit = parseCount(query, 'lineLimit');
+
+  const modes = [
+    start !== undefined || end !== undefined,
+    tail !== undefined,
+    lineOffset !== undefined || lineLimit !== undefined
+  ].filter(Boolean).length;
+  if (modes > 1) {
+    throw new Error('字节范围（start/end）、tail和按行分页（lineOffset/lineLimit）只能使用其中一种');
+  }
+
+  if (tail !== undefined) {
+    return { mode: 'tail', lines: tail };
+  }
+  if (lineOffset !== undefined || lineLimit !== undefined) {
+    return {
+      mode: 'lines',
+      lineOffset: lineOffset || 0,
+      lineLimit: Math.min(lineLimit === undefined ? DEFAULT_LINE_LIMIT : lineLimit, MAX_LINE_LIMIT)
+    };
+  }
+  if (start !== undefined || end !== undefined) {
+    if (start !== undefined && end !== undefined && end < start) {
+      throw new Error('无效的字节范围，end不能小于start');
+    }
+    return { mode: 'bytes', start: start || 0, end };
+  }
+  return { mode: 'latest', bytes: readLimit };
+}
+
+/**
+ * 从文件末尾向前查找最后N行的起始位置
+ * @param {string} filePath - 文件路径
+ * @param {number} size - 文件大小
+ * @param {number} lines - 行数
+ * @returns {Promise<number>} 起始字节位置
+ */
+async function findTailStart(filePath, size, lines) {
+  if (lines === 0) {
+    return size;
+  }
+  if (logArchive.isCompressed(filePath)) {
+    return findTailStartInStream(filePath, size, lines);
+  }
+
+  const handle = await fs.promises.open(filePath, 'r');
+  try {
+    const buffer = Buffer.alloc(TAIL_BLOCK);
+    let position = size;
+    let newlines = 0;
+
+    while (position > 0) {
+      const length = Math.min(TAIL_BLOCK, position);
+      position -= length;
+      await handle.read(buffer, 0, length, position);
+
+      for (let i = length - 1; i >= 0; i--) {
+        // 文件末尾的换行符只是最后一行的结束
+        if (buffer[i] === NEWLINE && position + i !== size - 1) {
+          newlines++;
+          if (newlines === lines) {
+            return position + i + 1;
+          }
+        }
+      }
+    }
+    return 0;
+  } finally {
+    await handle.close();
+  }
+}
+
+/**
+ * 从指定位置向后查找下一行的起始位置
+ * @param {string} filePath - 文件路径
+ * @param {number} position - 开始查找的位置
+ * @param {number} end - 查找的结束位置（不包含）
+ * @returns {Promise<number>} 下一行的起始字节位置，到end都没有换行符时返回position
+ */
+async function findLineStart(filePath, position, end) {
+  let offset = position;
+  if (end > position) {
+    for await (const chunk of logArchive.createReadStream(filePath, { start: position, end: end - 1 })) {
+      const index = chunk.indexOf(NEWLINE);
+      if (index !== -1) {
+        return offset + index + 1;
+      }
+      offset += chunk.length;
+    }
+  }
+  // 没有换行符时保留这一段不完整的行
+  return position;
+}
+
+/**
+ * 在不能随机读取的压缩日志中查找最后N行的起始位置：顺序读一遍，只保留最近N个行首位置
+ * @param {string} filePath - 文件路径
+ * @param {number} size - 文件大小（解压后）
+ * @param {number} lines - 行数
+ * @returns {Promise<number>} 起始字节位置
+ */
+async function findTailStartInStream(filePath, size, lines) {
+  const starts = [];
+  let count = 0;
+  let position = 0;
+  if (size > 0) {
+    for await (const chunk of logArchive.createReadStream(filePath, { end: size - 1 })) {
+      for (let index = chunk.indexOf(NEWLINE); index !== -1; index = chunk.indexOf(NEWLINE, index + 1)) {
+        // 文件末尾的换行符只是最后一行的结束
+        if (position + index !== size - 1) {
+          starts[count % lines] = position + index + 1;
+          count++;
+        }
+      }
+      position += chunk.length;
+    }
+  }
+  return count >= lines ? starts[count % lines] : 0;
+}
+
+/**
+ * 把文本转义后写入JSON字符串，遵守响应的背压
+ * @param {object} res - HTTP响应
+ * @param {string} text - 文本
+ * @returns {Promise<boolean>} 客户端是否仍然连接
+ */
+async function writeEscaped(res, text) {
+  if (res.destroyed) {
+    return false;
+  }
+  if (text && !res.write(JSON.stringify(text).slice(1, -1))) {
+    await Promise.race([once(res, 'drain'), once(res, 'close')]);
+  }
+  return !res.destroyed;
+}
+
+/**
+ * 以JSON响应流式写出日志的指定部分
+ * 响应格式：{ "success": true, "data": "...", "totalSize": ..., "start": ..., "end": ..., ... }
+ * 默认读取方式截断了日志开头时还有 "truncated": true
+ * @param {object} res - HTTP响应
+ * @param {string} filePath - 日志文件路径
+ * @param {number} totalSize - 日志文件大小（读取不超过这个位置，与验证器保持一致）
+ * @param {object} logQuery - parseLogQuery的返回值
+ */
+async function sendLog(res, filePath, totalSize, logQuery) {
+  let start = 0;
+  let end = totalSize;
+  if (logQuery.mode === 'bytes') {
+    start = Math.min(logQuery.start, totalSize);
+    end = logQuery.end === undefined ? totalSize : Math.min(logQuery.end, totalSize);
+  } else if (logQuery.mode === 'tail') {
+    start = await findTailStart(filePath, totalSize, logQuery.lines);
+  } else if (logQuery.mode === 'latest' && totalSize > logQuery.bytes) {
+    start = await findLineStart(filePath, totalSize - logQuery.bytes, totalSize);
+  }
+
+  const meta = { totalSize };
+  const decoder = new StringDecoder('utf8');
+
+  res.status(200).type('application/json');
+  res.write('{"success":true,"data":"');
+
+  try {
+    if (logQuery.mode === 'lines') {
+      Object.assign(meta, await writeLines(res, filePath, totalSize, logQuery, decoder));
+    } else {
+      if (end > start) {
+        for await (const chunk of logArchive.createReadStream(filePath, { start, end: end - 1 })) {
+          if (!(await writeEscaped(res, decoder.write(chunk)))) {
+            return;
+          }
+        }
+      }
+      Object.assign(meta, { start, end });
+      if (logQuery.mode === 'latest' && start > 0) {
+        meta.truncated = true;
+      }
+    }
+    await writeEscaped(res, decoder.end());
+  } catch (error) {
+    // 响应头已经发出，只能中断连接
+    console.error(`读取日志 ${filePath} 失败: ${error.message}`);
+    res.destroy(error);
+    return;
+  }
+
+  res.end(`",${JSON.stringify(meta).slice(1)}`);
+}
+
+/**
+ * 按行分页写出日志，返回分页信息
+ * @param {object} res - HTTP响应
+ * @param {string} filePath - 日志文件路径
+ * @param {number} totalSize - 日志文件大小
+ * @param {object} logQuery - { lineOffset, lineLimit }
+ * @param {StringDecoder} decoder - UTF-8解码器
+ * @returns {Promise<object>} { start, end, lineOffset, lineCount, nextLineOffset, hasMore }
+ */
+async function writeLines(res, filePath, totalSize, { lineOffset, lineLimit }, decoder) {
+  const lastLine = lineOffset + lineLimit;
+  let line = 0;
+  let position = 0;
+  let start = null;
+  let end = 0;
+  let endsWithNewline = true;
+
+  if (totalSize > 0 && lineLimit > 0) {
+    for await (const chunk of logArchive.createReadStream(filePath, { end: totalSize - 1 })) {
+      let from = 0;
+      let to = chunk.length;
+
+      // 跳过lineOffset之前的行
+      while (line < lineOffset && from < chunk.length) {
+        const index = chunk.indexOf(NEWLINE, from);
+        if (index === -1) {
+          from = chunk.length;
+        } else {
+          line++;
+          from = index + 1;
+        }
+      }
+
+      // 找到本页最后一行的结束位置
+      let cursor = from;
+      let done = false;
+      while (line >= lineOffset && cursor < chunk.length) {
+        const index = chunk.indexOf(NEWLINE, cursor);
+        if (index === -1) {
+          break;
+        }
+        line++;
+        cursor = index + 1;
+        if (line === lastLine) {
+          to = cursor;
+          done = true;
+          break;
+        }
+      }
+
+      if (from < to && line >= lineOffset) {
+        if (start === null) {
+          start = position + from;
+        }
+        end = position + to;
+        endsWithNewline = chunk[to - 1] === NEWLINE;
+        if (!(await writeEscaped(res, decoder.write(chunk.subarray(from, to))))) {
+          break;
+        }
+      }
+
+      position += chunk.length;
+      if (done) {
+        break;
+      }
+    }
+  }
+
+  if (start === null) {
+    start = end = Math.min(position, totalSize);
+  }
+  // 文件末尾没有换行符的最后一行也算一行
+  const partialLine = end > start && !endsWithNewline ? 1 : 0;
+  const lineCount = Math.max(0, line - lineOffset) + partialLine;
+
+  return {
+    start,
+    end,
+    lineOffset,
+    lineCount,
+    nextLineOffset: lineOffset + lineCount,
+    hasMore: end < totalSize
+  };
+}
+
+module.exports = {
+  parseLogQuery,
+  findTailStart,
+  sendLog
+};
@@ -0,0 +1,139 @@
+/**
+ * 日志保留模块
+ *
+ * 按运行结束的时间分级保留日志归档（log-archive模块）：
+ * - 结束后 LOG_RETENTION_FULL_DAYS 天内（默认7天）保留完整日志
+ * - 之后只保留末尾 LOG_RETENTION_TAIL_BYTES 字节（默认64KiB）内的完整行，直到结束后 LOG_RETENTION_TAIL_DAYS 天（默认30天）
+ * - 再之后删除日志归档和运行保存的结果文件，运行信息中记录 logsExpiredAt
+ * 运行被定时清理删除后，日志归档和结果文件仍按各级别保留（记录见run-registry模块的docker:<id>:retained）。
+ * 各级别的运行按结束时间保存在有序集合中（键见run-registry模块），检查时只需按分数范围读取到期的运行。
+ * 由领导者定期执行，每个运行持有该容器的锁处理，与状态调整和清理互斥。
+ */
+const logArchive = require('./log-archive');
+const runRegistry = require('./run-registry');
+const distributedLock = require('./distributed-lock');
+
+// 一天的毫秒数
+const DAY = 24 * 60 * 60 * 1000;
+
+// 各级别的保留天数（从运行结束时算起）和只保留末尾时的字节数
+const FULL_DAYS = Number(process.env.LOG_RETENTION_FULL_DAYS) || 7;
+const TAIL_DAYS = Number(process.env.LOG_RETENTION_TAIL_DAYS) || 30;
+const TAIL_BYTES = Number(process.env.LOG_RETENTION_TAIL_BYTES) || 64 * 1024;
+
+// 检查间隔（毫秒）
+const SWEEP_INTERVAL = Number(process.env.LOG_RETENTION_INTERVAL) || 60 * 60 * 1000;
+
+// 每批从索引中读取的到期运行数量
+const SWEEP_BATCH = 100;
+
+const LogRetention = {
+    // 依赖，由API模块注入
+    redisClient: null,
+    // 当前副本是否为领导者：() => boolean
+    isLeader: null,
+
+    timer: null,
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { redisClient, isLeader }
+     */
+    configure({ redisClient, isLeader }) {
+        this.redisClient = redisClient;
+        this.isLeader = isLeader;
+    },
+
+    /**
+     * 开始定期检查（只会启动一次，只在领导者上执行）
+     */
+    start() {
+        if (this.timer) return;
+        this.timer = setInterval(() => {
+            if (!this.isLeader()) return;
+            this.sweep().catch(error => console.error(`执行日志保留期限失败: ${error.message}`));
+        }, SWEEP_INTERVAL);
+    },
+
+    /**
+     * 把到期的完整日志截为末尾，删除到期的末尾日志
+     * @returns {Promise<object>} { truncated, expired, failed }
+     */
+    async sweep() {
+        const now = Date.now();
+        const result = { truncated: 0, expired: 0, failed: 0 };
+        // 先处理只保留末尾的级别，本次刚截断的运行不会被立即删除
+        for (const [tier, days, counter] of [['tail', TAIL_DAYS, 'expired'], ['full', FULL_DAYS, 'truncated']]) {
+            const { done, failed } = await this.sweepTier(tier, now - days * DAY);
+            result[counter] += done;
+            result.failed += failed;
+        }
+        if (result.truncated || result.expired || result.failed) {
+            console.log(`日志保留期限检查完成：截为末尾 ${result.truncated} 个运行，删除 ${result.expired} 个运行，失败 ${result.failed} 个`);
+        }
+        return result;
+    },
+
+    /**
+     * 处理某个级别中结束时间早于截止时间的运行，处理失败的运行留在索引中，下次再试
+     * @param {string} tier - full或tail
+     * @param {number} cutoff - 截止时间（毫秒）
+     * @returns {Promise<object>} { done, failed }
+     */
+    async sweepTier(tier, cutoff) {
+        let done = 0;
+        let failed = 0;
+        for (;;) {
+            const entries = await this.redisClient.zRangeWithScores(runRegistry.LOG_TIERS[tier], '-inf', `(${cutoff}`, {
+                BY: 'SCORE',
+                LIMIT: { offset: failed, count: SWEEP_BATCH }
+            });
+            if (entries.length === 0) {
+                return { done, failed };
+            }
+            for (const { value: dockerId, score } of entries) {
+                try {
+                    await distributedLock.withLock(this.redisClient, `docker:${dockerId}`,
+                        () => this.advance(dockerId, tier, score));
+                    done++;
+                } catch (error) {
+                    console.error(`处理运行 ${dockerId} 的日志归档失败: ${error.message}`);
+                    failed++;
+                }
+            }
+        }
+    },
+
+    /**
+     * 把运行的日志归档转入下一个级别
+     * @param {string} dockerId - Docker ID
+     * @param {string} tier - 当前级别（full或tail）
+     * @param {number} finishedScore - 运行的结束时间（毫秒）
+     * @returns {Promise<void>}
+     */
+    async advance(dockerId, tier, finishedScore) {
+        if (tier === 'tail') {
+            await runRegistry.expireStored(this.redisClient, dockerId);
+            return;
+        }
+
+        const logs = runRegistry.storedLogs(await runRegistry.getStored(this.redisClient, dockerId)) || {};
+
+        // 先写入新的末尾归档，清单更新之后再删除完整日志，读取方始终能读到清单中的文件
+        const tails = {};
+        for (const [name, entry] of Object.entries(logs)) {
+            tails[name] = entry.tier === 'full'
+                ? await logArchive.truncateToTail(dockerId, name, entry, TAIL_BYTES)
+                : entry;
+        }
+        if (await runRegistry.updateLogs(this.redisClient, dockerId, tails, finishedScore)) {
+            for (const [name, entry] of Object.entries(logs)) {
+                if (entry.tier === 'full') {
+                    await logArchive.removeFile(dockerId, entry);
+                }
+            }
+        }
+    }
+};
+
+module.exports = LogRetention;
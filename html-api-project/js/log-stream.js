@@ -0,0 +1,209 @@
+/**
+ * 日志流式推送模块（Server-Sent Events）
+ */
+const fs = require('fs');
+const { PassThrough } = require('stream');
+const logArchive = require('./log-archive');
+
+// 心跳间隔（毫秒），防止代理因连接空闲而断开
+const HEARTBEAT_INTERVAL = 15000;
+
+// 跟踪本地日志文件时的检查间隔（毫秒）
+const TAIL_POLL_INTERVAL = 500;
+
+/**
+ * 解析客户端传入的字节偏移量
+ * @param {string|undefined} value - 查询参数since或Last-Event-ID请求头
+ * @returns {number|null} 合法的非负整数偏移量，无效时返回null
+ */
+function parseByteOffset(value) {
+  if (value === undefined || value === null || value === '') {
+    return null;
+  }
+  const offset = Number(value);
+  if (!Number.isInteger(offset) || offset < 0) {
+    return null;
+  }
+  return offset;
+}
+
+/**
+ * 计算缓冲区中完整UTF-8字符序列的长度，避免把一个多字节字符拆到两个事件中
+ * @param {Buffer} buffer - 原始字节
+ * @returns {number} 可以安全解码的字节数
+ */
+function utf8CompleteLength(buffer) {
+  const length = buffer.length;
+  // 最多回看3个字节寻找多字节字符的起始字节
+  for (let i = length - 1; i >= 0 && i >= length - 3; i--) {
+    const byte = buffer[i];
+    if ((byte & 0xC0) === 0x80) {
+      // 后续字节，继续向前查找起始字节
+      continue;
+    }
+    let expected = 1;
+    if ((byte & 0xE0) === 0xC0) expected = 2;
+    else if ((byte & 0xF0) === 0xE0) expected = 3;
+    else if ((byte & 0xF8) === 0xF0) expected = 4;
+    return i + expected <= length ? length : i;
+  }
+  return length;
+}
+
+/**
+ * 跟踪本地文件从since开始新增的字节，直到isFinished返回true且已读到文件末尾
+ * @param {string} filePath - 本地文件路径
+ * @param {number} since - 起始字节偏移量
+ * @param {Function} isFinished - 判断文件是否不会再增长
+ * @returns {{stream: PassThrough, close: Function}}
+ */
+function tailFile(filePath, since, isFinished) {
+  const stream = new PassThrough();
+  let position = since;
+  let closed = false;
+  let timer = null;
+  let reader = null;
+
+  const poll = () => {
+    if (closed) return;
+    // 在读取之前判断，确保最后一次同步写入的内容不会被遗漏
+    const finished = isFinished();
+    fs.stat(filePath, (statError, stats) => {
+      if (closed) return;
+      const size = statError ? 0 : stats.size;
+      if (size > position) {
+        reader = fs.createReadStream(filePath, { start: position, end: size - 1 });
+        // 通过pipe写入，消费方读取较慢时暂停读取文件；每段读完后不结束输出流
+        reader.pipe(stream, { end: false });
+        reader.on('error', error => stream.destroy(error));
+        reader.on('end', () => {
+          reader = null;
+          position = size;
+          timer = setTimeout(poll, finished ? 0 : TAIL_POLL_INTERVAL);
+        });
+      } else if (finished) {
+        stream.end();
+      } else {
+        timer = setTimeout(poll, TAIL_POLL_INTERVAL);
+      }
+    });
+  };
+  poll();
+
+  const close = () => {
+    closed = true;
+    clearTimeout(timer);
+    if (reader) {
+      reader.destroy();
+    }
+  };
+
+  return { stream, close };
+}
+
+/**
+ * 读取已归档（不会再增长）的压缩日志从since开始的内容，边解压边推送
+ * @param {string} filePath - 归档文件路径
+ * @param {number} since - 起始字节偏移量（解压后）
+ * @returns {{stream: stream.Readable, close: Function}}
+ */
+function readArchived(filePath, since) {
+  const stream = logArchive.createReadStream(filePath, { start: since });
+  return { stream, close: () => stream.destroy() };
+}
+
+/**
+ * 以SSE格式把日志字节流推送给客户端
+ * 每个log事件的id为推送后的绝对字节偏移量，客户端断线后可以用
+ * ?since=<id> 或 Last-Event-ID 请求头续传
+ * @param {object} req - Express请求对象
+ * @param {object} res - Express响应对象
+ * @param {object} logStream - API.openDockerLogStream返回的数据（stream、follow、close）
+ * @param {number} since - 起始字节偏移量
+ */
+function sendLogStream(req, res, logStream, since) {
+  const { stream, follow, close } = logStream;
+  let offset = since;
+  let pending = Buffer.alloc(0);
+  let finished = false;
+  let paused = false;
+
+  res.status(200);
+  res.set({
+    'Content-Type': 'text/event-stream; charset=utf-8',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no'
+  });
+  res.flushHeaders();
+
+  // 告知客户端起始偏移量和是否会持续跟踪
+  res.write(`retry: 3000\nevent: open\ndata: ${JSON.stringify({ offset, follow })}\n\n`);
+
+  const writeLog = (buffer) => {
+    const complete = utf8CompleteLength(buffer);
+    if (complete === 0) {
+      return buffer;
+    }
+    offset += complete;
+    const text = buffer.slice(0, complete).toString('utf8');
+    if (!res.write(`id: ${offset}\nevent: log\ndata: ${JSON.stringify(text)}\n\n`) && !paused) {
+      // 客户端读取较慢时暂停读取日志，响应缓冲区排空后继续，不在内存中堆积剩余内容
+      paused = true;
+      stream.pause();
+      res.once('drain', () => {
+        paused = false;
+        if (!finished) stream.resume();
+      });
+    }
+    return buffer.slice(complete);
+  };
+
+  const heartbeat = setInterval(() => {
+    res.write(': heartbeat\n\n');
+  }, HEARTBEAT_INTERVAL);
+
+  const finish = () => {
+    if (finished) return;
+    finished = true;
+    clearInterval(heartbeat);
+    close();
+  };
+
+  stream.on('data', (chunk) => {
+    if (finished) return;
+    pending = writeLog(pending.length ? Buffer.concat([pending, chunk]) : chunk);
+  });
+
+  stream.on('end', () => {
+    if (finished) return;
+    // 流结束时把剩余的不完整字节也一并推送
+    if (pending.length) {
+      offset += pending.length;
+      res.write(`id: ${offset}\nevent: log\ndata: ${JSON.stringify(pending.toString('utf8'))}\n\n`);
+      pending = Buffer.alloc(0);
+    }
+    res.write(`event: end\ndata: ${JSON.stringify({ offset })}\n\n`);
+    finish();
+    res.end();
+  });
+
+  stream.on('error', (error) => {
+    if (finished) return;
+    console.error(`日志流读取失败: ${error.message}`);
+    res.write(`event: error\ndata: ${JSON.stringify({ offset, error: error.message })}\n\n`);
+    finish();
+    res.end();
+  });
+
+  // 客户端断开时停止跟踪
+  req.on('close', finish);
+}
+
+module.exports = {
+  parseByteOffset,
+  utf8CompleteLength,
+  tailFile,
+  readArchived,
+  sendLogStream
+};
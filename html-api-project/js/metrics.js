@@ -0,0 +1,250 @@
+/**
+ * Prometheus监控指标模块
+ *
+ * 通过 /api/metrics 以Prometheus文本格式暴露：
+ * - 每个路由的请求耗时直方图和处理中的请求数
+ * - 启动Docker各阶段（拉取镜像、领取预热条目、创建卷、创建容器、写入输入、启动容器）的耗时
+ * - 卷读取器同步日志和输出的耗时
+ * - Redis命令耗时、Docker API错误次数、清理任务耗时
+ * 以及prom-client默认的进程指标（CPU、内存、事件循环延迟等）。
+ */
+const client = require('prom-client');
+
+const register = new client.Registry();
+client.collectDefaultMetrics({ register });
+
+// 秒级操作（启动阶段、复制、清理）的分桶
+const SLOW_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120];
+
+// 毫秒级操作（Redis命令）的分桶
+const FAST_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1];
+
+const httpRequestDuration = new client.Histogram({
+  name: 'workmate_http_request_duration_seconds',
+  help: 'HTTP请求耗时',
+  labelNames: ['method', 'route', 'status'],
+  buckets: [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+  registers: [register]
+});
+
+const httpRequestsInFlight = new client.Gauge({
+  name: 'workmate_http_requests_in_flight',
+  help: '正在处理的HTTP请求数',
+  registers: [register]
+});
+
+const startPhaseDuration = new client.Histogram({
+  name: 'workmate_start_phase_duration_seconds',
+  help: '启动Docker各阶段的耗时',
+  labelNames: ['phase', 'result'],
+  buckets: SLOW_BUCKETS,
+  registers: [register]
+});
+
+const volumeSyncDuration = new client.Histogram({
+  name: 'workmate_volume_sync_duration_seconds',
+  help: '卷读取器把日志和输出同步到共享卷的耗时（reader为长期读取器首次同步，once为已退出运行的一次性同步）',
+  labelNames: ['mode', 'result'],
+  buckets: SLOW_BUCKETS,
+  registers: [register]
+});
+
+const redisCommandDuration = new client.Histogram({
+  name: 'workmate_redis_command_duration_seconds',
+  help: 'Redis命令耗时（MULTI和PIPELINE按整批计）',
+  labelNames: ['command', 'result'],
+  buckets: FAST_BUCKETS,
+  registers: [register]
+});
+
+const dockerApiErrors = new client.Counter({
+  name: 'workmate_docker_api_errors_total',
+  help: 'Docker API请求失败次数',
+  labelNames: ['operation', 'status'],
+  registers: [register]
+});
+
+const cleanupDuration = new client.Histogram({
+  name: 'workmate_cleanup_duration_seconds',
+  help: '过期资源清理任务的耗时',
+  labelNames: ['result'],
+  buckets: SLOW_BUCKETS,
+  registers: [register]
+});
+
+const cleanupRuns = new client.Counter({
+  name: 'workmate_cleanup_runs_total',
+  help: '清理任务处理的运行数',
+  labelNames: ['result'],
+  registers: [register]
+});
+
+/**
+ * 记录异步操作的耗时，成功和失败分别计入result标签
+ * @param {object} histogram - 直方图
+ * @param {object} labels - 除result外的标签
+ * @param {Function} fn - 异步操作
+ * @returns {Promise<*>} 操作的返回值
+ */
+async function time(histogram, labels, fn) {
+  const end = histogram.startTimer(labels);
+  try {
+    const value = await fn();
+    end({ result: 'ok' });
+    return value;
+  } catch (error) {
+    end({ result: 'error' });
+    throw error;
+  }
+}
+
+/**
+ * 记录启动Docker的一个阶段
+ * @param {string} phase - 阶段名称
+ * @param {Function} fn - 异步操作
+ * @returns {Promise<*>} 操作的返回值
+ */
+function timePhase(phase, fn) {
+  return time(startPhaseDuration, { phase }, fn);
+}
+
+/**
+ * 记录一次卷同步
+ * @param {string} mode - reader 或 once
+ * @param {Function} fn - 异步操作
+ * @returns {Promise<*>} 操作的返回值
+ */
+function timeVolumeSync(mode, fn) {
+  return time(volumeSyncDuration, { mode }, fn);
+}
+
+/**
+ * 记录一次清理任务
+ * @param {Function} fn - 返回 { success, data: { cleanedCount, failedCount } } 的清理函数
+ * @returns {Promise<object>} 清理结果
+ */
+async function timeCleanup(fn) {
+  const end = cleanupDuration.startTimer();
+  const result = await fn();
+  end({ result: result.success ? 'ok' : 'error' });
+  if (result.success) {
+    cleanupRuns.inc({ result: 'cleaned' }, result.data.cleanedCount);
+    cleanupRuns.inc({ result: 'failed' }, result.data.failedCount);
+  }
+  return result;
+}
+
+/**
+ * Express中间件：记录请求耗时和处理中的请求数
+ * 路由标签使用路由模板（如 /api/docker/status/:dockerId），避免每个ID生成一条时间序列
+ * @returns {Function} 中间件
+ */
+function httpMiddleware() {
+  return (req, res, next) => {
+    const end = httpRequestDuration.startTimer();
+    httpRequestsInFlight.inc();
+
+    let recorded = false;
+    const record = () => {
+      if (recorded) return;
+      recorded = true;
+      httpRequestsInFlight.dec();
+      const route = req.route ? `${req.baseUrl}${req.route.path}` : 'unmatched';
+      end({ method: req.method, route, status: res.statusCode });
+    };
+    res.on('finish', record);
+    res.on('close', record);
+    next();
+  };
+}
+
+/**
+ * 判断客户端上的方法是否为Redis命令
+ * node-redis把命令逐个赋值到客户端类的原型上（可枚举），connect、multi等客户端自身的方法是类方法（不可枚举）
+ * @param {object} redisClient - node-redis客户端
+ * @param {string} name - 方法名
+ * @returns {boolean}
+ */
+function isRedisCommand(redisClient, name) {
+  for (let proto = Object.getPrototypeOf(redisClient); proto; proto = Object.getPrototypeOf(proto)) {
+    const descriptor = Object.getOwnPropertyDescriptor(proto, name);
+    if (descriptor) {
+      return descriptor.enumerable && typeof descriptor.value === 'function';
+    }
+  }
+  return false;
+}
+
+/**
+ * 为Redis客户端记录每条命令的耗时
+ * node-redis的命令方法直接调用原型上的执行函数，替换实例上的commandsExecutor不起作用，
+ * 因此返回客户端的代理，在代理上为每个命令方法（以及sendCommand）计时；MULTI/PIPELINE经由实例的multiExecutor执行
+ * @param {object} redisClient - node-redis客户端
+ * @returns {object} 客户端的代理（duplicate得到的客户端不计时）
+ */
+function instrumentRedis(redisClient) {
+  const multiExecutor = redisClient.multiExecutor.bind(redisClient);
+  redisClient.multiExecutor = (commands, selectedDB, chainId) =>
+    time(redisCommandDuration, { command: chainId ? 'MULTI' : 'PIPELINE' },
+      () => multiExecutor(commands, selectedDB, chainId));
+
+  const methods = new Map();
+  return new Proxy(redisClient, {
+    get(target, property) {
+      const value = Reflect.get(target, property, target);
+      if (typeof value !== 'function') {
+        return value;
+      }
+      if (!methods.has(property)) {
+        let method = value.bind(target);
+        if (property === 'sendCommand') {
+          method = (args, options) =>
+            time(redisCommandDuration, { command: String(args[0]).toUpperCase() }, () => value.call(target, args, options));
+        } else if (typeof property === 'string' && isRedisCommand(target, property)) {
+          const command = property.toUpperCase();
+          method = (...args) => time(redisCommandDuration, { command }, () => value.apply(target, args));
+        }
+        methods.set(property, method);
+      }
+      return methods.get(property);
+    }
+  });
+}
+
+/**
+ * 为dockerode客户端统计API错误
+ * dockerode的所有请求都经由modem.dial发出，path是未替换参数的模板（如 /containers/{id}/json）
+ * @param {object} docker - dockerode客户端
+ * @returns {object} 同一个客户端
+ */
+function instrumentDocker(docker) {
+  const dial = docker.modem.dial.bind(docker.modem);
+  docker.modem.dial = (options, callback) => dial(options, (error, data) => {
+    if (error) {
+      const operation = `${options.method} ${String(options.path).replace(/\?.*$/, '')}`;
+      dockerApiErrors.inc({ operation, status: String(error.statusCode || 'network') });
+    }
+    callback(error, data);
+  });
+  return docker;
+}
+
+/**
+ * 输出Prometheus文本格式的全部指标
+ * @returns {Promise<string>}
+ */
+function collect() {
+  return register.metrics();
+}
+
+module.exports = {
+  register,
+  contentType: register.contentType,
+  timePhase,
+  timeVolumeSync,
+  timeCleanup,
+  httpMiddleware,
+  instrumentRedis,
+  instrumentDocker,
+  collect
+};
@@ -0,0 +1,139 @@
+/**
+ * 运行结果存储模块
+ *
+ * 运行退出并完成最终同步后，把镜像目录中outputs下的文件按内容哈希保存到本地存储
+ * （日志由log-archive模块压缩归档，较早保存的运行的清单中也可能有logs下的文件）：
+ *   <RESULT_STORE_PATH>/sha256/<前两位>/<sha256>
+ * 相同内容只保存一份。每个运行的文件清单（"outputs/output.json" -> { sha256, size }）保存在Redis的
+ * docker:<id> 哈希的results字段中，每个文件被引用的次数保存在 results:refs 哈希中，
+ * 由run-registry模块在记录和删除运行时维护，引用数归零的文件随运行一起删除。
+ *
+ * 存储默认位于共享卷中，多个后端副本都能读到。之后的读取直接打开存储中的文件，不再需要卷读取器和运行的volume。
+ */
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+
+// 存储目录（默认在共享卷中，与各运行的镜像目录并列；容器名称不会以点开头）
+const STORE_PATH = process.env.RESULT_STORE_PATH || '/shared-mounts/.results';
+
+// 保存的目录
+const RESULT_DIRS = ['outputs'];
+
+/**
+ * 内容哈希对应的存储路径
+ * @param {string} sha256 - 文件内容的SHA-256
+ * @returns {string}
+ */
+function blobPath(sha256) {
+  return path.join(STORE_PATH, 'sha256', sha256.slice(0, 2), sha256);
+}
+
+/**
+ * 计算文件内容的SHA-256
+ * @param {string} filePath - 文件路径
+ * @returns {Promise<object>} { sha256, size }
+ */
+function hashFile(filePath) {
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    let size = 0;
+    fs.createReadStream(filePath)
+      .on('data', chunk => {
+        hash.update(chunk);
+        size += chunk.length;
+      })
+      .on('error', reject)
+      .on('end', () => resolve({ sha256: hash.digest('hex'), size }));
+  });
+}
+
+/**
+ * 把文件保存到存储中（内容已存在时跳过）
+ * 先复制到临时文件再重命名，读取方不会看到写了一半的文件
+ * @param {string} filePath - 源文件路径
+ * @param {string} sha256 - 文件内容的SHA-256
+ * @returns {Promise<void>}
+ */
+async function writeBlob(filePath, sha256) {
+  const target = blobPath(sha256);
+  if (fs.existsSync(target)) {
+    return;
+  }
+  await fs.promises.mkdir(path.dirname(target), { recursive: true });
+  const temp = `${target}.${crypto.randomBytes(4).toString('hex')}.tmp`;
+  await fs.promises.copyFile(filePath, temp);
+  await fs.promises.rename(temp, target);
+}
+
+/**
+ * 保存运行镜像目录中的全部输出文件
+ * @param {string} mirrorDir - 运行的本地镜像目录（卷读取器的最终同步结果）
+ * @returns {Promise<object>} 文件清单 { "outputs/output.json": { sha256, size }, ... }
+ */
+async function capture(mirrorDir) {
+  const files = {};
+  for (const dirName of RESULT_DIRS) {
+    let names;
+    try {
+      names = await fs.promises.readdir(path.join(mirrorDir, dirName));
+    } catch (error) {
+      if (error.code === 'ENOENT') continue;
+      throw error;
+    }
+    for (const name of names) {
+      // 跳过读取器替换输出文件时留下的临时文件
+      if (name.endsWith('.tmp')) continue;
+      const filePath = path.join(mirrorDir, dirName, name);
+      if (!(await fs.promises.stat(filePath)).isFile()) continue;
+      const entry = await hashFile(filePath);
+      await writeBlob(filePath, entry.sha256);
+      files[`${dirName}/${name}`] = entry;
+    }
+  }
+  return files;
+}
+
+/**
+ * 确认清单中的文件都在存储中（记录引用之前，相同内容的文件可能刚好因引用数归零被删除）
+ * @param {string} mirrorDir - 运行的本地镜像目录
+ * @param {object} files - capture返回的文件清单
+ * @returns {Promise<void>}
+ */
+async function ensureBlobs(mirrorDir, files) {
+  for (const [name, { sha256 }] of Object.entries(files)) {
+    await writeBlob(path.join(mirrorDir, name), sha256);
+  }
+}
+
+/**
+ * 运行结果文件在存储中的路径
+ * @param {object} files - 文件清单
+ * @param {string} dirName - logs或outputs
+ * @param {string} fileName - 文件名
+ * @returns {string|null} 文件路径，清单中没有该文件时返回null
+ */
+function filePath(files, dirName, fileName) {
+  const entry = files[`${dirName}/${fileName}`];
+  return entry ? blobPath(entry.sha256) : null;
+}
+
+/**
+ * 删除已没有运行引用的文件
+ * @param {Array<string>} hashes - 内容哈希列表
+ * @returns {Promise<void>}
+ */
+async function removeBlobs(hashes) {
+  for (const sha256 of hashes) {
+    await fs.promises.rm(blobPath(sha256), { force: true });
+  }
+}
+
+module.exports = {
+  STORE_PATH,
+  blobPath,
+  capture,
+  ensureBlobs,
+  filePath,
+  removeBlobs
+};
@@ -0,0 +1,245 @@
+/**
+ * 运行时间索引模块
+ *
+ * 用有序集合按时间索引运行，清理任务只需按分数范围查询过期的运行，运行历史只需读取一页，
+ * 不再需要KEYS扫描和逐个读取全部历史记录：
+ * - runs:by-created：成员为Docker ID，分数为创建时间（毫秒）
+ * - runs:by-finished：成员为Docker ID，分数为结束时间（毫秒），只包含已结束的运行
+ * - user:<username>:runs：该用户的运行，分数为创建时间（毫秒）
+ * - user:<username>:scenario:<scenarioId>:runs：该用户在某个scenario下的运行，分数为创建时间（毫秒）
+ *
+ * 写入函数接收一个multi/pipeline，由调用方与其他写操作一起提交；删除运行时由 run-registry 模块移除索引。
+ */
+
+// 按创建时间的索引
+const CREATED_INDEX = 'runs:by-created';
+
+// 按结束时间的索引
+const FINISHED_INDEX = 'runs:by-finished';
+
+// 历史数据回填完成的标记（增加用户索引后重新回填一次）
+const BACKFILL_MARKER = 'runs:index:backfilled:v2';
+
+// 回填时每批处理的Docker ID数量
+const BACKFILL_BATCH = 100;
+
+/**
+ * 把ISO时间字符串转换为索引分数
+ * @param {string} time - ISO时间
+ * @returns {number|null} 毫秒时间戳，无效时间返回null
+ */
+function toScore(time) {
+  const score = Date.parse(time || '');
+  // Docker对未结束的容器返回 0001-01-01T00:00:00Z
+  return Number.isNaN(score) || score <= 0 ? null : score;
+}
+
+/**
+ * 用户运行索引的Redis键
+ * @param {string} username - 用户名
+ * @param {string} [scenarioId] - scenario ID，省略时为该用户的全部运行
+ * @returns {string}
+ */
+function userIndexKey(username, scenarioId) {
+  return scenarioId ? `user:${username}:scenario:${scenarioId}:runs` : `user:${username}:runs`;
+}
+
+/**
+ * 记录运行的创建时间
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ * @param {string} createdAt - 创建时间
+ * @param {object} [owner] - { username, scenarioId }，同时写入用户的运行索引
+ */
+function addCreated(pipeline, dockerId, createdAt, owner) {
+  const score = toScore(createdAt);
+  if (score === null) {
+    return;
+  }
+  pipeline.zAdd(CREATED_INDEX, { score, value: dockerId });
+  if (owner && owner.username) {
+    pipeline.zAdd(userIndexKey(owner.username), { score, value: dockerId });
+    if (owner.scenarioId) {
+      pipeline.zAdd(userIndexKey(owner.username, owner.scenarioId), { score, value: dockerId });
+    }
+  }
+}
+
+/**
+ * 记录运行的结束时间
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ * @param {string} finishedAt - 结束时间
+ */
+function addFinished(pipeline, dockerId, finishedAt) {
+  const score = toScore(finishedAt);
+  if (score !== null) {
+    pipeline.zAdd(FINISHED_INDEX, { score, value: dockerId });
+  }
+}
+
+/**
+ * 运行重新启动后从结束索引中移除
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ */
+function clearFinished(pipeline, dockerId) {
+  pipeline.zRem(FINISHED_INDEX, dockerId);
+}
+
+/**
+ * 按容器状态更新结束索引
+ * @param {object} pipeline - Redis multi/pipeline
+ * @param {string} dockerId - Docker ID
+ * @param {object} state - 容器状态 { status, finishedAt }
+ */
+function applyState(pipeline, dockerId, state) {
+  if (state.status === 'exited' || state.status === 'dead') {
+    addFinished(pipeline, dockerId, state.finishedAt);
+  } else if (state.status === 'running') {
+    clearFinished(pipeline, dockerId);
+  }
+}
+
+/**
+ * 查询创建时间早于截止时间的运行
+ * @param {object} redisClient - Redis客户端
+ * @param {number} cutoff - 截止时间（毫秒）
+ * @param {number} offset - 跳过的数量
+ * @param {number} count - 最多返回的数量
+ * @returns {Promise<Array<string>>} Docker ID列表（按创建时间升序）
+ */
+function findCreatedBefore(redisClient, cutoff, offset, count) {
+  return redisClient.zRangeByScore(CREATED_INDEX, '-inf', `(${cutoff}`, {
+    LIMIT: { offset, count }
+  });
+}
+
+/**
+ * 把分页位置编码为不透明的游标字符串
+ * @param {object} position - { dockerId, score }
+ * @returns {string}
+ */
+function encodeCursor({ dockerId, score }) {
+  return Buffer.from(`${score}:${dockerId}`).toString('base64url');
+}
+
+/**
+ * 解析游标字符串
+ * @param {string} cursor - encodeCursor的结果
+ * @returns {object|null} { dockerId, score }，无效时返回null
+ */
+function decodeCursor(cursor) {
+  const match = /^(\d+):([\w.\-]+)$/.exec(Buffer.from(String(cursor), 'base64url').toString());
+  return match ? { score: Number(match[1]), dockerId: match[2] } : null;
+}
+
+/**
+ * 按创建时间分页读取用户的运行
+ * 游标为上一页最后一个运行的 { score, dockerId }，创建时间相同的运行按Docker ID排序
+ * @param {object} redisClient - Redis客户端
+ * @param {string} username - 用户名
+ * @param {object} options - { scenarioId, from, to, order, after, count }
+ *   from/to为创建时间范围（毫秒，包含边界），order为desc（最新的在前）或asc，after为游标
+ * @returns {Promise<object>} { entries: [{ dockerId, score }], hasMore }
+ */
+async function pageForUser(redisClient, username, { scenarioId, from, to, order = 'desc', after, count }) {
+  const descending = order !== 'asc';
+  let min = from !== undefined ? from : '-inf';
+  let max = to !== undefined ? to : '+inf';
+  // 从游标所在的创建时间开始读取，再跳过同一时间中已经返回过的运行
+  if (after) {
+    if (descending) {
+      max = after.score;
+    } else {
+      min = after.score;
+    }
+  }
+  const key = userIndexKey(username, scenarioId);
+  const entries = [];
+  let offset = 0;
+  for (;;) {
+    // 多读一个用于判断是否还有下一页
+    const batch = await redisClient.zRangeWithScores(key, descending ? max : min, descending ? min : max, {
+      BY: 'SCORE',
+      REV: descending || undefined,
+      LIMIT: { offset, count: count + 1 }
+    });
+    for (const { value, score } of batch) {
+      if (after && score === after.score && (descending ? value >= after.dockerId : value <= after.dockerId)) {
+        continue;
+      }
+      if (entries.length === count) {
+        return { entries, hasMore: true };
+      }
+      entries.push({ dockerId: value, score });
+    }
+    if (batch.length < count + 1) {
+      return { entries, hasMore: false };
+    }
+    offset += batch.length;
+  }
+}
+
+/**
+ * 为索引建立之前的历史运行回填索引（只执行一次）
+ * 使用SCAN遍历用户的Docker集合，不会像KEYS一样阻塞Redis
+ * @param {object} redisClient - Redis客户端
+ * @returns {Promise<number>} 回填的运行数量，已回填过时返回0
+ */
+async function backfill(redisClient) {
+  if (await redisClient.exists(BACKFILL_MARKER)) {
+    return 0;
+  }
+
+  let indexed = 0;
+  for await (const userKey of redisClient.scanIterator({ MATCH: 'user:*:dockers', COUNT: 100 })) {
+    const username = userKey.slice('user:'.length, -':dockers'.length);
+    const dockerIds = await redisClient.sMembers(userKey);
+
+    for (let start = 0; start < dockerIds.length; start += BACKFILL_BATCH) {
+      const batch = dockerIds.slice(start, start + BACKFILL_BATCH);
+
+      const reads = redisClient.multi();
+      for (const dockerId of batch) {
+        reads.hmGet(`docker:${dockerId}`, ['createdAt', 'startedAt', 'scenarioId']);
+        reads.hmGet(`docker:${dockerId}:state`, ['status', 'finishedAt']);
+      }
+      const replies = await reads.execAsPipeline();
+
+      const writes = redisClient.multi();
+      batch.forEach((dockerId, index) => {
+        const [createdAt, startedAt, scenarioId] = replies[index * 2];
+        const [status, finishedAt] = replies[index * 2 + 1];
+        if (!createdAt && !startedAt) {
+          return;
+        }
+        addCreated(writes, dockerId, createdAt || startedAt, { username, scenarioId });
+        if (status) {
+          applyState(writes, dockerId, { status, finishedAt });
+        }
+        indexed++;
+      });
+      await writes.execAsPipeline();
+    }
+  }
+
+  await redisClient.set(BACKFILL_MARKER, new Date().toISOString());
+  return indexed;
+}
+
+module.exports = {
+  CREATED_INDEX,
+  FINISHED_INDEX,
+  toScore,
+  userIndexKey,
+  addCreated,
+  addFinished,
+  clearFinished,
+  applyState,
+  findCreatedBefore,
+  encodeCursor,
+  decodeCursor,
+  pageForUser,
+  backfill
+};
@@ -0,0 +1,623 @@
+/**
+ * 运行启动队列模块
+ *
+ * /api/docker/start 只把启动请求写入Redis Stream（runs:queue）并立即返回runId，
+ * 由后台的worker池通过消费者组（launchers）读取并执行完整的启动流程。
+ *
+ * - 全局并发数和每个用户的并发数都可配置，超过用户并发数的任务暂缓执行
+ * - 任务状态保存在 run:<runId> 哈希中：queued -> starting -> started / failed
+ * - 执行前用Lua脚本原子地把任务改为starting并记录租约（claimedBy, leaseUntil），
+ *   同一条目被多个副本同时持有时只有一个副本会执行启动；租约过期后（执行者已停止）才允许其他副本重试
+ * - 未确认（XACK）的任务留在消费者组的待处理列表中：后端重启后先重新处理自己的待处理任务，
+ *   其他已经停止的消费者遗留的任务通过XAUTOCLAIM接管
+ * - 批量启动把一组任务在一个事务中登记，批次信息保存在 batch:<batchId> 哈希中，
+ *   各任务的runId按输入顺序保存在 batch:<batchId>:runs 列表中，批次进度由各任务的状态汇总
+ * - 每个批次同时最多有 RUN_QUEUE_BATCH_WINDOW 个任务在队列Stream中，其余任务在 batch:<batchId>:pending 列表中等待，
+ *   批次中的任务结束时在同一个事务中把下一个任务加入Stream。大批次不会占满队列，其他用户的任务与批次交替执行
+ */
+const os = require('os');
+const crypto = require('crypto');
+
+// 队列Stream和消费者组
+const QUEUE_STREAM = 'runs:queue';
+const CONSUMER_GROUP = 'launchers';
+
+// 全局并发启动数
+const CONCURRENCY = Number(process.env.RUN_QUEUE_CONCURRENCY) || 4;
+
+// 每个用户的并发启动数
+const USER_CONCURRENCY = Number(process.env.RUN_QUEUE_USER_CONCURRENCY) || 2;
+
+// 待处理任务空闲多久（毫秒）后可被其他消费者接管
+const CLAIM_IDLE = Number(process.env.RUN_QUEUE_CLAIM_IDLE) || 60000;
+
+// 单个任务的最大尝试次数
+const MAX_ATTEMPTS = 3;
+
+// 结束的任务状态保留时间（秒）
+const JOB_TTL = 7 * 24 * 60 * 60;
+
+// 阻塞读取的超时时间（毫秒）
+const READ_BLOCK = 5000;
+
+// 暂缓任务的最大数量，达到后暂停读取新任务
+const MAX_DEFERRED = Number(process.env.RUN_QUEUE_MAX_DEFERRED) || 100;
+
+// 每个批次同时在队列Stream中的任务数
+const BATCH_WINDOW = Number(process.env.RUN_QUEUE_BATCH_WINDOW) || USER_CONCURRENCY;
+
+// 把批次中等待的下一个任务加入队列：KEYS[1]=batch:<batchId>:pending，KEYS[2]=队列Stream，ARGV[1]=用户名，ARGV[2]=批次ID
+const FEED_SCRIPT = `
+local runId = redis.call('LPOP', KEYS[1])
+if runId then
+  redis.call('XADD', KEYS[2], '*', 'runId', runId, 'username', ARGV[1], 'batchId', ARGV[2])
+end
+return runId`;
+
+// 认领任务：任务未结束且没有其他消费者持有有效租约时改为starting，返回 { 结果, 尝试次数 }
+// 已经启动了容器、只是没有记录最终状态的任务（launched）不再增加尝试次数，返回 { 'launched', dockerId }
+const CLAIM_SCRIPT = `
+local job = redis.call('HMGET', KEYS[1], 'runId', 'status', 'claimedBy', 'leaseUntil', 'attempts', 'dockerId')
+if not job[1] then
+  return {'missing'}
+end
+if job[2] == 'started' or job[2] == 'failed' then
+  return {'done'}
+end
+if job[2] == 'starting' and job[3] ~= ARGV[1] and tonumber(job[4] or 0) > tonumber(ARGV[2]) then
+  return {'busy'}
+end
+if job[6] then
+  redis.call('HSET', KEYS[1], 'claimedBy', ARGV[1], 'leaseUntil', ARGV[3])
+  return {'launched', job[6]}
+end
+local attempts = tonumber(job[5] or 0) + 1
+redis.call('HSET', KEYS[1], 'status', 'starting', 'attempts', attempts,
+  'claimedBy', ARGV[1], 'leaseUntil', ARGV[3], 'startedAt', ARGV[4])
+return {'claimed', tostring(attempts)}`;
+
+// 只续期自己持有的租约
+const RENEW_SCRIPT = `
+if redis.call('HGET', KEYS[1], 'claimedBy') == ARGV[1] then
+  return redis.call('HSET', KEYS[1], 'leaseUntil', ARGV[2])
+end
+return -1`;
+
+const RunQueue = {
+    // Redis客户端，由API模块注入
+    redisClient: null,
+    // 阻塞读取专用连接，避免XREADGROUP BLOCK阻塞其他命令
+    readerClient: null,
+    // 执行一次启动的函数：(job) => Promise<{ success, data, error }>
+    launch: null,
+
+    // 消费者名称，容器重启后主机名不变，可以找回自己的待处理任务
+    consumer: `${os.hostname()}-launcher`,
+
+    // 当前执行中的任务数：全局和每个用户
+    active: 0,
+    activeByUser: new Map(),
+
+    // 因用户并发数已满而暂缓的任务
+    deferred: [],
+
+    // 已由本worker持有的条目ID（执行中或暂缓），XAUTOCLAIM也会返回自己名下的空闲条目
+    held: new Set(),
+
+    // 正在执行、持有租约的任务ID
+    leased: new Set(),
+
+    // 刷新持有条目和租约的定时器
+    keepAliveTimer: null,
+
+    // 等待空闲槽位的回调
+    slotWaiters: [],
+
+    running: false,
+    lastClaimAt: 0,
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { redisClient, launch }
+     */
+    configure({ redisClient, launch }) {
+        this.redisClient = redisClient;
+        this.launch = launch;
+    },
+
+    /**
+     * 任务状态的Redis键
+     * @param {string} runId - 任务ID
+     * @returns {string}
+     */
+    jobKey(runId) {
+        return `run:${runId}`;
+    },
+
+    /**
+     * 批次信息的Redis键
+     * @param {string} batchId - 批次ID
+     * @returns {string}
+     */
+    batchKey(batchId) {
+        return `batch:${batchId}`;
+    },
+
+    /**
+     * 创建任务哈希的字段
+     * @param {object} request - { dockerName, options, username, scenarioId, pullPolicy, batchId, batchIndex }
+     * @returns {object} 任务哈希
+     */
+    createJob({ dockerName, options = {}, username = 'default', scenarioId = '', pullPolicy, batchId, batchIndex }) {
+        const job = {
+            runId: crypto.randomUUID(),
+            dockerName,
+            options: JSON.stringify(options || {}),
+            username,
+            scenarioId: scenarioId || '',
+            status: 'queued',
+            attempts: '0',
+            createdAt: new Date().toISOString()
+        };
+        if (pullPolicy) {
+            job.pullPolicy = pullPolicy;
+        }
+        if (batchId) {
+            job.batchId = batchId;
+            job.batchIndex = String(batchIndex);
+        }
+        return job;
+    },
+
+    /**
+     * 把启动请求加入队列
+     * @param {object} request - { dockerName, options, username, scenarioId }
+     * @returns {Promise<object>} 任务信息
+     */
+    async enqueue({ dockerName, options = {}, username = 'default', scenarioId = '' }) {
+        const job = this.createJob({ dockerName, options, username, scenarioId });
+
+        // 任务哈希和队列条目在同一个事务中写入，不会留下永远不被执行的queued任务
+        await this.redisClient.multi()
+            .hSet(this.jobKey(job.runId), job)
+            .xAdd(QUEUE_STREAM, '*', { runId: job.runId, username })
+            .exec();
+        return this.formatJob(job);
+    },
+
+    /**
+     * 把同一个scenario的一组启动请求作为一个批次加入队列（一个事务）
+     * 各任务与单独的启动任务一样受全局和每个用户的并发数限制，且同时最多有BATCH_WINDOW个任务在队列中
+     * @param {object} request - { dockerName, inputs, settings, username, scenarioId, pullPolicy }
+     *   inputs为各任务的输入数组，settings为所有任务共用的设置
+     * @returns {Promise<object>} 批次信息（与getBatch的返回格式相同）
+     */
+    async enqueueBatch({ dockerName, inputs, settings, username = 'default', scenarioId = '', pullPolicy }) {
+        const batchId = crypto.randomUUID();
+        const batch = {
+            batchId,
+            dockerName,
+            username,
+            scenarioId: scenarioId || '',
+            total: String(inputs.length),
+            createdAt: new Date().toISOString()
+        };
+        const jobs = inputs.map((input, index) => this.createJob({
+            dockerName,
+            options: { settings, inputs: input },
+            username,
+            scenarioId,
+            pullPolicy,
+            batchId,
+            batchIndex: index
+        }));
+
+        const key = this.batchKey(batchId);
+        const transaction = this.redisClient.multi();
+        transaction.hSet(key, batch);
+        transaction.rPush(`${key}:runs`, jobs.map(job => job.runId));
+        // 批次在最后一个任务结束时续期，这里先按任务的保留时间设置过期，避免批次永久残留
+        transaction.expire(key, JOB_TTL);
+        transaction.expire(`${key}:runs`, JOB_TTL);
+        for (const job of jobs) {
+            transaction.hSet(this.jobKey(job.runId), job);
+        }
+        for (const job of jobs.slice(0, BATCH_WINDOW)) {
+            transaction.xAdd(QUEUE_STREAM, '*', { runId: job.runId, username, batchId });
+        }
+        if (jobs.length > BATCH_WINDOW) {
+            transaction.rPush(`${key}:pending`, jobs.slice(BATCH_WINDOW).map(job => job.runId));
+            transaction.expire(`${key}:pending`, JOB_TTL);
+        }
+        await transaction.exec();
+
+        return this.formatBatch(batch, jobs);
+    },
+
+    /**
+     * 查询批次的汇总进度和各任务的结果
+     * @param {string} batchId - 批次ID
+     * @returns {Promise<object|null>} 批次信息，不存在时返回null
+     */
+    async getBatch(batchId) {
+        const key = this.batchKey(batchId);
+        const [batch, runIds] = await this.redisClient.multi()
+            .hGetAll(key)
+            .lRange(`${key}:runs`, 0, -1)
+            .execAsPipeline();
+        if (!batch || !batch.batchId) {
+            return null;
+        }
+
+        const pipeline = this.redisClient.multi();
+        for (const runId of runIds) {
+            pipeline.hGetAll(this.jobKey(runId));
+        }
+        const jobs = runIds.length > 0 ? await pipeline.execAsPipeline() : [];
+        // 已过期的任务按输入顺序补上runId
+        return this.formatBatch(batch, jobs.map((job, index) => (job && job.runId ? job : { runId: runIds[index] })));
+    },
+
+    /**
+     * 把批次哈希和各任务汇总为API返回的格式
+     * @param {object} batch - 批次哈希
+     * @param {Array<object>} jobs - 按输入顺序的任务哈希
+     * @returns {object} { batchId, ..., total, status, counts, items }
+     */
+    formatBatch(batch, jobs) {
+        const counts = { queued: 0, starting: 0, started: 0, failed: 0 };
+        const items = jobs.map((job, index) => {
+            const status = job.status || 'expired';
+            counts[status] = (counts[status] || 0) + 1;
+            const item = { index, runId: job.runId, status };
+            if (job.dockerId) item.dockerId = job.dockerId;
+            if (job.error) item.error = job.error;
+            return item;
+        });
+        const finished = counts.started + counts.failed + (counts.expired || 0);
+        let status = 'running';
+        if (finished === jobs.length) {
+            status = 'finished';
+        } else if (counts.queued === jobs.length) {
+            status = 'queued';
+        }
+        return { ...batch, total: Number(batch.total), status, counts, items };
+    },
+
+    /**
+     * 查询任务状态
+     * @param {string} runId - 任务ID
+     * @returns {Promise<object|null>} 任务信息，不存在时返回null
+     */
+    async getJob(runId) {
+        const job = await this.redisClient.hGetAll(this.jobKey(runId));
+        return job && job.runId ? this.formatJob(job) : null;
+    },
+
+    /**
+     * 把Redis中的任务哈希转换为API返回的格式
+     * @param {object} job - 任务哈希
+     * @returns {object}
+     */
+    formatJob(job) {
+        const { options, attempts, ...rest } = job;
+        return { ...rest, attempts: Number(attempts || 0) };
+    },
+
+    /**
+     * 启动worker池（只会启动一次）
+     */
+    async start() {
+        if (this.running) return;
+        this.running = true;
+
+        try {
+            await this.redisClient.xGroupCreate(QUEUE_STREAM, CONSUMER_GROUP, '0', { MKSTREAM: true });
+        } catch (error) {
+            if (!String(error.message).includes('BUSYGROUP')) {
+                this.running = false;
+                throw error;
+            }
+        }
+
+        this.readerClient = this.redisClient.duplicate();
+        await this.readerClient.connect();
+
+        // 所有持有的条目（包括暂缓的）共用一个定时器刷新空闲时间，避免被其他消费者接管
+        this.keepAliveTimer = setInterval(() => {
+            this.keepAlive().catch(error => console.error(`刷新启动任务失败: ${error.message}`));
+        }, CLAIM_IDLE / 3);
+
+        // 先处理上次运行遗留在自己名下的待处理任务
+        await this.recoverOwnPending();
+        console.log(`启动队列worker池已启动，全局并发 ${CONCURRENCY}，每用户并发 ${USER_CONCURRENCY}`);
+
+        this.loop();
+    },
+
+    /**
+     * 主循环：按空闲槽位数从队列读取新任务
+     */
+    async loop() {
+        while (this.running) {
+            try {
+                this.dispatchDeferred();
+
+                if (Date.now() - this.lastClaimAt > CLAIM_IDLE / 2) {
+                    this.lastClaimAt = Date.now();
+                    await this.claimAbandoned();
+                }
+
+                const free = this.readCount();
+                if (free <= 0) {
+                    await this.waitForSlot();
+                    continue;
+                }
+
+                const reply = await this.readerClient.xReadGroup(
+                    CONSUMER_GROUP,
+                    this.consumer,
+                    { key: QUEUE_STREAM, id: '>' },
+                    { COUNT: free, BLOCK: READ_BLOCK }
+                );
+                for (const stream of reply || []) {
+                    for (const entry of stream.messages) {
+                        this.dispatch(entry);
+                    }
+                }
+            } catch (error) {
+                console.error(`读取启动队列失败: ${error.message}`);
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+        }
+    },
+
+    /**
+     * 本次最多读取的条目数：空闲的执行槽位数，且读到的条目全部暂缓时不超过暂缓上限
+     * 暂缓的条目不占用读取数量，某个用户的暂缓任务不会阻塞其他用户的任务
+     * @returns {number}
+     */
+    readCount() {
+        return Math.min(CONCURRENCY - this.active, MAX_DEFERRED - this.deferred.length);
+    },
+
+    /**
+     * 刷新所有持有的条目的空闲时间和执行中任务的租约
+     * @returns {Promise<void>}
+     */
+    async keepAlive() {
+        if (this.held.size === 0) return;
+        await this.redisClient.xClaimJustId(QUEUE_STREAM, CONSUMER_GROUP, this.consumer, 0, [...this.held]);
+        const leaseUntil = String(Date.now() + CLAIM_IDLE);
+        await Promise.all([...this.leased].map(runId => this.redisClient.eval(RENEW_SCRIPT, {
+            keys: [this.jobKey(runId)],
+            arguments: [this.consumer, leaseUntil]
+        })));
+    },
+
+    /**
+     * 重新处理自己名下未确认的任务
+     */
+    async recoverOwnPending() {
+        let lastId = '0';
+        for (;;) {
+            const reply = await this.readerClient.xReadGroup(
+                CONSUMER_GROUP,
+                this.consumer,
+                { key: QUEUE_STREAM, id: lastId },
+                { COUNT: 100 }
+            );
+            const messages = reply && reply[0] ? reply[0].messages : [];
+            if (messages.length === 0) break;
+            for (const entry of messages) {
+                this.dispatch(entry);
+                lastId = entry.id;
+            }
+        }
+    },
+
+    /**
+     * 接管其他已停止的消费者遗留的任务
+     */
+    async claimAbandoned() {
+        const free = this.readCount();
+        if (free <= 0) return;
+
+        const reply = await this.redisClient.xAutoClaim(
+            QUEUE_STREAM, CONSUMER_GROUP, this.consumer, CLAIM_IDLE, '0-0', { COUNT: free }
+        );
+        for (const entry of reply.messages) {
+            // 已被删除的条目返回null
+            if (entry) {
+                console.log(`接管遗留的启动任务: ${entry.message.runId}`);
+                this.dispatch(entry);
+            }
+        }
+    },
+
+    /**
+     * 分派一个从队列读到的条目（忽略已经持有的条目）
+     * @param {object} entry - Stream条目 { id, message: { runId, username } }
+     */
+    dispatch(entry) {
+        if (this.held.has(entry.id)) {
+            return;
+        }
+        this.held.add(entry.id);
+        this.schedule(entry);
+    },
+
+    /**
+     * 执行条目，用户并发数已满时暂缓
+     * @param {object} entry - Stream条目
+     */
+    schedule(entry) {
+        const username = entry.message.username;
+        if ((this.activeByUser.get(username) || 0) >= USER_CONCURRENCY) {
+            this.deferred.push(entry);
+            return;
+        }
+        this.run(entry);
+    },
+
+    /**
+     * 执行暂缓任务中用户已有空闲槽位的部分
+     */
+    dispatchDeferred() {
+        const waiting = this.deferred;
+        this.deferred = [];
+        for (const entry of waiting) {
+            if (this.active < CONCURRENCY) {
+                this.schedule(entry);
+            } else {
+                this.deferred.push(entry);
+            }
+        }
+    },
+
+    /**
+     * 等待有任务结束
+     * @returns {Promise<void>}
+     */
+    waitForSlot() {
+        return new Promise(resolve => this.slotWaiters.push(resolve));
+    },
+
+    /**
+     * 执行一个启动任务
+     * @param {object} entry - Stream条目
+     */
+    async run(entry) {
+        const { runId, username } = entry.message;
+        this.active++;
+        this.activeByUser.set(username, (this.activeByUser.get(username) || 0) + 1);
+
+        try {
+            if (!(await this.process(entry.message))) {
+                // 其他副本正在执行，由其确认条目；该副本停止时条目空闲后会再被接管
+                return;
+            }
+            await this.redisClient.multi()
+                .xAck(QUEUE_STREAM, CONSUMER_GROUP, entry.id)
+                .xDel(QUEUE_STREAM, entry.id)
+                .exec();
+        } catch (error) {
+            // 状态没有写入成功时不确认，任务留在待处理列表中，稍后重试
+            console.error(`处理启动任务 ${runId} 失败: ${error.message}`);
+        } finally {
+            this.leased.delete(runId);
+            this.held.delete(entry.id);
+            this.active--;
+            const userActive = this.activeByUser.get(username) - 1;
+            if (userActive > 0) {
+                this.activeByUser.set(username, userActive);
+            } else {
+                this.activeByUser.delete(username);
+            }
+            this.slotWaiters.splice(0).forEach(resolve => resolve());
+        }
+    },
+
+    /**
+     * 认领任务、执行启动并记录任务状态
+     * @param {object} message - 队列条目的内容 { runId, username, batchId }
+     * @returns {Promise<boolean>} 条目是否可以确认（其他副本持有任务时返回false）
+     */
+    async process({ runId, username, batchId }) {
+        const key = this.jobKey(runId);
+        const job = await this.redisClient.hGetAll(key);
+        if (!job || !job.runId) {
+            console.error(`启动任务 ${runId} 不存在，跳过`);
+            // 批次中的任务缺失时仍把下一个任务加入队列，批次中剩余的任务不会滞留
+            if (batchId) {
+                const transaction = this.redisClient.multi();
+                this.feedBatch(transaction, batchId, username);
+                await transaction.exec();
+            }
+            return true;
+        }
+
+        const now = Date.now();
+        const [claim, detail] = await this.redisClient.eval(CLAIM_SCRIPT, {
+            keys: [key],
+            arguments: [this.consumer, String(now), String(now + CLAIM_IDLE), new Date(now).toISOString()]
+        });
+        if (claim === 'busy') {
+            console.log(`启动任务 ${runId} 正由其他副本执行，跳过`);
+            return false;
+        }
+        if (claim === 'launched') {
+            // 上次已启动容器，但记录最终状态失败：只补记状态，不再重复启动
+            this.leased.add(runId);
+            await this.finish(key, { status: 'started', dockerId: detail }, job);
+            return true;
+        }
+        if (claim !== 'claimed') {
+            // 任务已过期，或上次处理完成但未来得及确认
+            return true;
+        }
+        this.leased.add(runId);
+
+        if (Number(detail) > MAX_ATTEMPTS) {
+            await this.finish(key, { status: 'failed', error: `启动任务已重试 ${MAX_ATTEMPTS} 次仍未完成` }, job);
+            return true;
+        }
+
+        let result;
+        try {
+            result = await this.launch({
+                dockerName: job.dockerName,
+                options: JSON.parse(job.options || '{}'),
+                username: job.username,
+                scenarioId: job.scenarioId,
+                pullPolicy: job.pullPolicy
+            });
+        } catch (error) {
+            result = { success: false, error: error.message };
+        }
+
+        if (result.success) {
+            // 先记录已启动的容器，之后记录最终状态失败时重新处理不会再次启动
+            await this.redisClient.hSet(key, 'dockerId', result.data.containerId);
+            await this.finish(key, { status: 'started', dockerId: result.data.containerId }, job);
+        } else {
+            await this.finish(key, { status: 'failed', error: result.error || '未知错误' }, job);
+        }
+        return true;
+    },
+
+    /**
+     * 记录任务的最终状态
+     * 批次中的任务结束时，批次与任务一起续期，并把批次中等待的下一个任务加入队列
+     * @param {string} key - 任务键
+     * @param {object} fields - 状态字段
+     * @param {object} job - 任务哈希（batchId、username）
+     */
+    async finish(key, fields, job) {
+        const transaction = this.redisClient.multi()
+            .hSet(key, { ...fields, finishedAt: new Date().toISOString() })
+            .expire(key, JOB_TTL);
+        if (job.batchId) {
+            const batchKey = this.batchKey(job.batchId);
+            transaction.expire(batchKey, JOB_TTL);
+            transaction.expire(`${batchKey}:runs`, JOB_TTL);
+            this.feedBatch(transaction, job.batchId, job.username);
+        }
+        await transaction.exec();
+    },
+
+    /**
+     * 把批次中等待的下一个任务加入队列（写入事务）
+     * @param {object} transaction - Redis multi
+     * @param {string} batchId - 批次ID
+     * @param {string} username - 用户名
+     */
+    feedBatch(transaction, batchId, username) {
+        transaction.eval(FEED_SCRIPT, {
+            keys: [`${this.batchKey(batchId)}:pending`, QUEUE_STREAM],
+            arguments: [username, batchId]
+        });
+    }
+};
+
+module.exports = RunQueue;
@@ -0,0 +1,580 @@
+/**
+ * 运行注册表模块
+ *
+ * 运行相关的Redis记录都通过本模块读写。每次变更在一个Lua脚本或一个MULTI事务中完成，
+ * 只需要一次往返，后端在中途崩溃也不会留下只写了一半的记录。
+ *
+ * 键结构：
+ * - user:<username>:dockers   集合    用户的Docker ID
+ * - docker:<id>               哈希    运行信息：containerId、containerName、name、status、startedAt、username、
+ *                                     createdAt、volumeName、scenarioId、host、cpuRequest、memoryRequest、reservation，
+ *                                     以及卷读取器写入的readerFinalizedAt；
+ *                                     运行结果保存后还有results（输出文件清单JSON）、logs（日志归档清单JSON）、
+ *                                     resultsStoredAt、exitCode、finishedAt，容器和volume被回收后还有reclaimedAt，
+ *                                     日志归档和结果文件超过保留期限被删除后还有logsExpiredAt
+ * - docker:<id>:retained      哈希    被定时清理删除、仍在日志保留期限内的运行保留的results、logs和removedAt，
+ *                                     到期时由log-retention模块删除
+ * - docker:<id>:state         哈希    容器状态缓存（container-state模块）
+ * - docker:<id>:trace         哈希    启动时间线（launch-trace模块）
+ * - runs:by-created           有序集合 按创建时间的运行索引（run-index模块）
+ * - runs:by-finished          有序集合 按结束时间的运行索引（run-index模块）
+ * - user:<username>:runs      有序集合 用户的运行按创建时间的索引，用于分页读取运行历史（run-index模块）
+ * - user:<username>:scenario:<scenarioId>:runs  有序集合 同上，按scenario划分
+ * - capacity:<host>           哈希    准入控制的容量预留，字段为docker:<id>中的reservation（admission模块）
+ * - results:refs              哈希    结果存储中每个文件（内容哈希）被运行引用的次数（result-store模块）
+ * - logs:retention:full       有序集合 已保存结果、日志归档为完整日志的运行，分数为结束时间（毫秒）（log-retention模块）
+ * - logs:retention:tail       有序集合 已保存结果、日志归档只保留末尾的运行，分数为结束时间（毫秒）（log-retention模块）
+ *
+ * 旧版本还会写入 docker:<containerName>:volume（卷名称已保存在volumeName字段中），删除运行时一并清除。
+ */
+const runIndex = require('./run-index');
+const launchTrace = require('./launch-trace');
+const admission = require('./admission');
+const resultStore = require('./result-store');
+const logArchive = require('./log-archive');
+const distributedLock = require('./distributed-lock');
+
+// 结果文件引用计数的Redis键
+const RESULT_REFS = 'results:refs';
+
+// 记录或删除结果文件引用、写入或删除结果文件时持有的锁，串行化文件的引用数变化和文件本身的增删
+const RESULTS_LOCK = 'results:blobs';
+
+// 按日志归档的保留级别索引运行的Redis键
+const LOG_TIERS = {
+  full: 'logs:retention:full',
+  tail: 'logs:retention:tail'
+};
+
+// 删除运行的全部记录，返回删除前的运行信息、引用数归零的结果文件和是否保留了日志归档
+// 要求保留且运行仍在日志保留期限内时，结果文件清单和日志归档清单转存到docker:<id>:retained，
+// 引用和保留索引不变，到期时由日志保留模块释放
+// 用户索引、旧版卷键和容量预留的键由调用方按事先读取的运行信息计算后传入；
+// 运行信息中决定这些键的字段已变化时不做任何操作，返回 { false }，由调用方重新读取
+// KEYS: docker:<id>、docker:<id>:state、docker:<id>:trace、docker:<id>:volume、runs:by-created、runs:by-finished、results:refs、
+//       logs:retention:full、logs:retention:tail、docker:<id>:retained，之后是ARGV中每个操作对应的键
+// ARGV: Docker ID、username、scenarioId、containerName、host、reservation（事先读取的值，不存在时为空）、
+//       是否保留（1或0）、当前时间，之后是对KEYS[11]起各键的操作
+//       （srem：从集合删除运行，zrem：从有序集合删除运行，del：删除键，hdel：删除容量预留）
+const REMOVE_SCRIPT = `
+local info = redis.call('HGETALL', KEYS[1])
+local fields = {}
+for i = 1, #info, 2 do
+  fields[info[i]] = info[i + 1]
+end
+local expected = { 'username', 'scenarioId', 'containerName', 'host', 'reservation' }
+for i, name in ipairs(expected) do
+  if (fields[name] or '') ~= ARGV[i + 1] then
+    return { false }
+  end
+end
+for i = 9, #ARGV do
+  local key = KEYS[i + 2]
+  if ARGV[i] == 'srem' then
+    redis.call('SREM', key, ARGV[1])
+  elseif ARGV[i] == 'zrem' then
+    redis.call('ZREM', key, ARGV[1])
+  elseif ARGV[i] == 'del' then
+    redis.call('DEL', key)
+  elseif ARGV[i] == 'hdel' then
+    redis.call('HDEL', key, fields.reservation)
+  end
+end
+-- 运行信息已不存在时，已保留的记录仍由日志保留模块到期时释放
+local retain = (ARGV[7] == '1' or #info == 0)
+  and (redis.call('ZSCORE', KEYS[8], ARGV[1]) or redis.call('ZSCORE', KEYS[9], ARGV[1]))
+local orphans = {}
+if retain then
+  if #info > 0 then
+    local kept = { 'removedAt', ARGV[8] }
+    for _, name in ipairs({ 'results', 'logs' }) do
+      if fields[name] then
+        kept[#kept + 1] = name
+        kept[#kept + 1] = fields[name]
+      end
+    end
+    redis.call('HSET', KEYS[10], unpack(kept))
+  end
+else
+  if fields.results then
+    for _, entry in pairs(cjson.decode(fields.results)) do
+      if redis.call('HINCRBY', KEYS[7], entry.sha256, -1) <= 0 then
+        redis.call('HDEL', KEYS[7], entry.sha256)
+        orphans[#orphans + 1] = entry.sha256
+      end
+    end
+  end
+  redis.call('ZREM', KEYS[8], ARGV[1])
+  redis.call('ZREM', KEYS[9], ARGV[1])
+  redis.call('DEL', KEYS[10])
+end
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+redis.call('ZREM', KEYS[5], ARGV[1])
+redis.call('ZREM', KEYS[6], ARGV[1])
+return { info, orphans, retain and 1 or 0 }`;
+
+// 记录运行结果和日志归档（每个运行只记录一次，运行已被删除时不记录），运行进入完整日志的保留级别
+// 没有日志的运行也进入保留级别，结果文件随日志归档一起到期
+// KEYS: docker:<id>、results:refs、logs:retention:full
+// ARGV: 文件清单JSON、保存时间、退出码、结束时间、日志归档清单JSON（没有日志时为空）、结束时间（毫秒）、Docker ID
+const STORE_RESULTS_SCRIPT = `
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('HEXISTS', KEYS[1], 'resultsStoredAt') == 1 then
+  return 0
+end
+for _, entry in pairs(cjson.decode(ARGV[1])) do
+  redis.call('HINCRBY', KEYS[2], entry.sha256, 1)
+end
+redis.call('HSET', KEYS[1], 'results', ARGV[1], 'resultsStoredAt', ARGV[2], 'exitCode', ARGV[3], 'finishedAt', ARGV[4])
+if ARGV[5] ~= '' then
+  redis.call('HSET', KEYS[1], 'logs', ARGV[5])
+end
+redis.call('ZADD', KEYS[3], ARGV[6], ARGV[7])
+return 1`;
+
+// 清除运行保存的结果和日志归档清单（运行被重新启动后，下次退出时重新保存），返回引用数归零的结果文件
+// KEYS: docker:<id>、results:refs、logs:retention:full、logs:retention:tail
+// ARGV: Docker ID
+const CLEAR_RESULTS_SCRIPT = `
+local results = redis.call('HGET', KEYS[1], 'results')
+if redis.call('HEXISTS', KEYS[1], 'resultsStoredAt') == 0 then
+  return { 0, {} }
+end
+local orphans = {}
+if results then
+  for _, entry in pairs(cjson.decode(results)) do
+    if redis.call('HINCRBY', KEYS[2], entry.sha256, -1) <= 0 then
+      redis.call('HDEL', KEYS[2], entry.sha256)
+      orphans[#orphans + 1] = entry.sha256
+    end
+  end
+end
+redis.call('HDEL', KEYS[1], 'results', 'resultsStoredAt', 'logs', 'logsExpiredAt', 'exitCode', 'finishedAt')
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+return { 1, orphans }`;
+
+// 把日志归档转入下一个保留级别，运行已被定时清理删除时更新保留的记录（都不存在时只清除索引）
+// KEYS: docker:<id>、docker:<id>:retained、当前级别的索引、下一级别的索引
+// ARGV: Docker ID、新的归档清单JSON、结束时间（毫秒）
+const UPDATE_LOGS_SCRIPT = `
+redis.call('ZREM', KEYS[3], ARGV[1])
+local target = KEYS[1]
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+  end
+  target = KEYS[2]
+end
+redis.call('HSET', target, 'logs', ARGV[2])
+redis.call('ZADD', KEYS[4], ARGV[3], ARGV[1])
+return 1`;
+
+// 日志保留期限到期：删除日志归档清单和结果文件清单，释放结果文件的引用，返回引用数归零的结果文件
+// 运行已被定时清理删除时删除保留的记录，否则在运行信息中记录logsExpiredAt
+// KEYS: docker:<id>、docker:<id>:retained、results:refs、logs:retention:full、logs:retention:tail
+// ARGV: Docker ID、当前时间
+const EXPIRE_SCRIPT = `
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('ZREM', KEYS[5], ARGV[1])
+local target = KEYS[1]
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  target = KEYS[2]
+end
+local orphans = {}
+local results = redis.call('HGET', target, 'results')
+if results then
+  for _, entry in pairs(cjson.decode(results)) do
+    if redis.call('HINCRBY', KEYS[3], entry.sha256, -1) <= 0 then
+      redis.call('HDEL', KEYS[3], entry.sha256)
+      orphans[#orphans + 1] = entry.sha256
+    end
+  end
+end
+if target == KEYS[2] then
+  redis.call('DEL', KEYS[2])
+else
+  redis.call('HDEL', KEYS[1], 'logs', 'results')
+  redis.call('HSET', KEYS[1], 'logsExpiredAt', ARGV[2])
+end
+return orphans`;
+
+/**
+ * 运行信息的Redis键
+ * @param {string} dockerId - Docker ID
+ * @returns {string}
+ */
+function runKey(dockerId) {
+  return `docker:${dockerId}`;
+}
+
+/**
+ * 用户运行集合的Redis键
+ * @param {string} username - 用户名
+ * @returns {string}
+ */
+function userKey(username) {
+  return `user:${username}:dockers`;
+}
+
+/**
+ * 把HGETALL的数组回复转换为对象
+ * @param {Array<string>} reply - [字段, 值, 字段, 值, ...]
+ * @returns {object}
+ */
+function toObject(reply) {
+  const result = {};
+  for (let i = 0; i < reply.length; i += 2) {
+    result[reply[i]] = reply[i + 1];
+  }
+  return result;
+}
+
+/**
+ * 被定时清理删除的运行保留日志归档和结果文件清单的Redis键
+ * @param {string} dockerId - Docker ID
+ * @returns {string}
+ */
+function retainedKey(dockerId) {
+  return `${runKey(dockerId)}:retained`;
+}
+
+/**
+ * 读取运行信息
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<object>} 运行信息，不存在时为空对象
+ */
+function get(redisClient, dockerId) {
+  return redisClient.hGetAll(runKey(dockerId));
+}
+
+/**
+ * 读取运行保存的日志归档和结果文件清单，运行已被定时清理删除时读取保留的记录
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<object>} 运行信息或保留的记录，都不存在时为空对象
+ */
+async function getStored(redisClient, dockerId) {
+  const runInfo = await get(redisClient, dockerId);
+  if (Object.keys(runInfo).length > 0) {
+    return runInfo;
+  }
+  return redisClient.hGetAll(retainedKey(dockerId));
+}
+
+/**
+ * 一次往返读取多个运行的信息
+ * @param {object} redisClient - Redis客户端
+ * @param {Array<string>} dockerIds - Docker ID列表
+ * @returns {Promise<Array<object>>} 与dockerIds顺序一致的运行信息，不存在时为空对象
+ */
+async function getMany(redisClient, dockerIds) {
+  if (dockerIds.length === 0) {
+    return [];
+  }
+  const pipeline = redisClient.multi();
+  for (const dockerId of dockerIds) {
+    pipeline.hGetAll(runKey(dockerId));
+  }
+  return pipeline.execAsPipeline();
+}
+
+/**
+ * 登记新启动的运行：用户集合、运行信息、创建时间索引（全局和用户的）和启动时间线在同一个事务中写入
+ * @param {object} redisClient - Redis客户端
+ * @param {object} dockerInfo - 运行信息（containerId、username、createdAt等）
+ * @param {object} trace - 启动时间线（launch-trace的createTrace）
+ * @returns {Promise<void>}
+ */
+async function register(redisClient, dockerInfo, trace) {
+  const dockerId = dockerInfo.containerId;
+  const transaction = redisClient.multi();
+  transaction.sAdd(userKey(dockerInfo.username), dockerId);
+  transaction.hSet(runKey(dockerId), dockerInfo);
+  runIndex.addCreated(transaction, dockerId, dockerInfo.createdAt, dockerInfo);
+  launchTrace.save(transaction, dockerId, trace);
+  await transaction.exec();
+}
+
+/**
+ * 记录状态调整后的容器状态和结束时间索引
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @param {object} state - 容器状态 { status, finishedAt }
+ * @returns {Promise<void>}
+ */
+async function updateStatus(redisClient, dockerId, state) {
+  const transaction = redisClient.multi();
+  transaction.hSet(runKey(dockerId), 'status', state.status);
+  runIndex.applyState(transaction, dockerId, state);
+  await transaction.exec();
+}
+
+/**
+ * 容器状态变化时更新结束时间索引、退出时间和容量预留
+ * 退出或被删除的运行释放容量预留，重新运行时再次计入，并清除之前保存的结果
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @param {object|null} state - 容器状态，容器已被删除时为null
+ * @returns {Promise<void>}
+ */
+async function applyState(redisClient, dockerId, state) {
+  const runInfo = await get(redisClient, dockerId);
+  if (!runInfo || Object.keys(runInfo).length === 0 || (!state && !runInfo.reservation)) {
+    return;
+  }
+  const transaction = redisClient.multi();
+  const stopped = !state || state.status === 'exited' || state.status === 'dead';
+  if (state) {
+    runIndex.applyState(transaction, dockerId, state);
+    if (stopped && state.finishedAt) {
+      launchTrace.recordExit(transaction, dockerId, state.finishedAt);
+    }
+  }
+  if (stopped) {
+    admission.releaseRun(transaction, runInfo);
+  } else if (state.status === 'running') {
+    admission.recommit(transaction, runInfo);
+  }
+  await transaction.exec();
+  // 已保存结果的运行被重新启动：保存的结果已过时，之后从卷读取器读取，退出时重新保存
+  if (state && state.status === 'running' && runInfo.resultsStoredAt) {
+    await clearResults(redisClient, dockerId);
+  }
+}
+
+/**
+ * 清除运行保存的结果文件清单和日志归档，删除已没有运行引用的结果文件
+ * 运行的volume仍保留着日志和输出，重新启动后由卷读取器重新同步，下次退出时重新保存
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<boolean>} 是否清除了结果（尚未保存结果时返回false）
+ */
+async function clearResults(redisClient, dockerId) {
+  return distributedLock.withLock(redisClient, RESULTS_LOCK, async () => {
+    const [cleared, orphans] = await redisClient.eval(CLEAR_RESULTS_SCRIPT, {
+      keys: [runKey(dockerId), RESULT_REFS, LOG_TIERS.full, LOG_TIERS.tail],
+      arguments: [dockerId]
+    });
+    if (!cleared) {
+      return false;
+    }
+    if (orphans.length > 0) {
+      await resultStore.removeBlobs(orphans);
+    }
+    await logArchive.remove(dockerId);
+    return true;
+  });
+}
+
+/**
+ * 记录运行退出时保存的结果文件清单、日志归档清单和最终状态，日志归档进入完整日志的保留级别
+ * 记录引用后确认文件都在存储中；与删除运行在同一个锁内进行，引用数归零的文件不会在确认之后才被删除
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @param {object} files - 结果存储的文件清单
+ * @param {object} logs - 日志归档清单
+ * @param {object} state - 容器的最终状态 { exitCode, finishedAt }
+ * @param {string} mirrorDir - 运行的本地镜像目录，用于补回存储中缺失的文件
+ * @returns {Promise<boolean>} 是否记录成功（已记录过或运行已被删除时返回false）
+ */
+async function storeResults(redisClient, dockerId, files, logs, state, mirrorDir) {
+  const finishedScore = runIndex.toScore(state.finishedAt) || Date.now();
+  return distributedLock.withLock(redisClient, RESULTS_LOCK, async () => {
+    const reply = await redisClient.eval(STORE_RESULTS_SCRIPT, {
+      keys: [runKey(dockerId), RESULT_REFS, LOG_TIERS.full],
+      arguments: [
+        JSON.stringify(files),
+        new Date().toISOString(),
+        String(state.exitCode),
+        state.finishedAt || '',
+        Object.keys(logs).length > 0 ? JSON.stringify(logs) : '',
+        String(finishedScore),
+        dockerId
+      ]
+    });
+    if (reply !== 1) {
+      return false;
+    }
+    await resultStore.ensureBlobs(mirrorDir, files);
+    return true;
+  });
+}
+
+/**
+ * 记录日志归档转入只保留末尾的级别
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @param {object} logs - 只保留末尾的归档清单
+ * @param {number} finishedScore - 运行的结束时间（毫秒），下一级别索引的分数
+ * @returns {Promise<boolean>} 是否记录成功（运行和保留的记录都已被删除时返回false）
+ */
+async function updateLogs(redisClient, dockerId, logs, finishedScore) {
+  const reply = await redisClient.eval(UPDATE_LOGS_SCRIPT, {
+    keys: [runKey(dockerId), retainedKey(dockerId), LOG_TIERS.full, LOG_TIERS.tail],
+    arguments: [dockerId, JSON.stringify(logs), String(finishedScore)]
+  });
+  return reply === 1;
+}
+
+/**
+ * 日志保留期限到期：删除运行的日志归档，释放结果文件的引用并删除已没有运行引用的结果文件
+ * 运行已被定时清理删除时一并删除保留的记录
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<void>}
+ */
+async function expireStored(redisClient, dockerId) {
+  await distributedLock.withLock(redisClient, RESULTS_LOCK, async () => {
+    const orphans = await redisClient.eval(EXPIRE_SCRIPT, {
+      keys: [runKey(dockerId), retainedKey(dockerId), RESULT_REFS, LOG_TIERS.full, LOG_TIERS.tail],
+      arguments: [dockerId, new Date().toISOString()]
+    });
+    if (orphans.length > 0) {
+      await resultStore.removeBlobs(orphans);
+    }
+  });
+  await logArchive.remove(dockerId);
+}
+
+/**
+ * 读取运行的日志归档清单
+ * @param {object} runInfo - 运行信息
+ * @returns {object|null} 日志归档清单，没有归档（尚未保存或已过期）时返回null
+ */
+function storedLogs(runInfo) {
+  return runInfo && runInfo.logs ? JSON.parse(runInfo.logs) : null;
+}
+
+/**
+ * 读取运行保存的结果文件清单
+ * @param {object} runInfo - 运行信息
+ * @returns {object|null} 文件清单，尚未保存结果时返回null，结果文件已过期时为空清单
+ */
+function storedResults(runInfo) {
+  if (!runInfo || !runInfo.resultsStoredAt) {
+    return null;
+  }
+  return runInfo.results ? JSON.parse(runInfo.results) : {};
+}
+
+/**
+ * 记录运行的容器和volume已被回收
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @returns {Promise<void>}
+ */
+async function markReclaimed(redisClient, dockerId) {
+  await redisClient.hSet(runKey(dockerId), 'reclaimedAt', new Date().toISOString());
+}
+
+/**
+ * 容器已被回收的运行的最终状态（不再访问Docker）
+ * @param {object} runInfo - 运行信息
+ * @returns {object|null} { status, exitCode, finishedAt }，容器未被回收时返回null
+ */
+function storedState(runInfo) {
+  if (!runInfo || !runInfo.reclaimedAt) {
+    return null;
+  }
+  return {
+    status: 'exited',
+    exitCode: Number(runInfo.exitCode),
+    finishedAt: runInfo.finishedAt || null
+  };
+}
+
+/**
+ * 按运行信息列出删除运行时需要清除的其他键及其操作（用户索引、旧版卷键、容量预留）
+ * @param {object} runInfo - 运行信息
+ * @returns {Array<Array<string>>} [[键, 操作], ...]
+ */
+function relatedKeys(runInfo) {
+  const related = [];
+  if (runInfo.username) {
+    related.push([userKey(runInfo.username), 'srem']);
+    related.push([runIndex.userIndexKey(runInfo.username), 'zrem']);
+    if (runInfo.scenarioId) {
+      related.push([runIndex.userIndexKey(runInfo.username, runInfo.scenarioId), 'zrem']);
+    }
+  }
+  if (runInfo.containerName) {
+    related.push([`docker:${runInfo.containerName}:volume`, 'del']);
+  }
+  if (runInfo.reservation) {
+    related.push([admission.capacityKeyFor(runInfo), 'hdel']);
+  }
+  return related;
+}
+
+/**
+ * 删除运行的全部记录（运行信息、状态、时间线、用户集合、时间索引、容量预留、结果文件的引用和日志保留索引），
+ * 并删除已没有运行引用的结果文件和运行的日志归档
+ * 指定retain时（定时清理），仍在日志保留期限内的运行保留日志归档和结果文件，由日志保留模块到期时删除
+ * 与保存结果在同一个锁内进行，同时保存的相同内容的文件不会在记录引用之后被删除
+ * @param {object} redisClient - Redis客户端
+ * @param {string} dockerId - Docker ID
+ * @param {object} [options] - { retain: 是否保留日志保留期限内的日志归档和结果文件 }
+ * @returns {Promise<object>} 删除前的运行信息，不存在时为空对象
+ */
+async function remove(redisClient, dockerId, { retain = false } = {}) {
+  const [info, retained] = await distributedLock.withLock(redisClient, RESULTS_LOCK, async () => {
+    for (;;) {
+      const runInfo = await get(redisClient, dockerId);
+      const related = relatedKeys(runInfo);
+      const [removed, orphans, kept] = await redisClient.eval(REMOVE_SCRIPT, {
+        keys: [
+          runKey(dockerId),
+          `${runKey(dockerId)}:state`,
+          launchTrace.traceKey(dockerId),
+          `${runKey(dockerId)}:volume`,
+          runIndex.CREATED_INDEX,
+          runIndex.FINISHED_INDEX,
+          RESULT_REFS,
+          LOG_TIERS.full,
+          LOG_TIERS.tail,
+          retainedKey(dockerId),
+          ...related.map(([key]) => key)
+        ],
+        arguments: [
+          dockerId,
+          ...['username', 'scenarioId', 'containerName', 'host', 'reservation'].map(name => runInfo[name] || ''),
+          retain ? '1' : '0',
+          new Date().toISOString(),
+          ...related.map(([, operation]) => operation)
+        ]
+      });
+      // 读取之后运行信息被修改，按新的运行信息重试
+      if (!removed) continue;
+      if (orphans.length > 0) {
+        await resultStore.removeBlobs(orphans);
+      }
+      return [removed, kept === 1];
+    }
+  });
+  if (!retained) {
+    await logArchive.remove(dockerId);
+  }
+  return toObject(info);
+}
+
+module.exports = {
+  LOG_TIERS,
+  runKey,
+  userKey,
+  get,
+  getStored,
+  getMany,
+  register,
+  updateStatus,
+  applyState,
+  storeResults,
+  clearResults,
+  updateLogs,
+  expireStored,
+  storedResults,
+  storedLogs,
+  markReclaimed,
+  storedState,
+  remove
+};
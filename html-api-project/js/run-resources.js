@@ -0,0 +1,168 @@
+/**
+ * 运行资源模块
+ *
+ * scenario配置中 docker.resources 声明运行容器的资源请求和限制：
+ *   docker:
+ *     resources:
+ *       requests: { cpu: 0.5, memory: 512Mi }
+ *       limits: { cpu: 2, memory: 2Gi, pids: 512 }
+ *
+ * - requests：准入控制按它计算主机已承诺的容量，同时作为CPU权重（CpuShares）和内存软限制（MemoryReservation）
+ * - limits：容器的硬限制（NanoCpus、Memory、PidsLimit）
+ * - cpu可以是核数（0.5、2）或毫核（"500m"）；memory可以是字节数或带单位的字符串（Ki/Mi/Gi、K/M/G）
+ * 未声明的字段使用环境变量中的默认值；硬限制默认不设置，只在scenario声明或配置了对应环境变量时生效。
+ */
+
+// 内存单位
+const MEMORY_UNITS = {
+  '': 1,
+  k: 1e3, m: 1e6, g: 1e9, t: 1e12,
+  ki: 1024, mi: 1024 ** 2, gi: 1024 ** 3, ti: 1024 ** 4
+};
+
+/**
+ * 把CPU数量转换为毫核
+ * @param {number|string} value - 核数或 "500m" 形式的毫核
+ * @returns {number} 毫核，无法解析时返回NaN
+ */
+function parseCpu(value) {
+  if (typeof value === 'number') {
+    return Math.round(value * 1000);
+  }
+  const match = /^\s*(\d+(?:\.\d+)?)(m?)\s*$/.exec(String(value));
+  if (!match) {
+    return NaN;
+  }
+  return match[2] ? Math.round(Number(match[1])) : Math.round(Number(match[1]) * 1000);
+}
+
+/**
+ * 把内存大小转换为字节数
+ * @param {number|string} value - 字节数或 "512Mi" 形式的字符串
+ * @returns {number} 字节数，无法解析时返回NaN
+ */
+function parseMemory(value) {
+  if (typeof value === 'number') {
+    return Math.round(value);
+  }
+  const match = /^\s*(\d+(?:\.\d+)?)\s*([kmgt]i?)?b?\s*$/i.exec(String(value));
+  if (!match) {
+    return NaN;
+  }
+  return Math.round(Number(match[1]) * MEMORY_UNITS[(match[2] || '').toLowerCase()]);
+}
+
+// 未声明时的默认值（环境变量格式与scenario配置相同）
+const DEFAULTS = {
+  requests: {
+    cpu: parseCpu(process.env.RUN_DEFAULT_CPU_REQUEST || '250m'),
+    memory: parseMemory(process.env.RUN_DEFAULT_MEMORY_REQUEST || '256Mi')
+  },
+  limits: {
+    cpu: process.env.RUN_DEFAULT_CPU_LIMIT ? parseCpu(process.env.RUN_DEFAULT_CPU_LIMIT) : 0,
+    memory: process.env.RUN_DEFAULT_MEMORY_LIMIT ? parseMemory(process.env.RUN_DEFAULT_MEMORY_LIMIT) : 0,
+    pids: Number(process.env.RUN_DEFAULT_PIDS_LIMIT) || 0
+  }
+};
+
+/**
+ * 校验scenario配置中的docker.resources
+ * @param {*} resources - docker.resources字段
+ * @returns {Array<string>} 错误信息列表
+ */
+function validate(resources) {
+  if (!resources || typeof resources !== 'object' || Array.isArray(resources)) {
+    return ['docker.resources字段必须是对象'];
+  }
+  const errors = [];
+  for (const section of ['requests', 'limits']) {
+    const values = resources[section];
+    if (values === undefined) continue;
+    if (!values || typeof values !== 'object' || Array.isArray(values)) {
+      errors.push(`docker.resources.${section}字段必须是对象`);
+      continue;
+    }
+    if (values.cpu !== undefined && !(parseCpu(values.cpu) > 0)) {
+      errors.push(`docker.resources.${section}.cpu必须是正的核数或毫核（如 0.5、"500m"）`);
+    }
+    if (values.memory !== undefined && !(parseMemory(values.memory) > 0)) {
+      errors.push(`docker.resources.${section}.memory必须是正的字节数或带单位的大小（如 "512Mi"）`);
+    }
+  }
+  const limits = resources.limits || {};
+  if (limits.pids !== undefined && !(Number.isInteger(limits.pids) && limits.pids > 0)) {
+    errors.push('docker.resources.limits.pids必须是正整数');
+  }
+  // 同时声明了请求和限制时，请求不能大于限制（只声明了限制时，默认请求会被截到限制以内）
+  const requests = resources.requests || {};
+  if (errors.length === 0) {
+    if (requests.cpu !== undefined && limits.cpu !== undefined && parseCpu(requests.cpu) > parseCpu(limits.cpu)) {
+      errors.push('docker.resources.requests.cpu不能大于limits.cpu');
+    }
+    if (requests.memory !== undefined && limits.memory !== undefined && parseMemory(requests.memory) > parseMemory(limits.memory)) {
+      errors.push('docker.resources.requests.memory不能大于limits.memory');
+    }
+  }
+  return errors;
+}
+
+/**
+ * 解析运行的资源请求和限制
+ * @param {object|null} config - scenario配置，没有scenario时为null
+ * @returns {object} { requests: { cpu, memory }, limits: { cpu, memory, pids } }，cpu为毫核，memory为字节，限制为0表示不限制
+ */
+function fromScenario(config) {
+  const resources = (config && config.docker && config.docker.resources) || {};
+  const requests = resources.requests || {};
+  const limits = resources.limits || {};
+  const resolved = {
+    requests: {
+      cpu: requests.cpu !== undefined ? parseCpu(requests.cpu) : DEFAULTS.requests.cpu,
+      memory: requests.memory !== undefined ? parseMemory(requests.memory) : DEFAULTS.requests.memory
+    },
+    limits: {
+      cpu: limits.cpu !== undefined ? parseCpu(limits.cpu) : DEFAULTS.limits.cpu,
+      memory: limits.memory !== undefined ? parseMemory(limits.memory) : DEFAULTS.limits.memory,
+      pids: limits.pids !== undefined ? limits.pids : DEFAULTS.limits.pids
+    }
+  };
+  // 只声明了限制时，请求不超过限制
+  if (resolved.limits.cpu && resolved.requests.cpu > resolved.limits.cpu) {
+    resolved.requests.cpu = resolved.limits.cpu;
+  }
+  if (resolved.limits.memory && resolved.requests.memory > resolved.limits.memory) {
+    resolved.requests.memory = resolved.limits.memory;
+  }
+  return resolved;
+}
+
+/**
+ * 转换为Docker createContainer的HostConfig字段
+ * @param {object} resources - fromScenario的返回值
+ * @returns {object} HostConfig中的资源字段
+ */
+function hostConfig({ requests, limits }) {
+  const config = {
+    // 与Docker默认的1024对应1核，争用时按请求的比例分配CPU时间
+    CpuShares: Math.max(2, Math.round(requests.cpu * 1024 / 1000)),
+    MemoryReservation: requests.memory
+  };
+  if (limits.pids) {
+    config.PidsLimit = limits.pids;
+  }
+  if (limits.cpu) {
+    config.NanoCpus = limits.cpu * 1e6;
+  }
+  if (limits.memory) {
+    config.Memory = limits.memory;
+  }
+  return config;
+}
+
+module.exports = {
+  parseCpu,
+  parseMemory,
+  validate,
+  fromScenario,
+  hostConfig
+};
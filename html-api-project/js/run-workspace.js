@@ -0,0 +1,43 @@
+/**
+ * 运行工作目录模块
+ *
+ * 子docker的卷挂载在 /workmate，约定的目录结构为：
+ * - /workmate/input/input.json：输入数据
+ * - /workmate/logs/：日志（由卷读取器同步到共享卷）
+ * - /workmate/outputs/：输出（由卷读取器同步到共享卷）
+ *
+ * 通过Docker的putArchive接口把目录和输入文件以内存tar包写入已创建（未启动）的容器，
+ * 目录权限为777，与子docker内以任意用户运行的进程兼容。
+ */
+const tarArchive = require('./tar-archive');
+
+// 运行容器中卷的挂载路径
+const WORKMATE_PATH = '/workmate';
+
+// 工作目录下的子目录
+const WORKSPACE_DIRS = ['logs', 'input', 'outputs'];
+
+/**
+ * 把工作目录结构和输入文件写入容器的卷
+ * @param {object} container - dockerode容器对象（已创建）
+ * @param {object} options - { inputs, directories }
+ *   inputs：写入input/input.json的内容，未提供时不写入
+ *   directories：是否创建目录结构（新卷需要，预热的卷已经创建过）
+ * @returns {Promise<void>}
+ */
+async function stage(container, { inputs, directories = true } = {}) {
+  const entries = directories
+    ? WORKSPACE_DIRS.map(dir => ({ name: `${dir}/`, type: 'dir', mode: 0o777 }))
+    : [];
+  if (inputs) {
+    entries.push({ name: 'input/input.json', type: 'file', mode: 0o666, content: inputs });
+  }
+  if (entries.length > 0) {
+    await tarArchive.putEntries(container, WORKMATE_PATH, entries);
+  }
+}
+
+module.exports = {
+  WORKMATE_PATH,
+  stage
+};
@@ -1,44 +1,228 @@
 /**
  * Scenario配置文件管理模块
+ *
+ * 启动时把scenarios目录中的YAML文件全部解析、校验后放入内存目录，
+ * 之后通过fs.watch监听目录变化并重新加载。请求处理只读取内存目录，
+ * 不再有同步磁盘读取和YAML解析。
  */
 const fs = require('fs');
 const path = require('path');
+const crypto = require('crypto');
+const yaml = require('js-yaml');
+const runResources = require('./run-resources');
 
 // Scenario配置文件目录
 const SCENARIOS_DIR = path.join(__dirname, '../scenarios');
 
+// 目录变化后延迟重新加载的时间（毫秒），合并编辑器保存时的多次事件
+const RELOAD_DEBOUNCE = 200;
+
+// 监听失败后重试的间隔（毫秒）
+const WATCH_RETRY_INTERVAL = 5000;
+
+// 内存中的scenario目录
+const catalog = {
+  // scenarioId -> { id, file, content, config, valid, errors }
+  scenarios: new Map(),
+  // 目录内容的版本号，任何文件变化都会改变它
+  version: null,
+  loading: null,
+  watcher: null,
+  reloadTimer: null
+};
+
+/**
+ * 判断文件是否为scenario配置文件
+ * @param {string} file - 文件名
+ * @returns {boolean}
+ */
+function isScenarioFile(file) {
+  return file.endsWith('.yaml') || file.endsWith('.yml');
+}
+
+/**
+ * 校验解析后的scenario配置
+ * @param {object} config - YAML解析结果
+ * @returns {Array<string>} 错误信息列表，为空表示校验通过
+ */
+function validateScenario(config) {
+  const errors = [];
+  if (!config || typeof config !== 'object' || Array.isArray(config)) {
+    return ['配置内容必须是YAML对象'];
+  }
+  if (config.name === undefined || config.name === null || config.name === '') {
+    errors.push('缺少name字段');
+  }
+  if (config.description === undefined || config.description === null || config.description === '') {
+    errors.push('缺少description字段');
+  }
+  for (const field of ['inputs', 'outputs', 'settings']) {
+    if (config[field] !== undefined && !Array.isArray(config[field])) {
+      errors.push(`${field}字段必须是数组`);
+    }
+  }
+  if (config.docker !== undefined) {
+    const docker = config.docker;
+    if (!docker || typeof docker !== 'object' || Array.isArray(docker)) {
+      errors.push('docker字段必须是对象');
+    } else {
+      if (docker.image !== undefined && typeof docker.image !== 'string') {
+        errors.push('docker.image字段必须是字符串');
+      }
+      if (docker.imagePullPolicy !== undefined && !['always', 'interval', 'never'].includes(docker.imagePullPolicy)) {
+        errors.push('docker.imagePullPolicy字段必须是always、interval或never');
+      }
+      if (docker.warmPool !== undefined && !(Number.isInteger(docker.warmPool) && docker.warmPool >= 0)) {
+        errors.push('docker.warmPool字段必须是非负整数');
+      }
+      if (docker.resources !== undefined) {
+        errors.push(...runResources.validate(docker.resources));
+      }
+    }
+  }
+  return errors;
+}
+
+/**
+ * 重新加载整个scenario目录
+ * @returns {Promise<void>}
+ */
+async function loadCatalog() {
+  if (!fs.existsSync(SCENARIOS_DIR)) {
+    console.error(`Scenarios目录不存在: ${SCENARIOS_DIR}`);
+    catalog.scenarios = new Map();
+    catalog.version = 'empty';
+    return;
+  }
+
+  const files = (await fs.promises.readdir(SCENARIOS_DIR)).filter(isScenarioFile).sort();
+  const scenarios = new Map();
+  const hash = crypto.createHash('sha1');
+
+  for (const file of files) {
+    const id = path.basename(file, path.extname(file));
+    // 同时存在.yaml和.yml时以.yaml为准，与此前的查找顺序一致
+    if (scenarios.has(id) && file.endsWith('.yml')) {
+      continue;
+    }
+
+    const content = await fs.promises.readFile(path.join(SCENARIOS_DIR, file), 'utf8');
+    hash.update(`${file}\0${content}\0`);
+
+    let config = null;
+    let errors;
+    try {
+      config = yaml.load(content);
+      errors = validateScenario(config);
+    } catch (parseError) {
+      errors = [`YAML解析失败: ${parseError.message}`];
+    }
+    if (errors.length > 0) {
+      console.error(`Scenario ${file} 校验失败: ${errors.join('; ')}`);
+    }
+
+    scenarios.set(id, { id, file, content, config, valid: errors.length === 0, errors });
+  }
+
+  catalog.scenarios = scenarios;
+  catalog.version = hash.digest('hex').substring(0, 16);
+  console.log(`Scenario目录已加载，共 ${scenarios.size} 个，版本: ${catalog.version}`);
+}
+
+/**
+ * 确保scenario目录已加载
+ * @returns {Promise<void>}
+ */
+function ensureLoaded() {
+  if (!catalog.loading) {
+    catalog.loading = loadCatalog().catch(error => {
+      // 加载失败时允许下次请求重试
+      catalog.loading = null;
+      throw error;
+    });
+  }
+  return catalog.loading;
+}
+
+/**
+ * 安排一次重新加载（合并短时间内的多次文件事件）
+ * 重新加载排在进行中的加载之后依次执行，后开始的加载总是后完成，不会被较早读到的目录覆盖
+ */
+function scheduleReload() {
+  clearTimeout(catalog.reloadTimer);
+  catalog.reloadTimer = setTimeout(() => {
+    const previous = catalog.loading || Promise.resolve();
+    const reload = previous.catch(() => {}).then(loadCatalog).catch(error => {
+      console.error('重新加载Scenario目录失败:', error);
+      // 从未加载成功时允许下次请求重试，否则继续使用上次加载的目录
+      if (catalog.loading === reload && catalog.version === null) {
+        catalog.loading = null;
+      }
+    });
+    catalog.loading = reload;
+  }, RELOAD_DEBOUNCE);
+}
+
+/**
+ * 监听scenarios目录的变化
+ */
+function watchCatalog() {
+  if (catalog.watcher || !fs.existsSync(SCENARIOS_DIR)) {
+    return;
+  }
+  try {
+    catalog.watcher = fs.watch(SCENARIOS_DIR, (eventType, file) => {
+      if (!file || isScenarioFile(file)) {
+        scheduleReload();
+      }
+    });
+    catalog.watcher.on('error', (error) => {
+      console.error(`监听Scenarios目录失败: ${error.message}`);
+      catalog.watcher.close();
+      catalog.watcher = null;
+      setTimeout(() => {
+        watchCatalog();
+        scheduleReload();
+      }, WATCH_RETRY_INTERVAL);
+    });
+  } catch (error) {
+    console.error(`监听Scenarios目录失败: ${error.message}`);
+  }
+}
+
+/**
+ * 加载scenario目录并开始监听变化（服务启动时调用）
+ * @returns {Promise<void>}
+ */
+async function initCatalog() {
+  await ensureLoaded();
+  watchCatalog();
+}
+
+/**
+ * 获取scenario目录的版本号，可直接用作ETag
+ * @returns {Promise<string>} 版本号
+ */
+async function getCatalogVersion() {
+  await ensureLoaded();
+  return catalog.version;
+}
+
 /**
  * 获取所有scenario的列表（包含name和description）
  * @returns {Promise<Array>} 包含所有scenario基本信息的数组
  */
 async function getAllScenarios() {
   try {
-    // 确保scenarios目录存在
-    if (!fs.existsSync(SCENARIOS_DIR)) {
-      console.error(`Scenarios目录不存在: ${SCENARIOS_DIR}`);
-      return [];
-    }
-
-    // 读取目录中的所有yaml文件
-    const files = fs.readdirSync(SCENARIOS_DIR).filter(file => 
-      file.endsWith('.yaml') || file.endsWith('.yml')
-    );
+    await ensureLoaded();
 
-    // 提取每个scenario的name和description
     const scenarios = [];
-    for (const file of files) {
-      const filePath = path.join(SCENARIOS_DIR, file);
-      const content = fs.readFileSync(filePath, 'utf8');
-      
-      // 简单解析YAML以提取name和description
-      const nameMatch = content.match(/^name:\s*(.+)$/m);
-      const descMatch = content.match(/^description:\s*(.+)$/m);
-      
-      if (nameMatch && descMatch) {
+    for (const entry of catalog.scenarios.values()) {
+      if (entry.valid) {
         scenarios.push({
-          id: path.basename(file, path.extname(file)),
-          name: nameMatch[1].trim(),
-          description: descMatch[1].trim()
+          id: entry.id,
+          name: String(entry.config.name).trim(),
+          description: String(entry.config.description).trim()
         });
       }
     }
@@ -50,6 +234,36 @@ async function getAllScenarios() {
   }
 }
 
+/**
+ * 获取所有有效scenario解析后的配置
+ * @returns {Promise<Array<object>>} [{ id, config }]
+ */
+async function getScenarioConfigs() {
+  await ensureLoaded();
+  return Array.from(catalog.scenarios.values())
+    .filter(entry => entry.valid)
+    .map(entry => ({ id: entry.id, config: entry.config }));
+}
+
+/**
+ * 在目录中查找scenario
+ * @param {string} scenarioId - scenario的ID（文件名，不含扩展名）
+ * @returns {Promise<object>} 目录条目
+ */
+async function findScenario(scenarioId) {
+  // 安全检查：防止路径遍历攻击
+  if (scenarioId.includes('/') || scenarioId.includes('\\')) {
+    throw new Error('无效的scenario ID');
+  }
+
+  await ensureLoaded();
+  const entry = catalog.scenarios.get(scenarioId);
+  if (!entry) {
+    throw new Error(`找不到scenario: ${scenarioId}`);
+  }
+  return entry;
+}
+
 /**
  * 获取指定scenario的完整YAML内容
  * @param {string} scenarioId - scenario的ID（文件名，不含扩展名）
@@ -57,23 +271,26 @@ async function getAllScenarios() {
  */
 async function getScenarioYaml(scenarioId) {
   try {
-    // 安全检查：防止路径遍历攻击
-    if (scenarioId.includes('/') || scenarioId.includes('\\')) {
-      throw new Error('无效的scenario ID');
-    }
+    const entry = await findScenario(scenarioId);
+    return entry.content;
+  } catch (error) {
+    console.error(`获取scenario ${scenarioId} 失败:`, error);
+    throw new Error(`获取scenario失败: ${error.message}`);
+  }
+}
 
-    // 尝试查找.yaml和.yml扩展名
-    let filePath = path.join(SCENARIOS_DIR, `${scenarioId}.yaml`);
-    if (!fs.existsSync(filePath)) {
-      filePath = path.join(SCENARIOS_DIR, `${scenarioId}.yml`);
-      if (!fs.existsSync(filePath)) {
-        throw new Error(`找不到scenario: ${scenarioId}`);
-      }
+/**
+ * 获取指定scenario解析并校验后的配置
+ * @param {string} scenarioId - scenario的ID（文件名，不含扩展名）
+ * @returns {Promise<object>} scenario配置对象
+ */
+async function getScenario(scenarioId) {
+  try {
+    const entry = await findScenario(scenarioId);
+    if (!entry.valid) {
+      throw new Error(`scenario ${scenarioId} 配置无效: ${entry.errors.join('; ')}`);
     }
-
-    // 读取YAML文件内容
-    const content = fs.readFileSync(filePath, 'utf8');
-    return content;
+    return entry.config;
   } catch (error) {
     console.error(`获取scenario ${scenarioId} 失败:`, error);
     throw new Error(`获取scenario失败: ${error.message}`);
@@ -81,6 +298,10 @@ async function getScenarioYaml(scenarioId) {
 }
 
 module.exports = {
+  initCatalog,
+  getCatalogVersion,
   getAllScenarios,
-  getScenarioYaml
-};
\ No newline at end of file
+  getScenarioConfigs,
+  getScenarioYaml,
+  getScenario
+};
@@ -4,11 +4,21 @@
 const express = require('express');
 const cors = require('cors');
 const bodyParser = require('body-parser');
+const compression = require('compression');
+const zlib = require('zlib');
 const { createClient } = require('redis');
 const scenarioManager = require('./scenario-manager');
+const logStream = require('./log-stream');
+const httpCache = require('./http-cache');
+const logReader = require('./log-reader');
+const metrics = require('./metrics');
+const runIndex = require('./run-index');
 const app = express();
 const port = 3000;
 
+// 小于该字节数的响应不压缩
+const COMPRESSION_THRESHOLD = Number(process.env.COMPRESSION_THRESHOLD) || 1024;
+
 // Redis客户端
 const redisClient = createClient({
   url: 'redis://redis:6379'
@@ -25,16 +35,96 @@ const redisClient = createClient({
 })();
 
 // 中间件
+// 记录每个路由的请求耗时和处理中的请求数
+app.use(metrics.httpMiddleware());
 app.use(cors());
+// 按Accept-Encoding协商gzip/brotli压缩，日志等重复度高的文本压缩比很大
+app.use(compression({
+  threshold: COMPRESSION_THRESHOLD,
+  // 压缩级别偏向速度，brotli默认的最高级别对动态响应太慢
+  level: 6,
+  brotli: { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 } },
+  filter: shouldCompress
+}));
 app.use(bodyParser.json());
 app.use(express.static('../')); // 提供静态文件访问
 
+/**
+ * 判断响应是否需要压缩
+ * SSE需要逐条立即送达，Range请求返回的是原始文件的字节片段，都不压缩
+ * @param {object} req - Express请求
+ * @param {object} res - Express响应
+ * @returns {boolean}
+ */
+function shouldCompress(req, res) {
+  if (req.headers.range || res.statusCode === 206) {
+    return false;
+  }
+  const contentType = String(res.getHeader('Content-Type') || '');
+  if (contentType.startsWith('text/event-stream')) {
+    return false;
+  }
+  return compression.filter(req, res);
+}
+
+/**
+ * 查询参数raw是否开启了原始文件下载
+ * @param {object} query - 查询参数
+ * @returns {boolean}
+ */
+function isRawRequest(query) {
+  return query.raw === '1' || query.raw === 'true';
+}
+
+/**
+ * 解析运行历史的分页和筛选参数
+ * @param {object} query - 查询参数 { limit, cursor, status, scenarioId, from, to, order }
+ * @returns {object} { options } 或 { error }
+ */
+function parseHistoryQuery(query) {
+  const options = {};
+  if (query.limit !== undefined) {
+    options.limit = Number(query.limit);
+    if (!Number.isInteger(options.limit) || options.limit <= 0) {
+      return { error: '无效的limit参数，必须为正整数' };
+    }
+  }
+  if (query.cursor) {
+    options.after = runIndex.decodeCursor(query.cursor);
+    if (!options.after) {
+      return { error: '无效的cursor参数' };
+    }
+  }
+  if (query.status) {
+    options.status = String(query.status).split(',').map(item => item.trim()).filter(Boolean);
+  }
+  if (query.scenarioId) {
+    options.scenarioId = String(query.scenarioId);
+  }
+  // 时间可以是ISO时间或毫秒时间戳
+  for (const field of ['from', 'to']) {
+    if (query[field] === undefined || query[field] === '') continue;
+    const value = /^\d+$/.test(query[field]) ? Number(query[field]) : Date.parse(query[field]);
+    if (Number.isNaN(value)) {
+      return { error: `无效的${field}参数，必须为ISO时间或毫秒时间戳` };
+    }
+    options[field] = value;
+  }
+  if (query.order !== undefined) {
+    if (query.order !== 'asc' && query.order !== 'desc') {
+      return { error: '无效的order参数，必须为asc或desc' };
+    }
+    options.order = query.order;
+  }
+  return { options };
+}
+
 // API路由
 const apiRouter = express.Router();
 
-// 启动Docker容器
+// 启动Docker容器：默认加入启动队列并返回202和runId，wait为true时同步等待启动完成
 apiRouter.post('/docker/start', async (req, res) => {
-  const { dockerName, options, username, scenarioId } = req.body;
+  const { dockerName, options, username, scenarioId, wait = false } = req.body;
   
   if (!dockerName) {
     return res.status(400).json({ 
@@ -44,14 +134,87 @@ apiRouter.post('/docker/start', async (req, res) => {
   }
   
   try {
-    const result = await API.startDocker(dockerName, options, username, scenarioId);
+    if (wait) {
+      const result = await API.startDocker(dockerName, options, username, scenarioId);
+      return res.json(result);
+    }
+    
+    const result = await API.enqueueDocker(dockerName, options, username, scenarioId);
+    if (!result.success) {
+      return res.status(500).json(result);
+    }
+    res.status(202).json(result);
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+// 查询启动任务状态
+apiRouter.get('/docker/jobs/:runId', async (req, res) => {
+  const { runId } = req.params;
+  
+  try {
+    const result = await API.getRunJob(runId);
+    if (!result.success) {
+      return res.status(404).json(result);
+    }
     res.json(result);
   } catch (error) {
     res.status(500).json({ success: false, error: error.message });
   }
 });
 
-// 获取Docker日志
+// 批量启动：同一个scenario的一组inputs共用settings，加入启动队列并返回202和batchId
+apiRouter.post('/docker/batch', async (req, res) => {
+  const { dockerName, inputs, settings, username, scenarioId } = req.body;
+  
+  if (!dockerName) {
+    return res.status(400).json({ 
+      success: false, 
+      error: '缺少Docker容器名称' 
+    });
+  }
+  if (!Array.isArray(inputs) || inputs.length === 0) {
+    return res.status(400).json({
+      success: false,
+      error: 'inputs必须为非空数组'
+    });
+  }
+  if (inputs.length > API.config.batchMaxItems) {
+    return res.status(400).json({
+      success: false,
+      error: `一次最多启动 ${API.config.batchMaxItems} 个运行`
+    });
+  }
+  
+  try {
+    const result = await API.enqueueDockerBatch(dockerName, { inputs, settings }, username, scenarioId);
+    if (!result.success) {
+      return res.status(500).json(result);
+    }
+    res.status(202).json(result);
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+// 查询批量启动的汇总进度和各运行的结果
+apiRouter.get('/docker/batches/:batchId', async (req, res) => {
+  const { batchId } = req.params;
+  
+  try {
+    const result = await API.getRunBatch(batchId);
+    if (!result.success) {
+      return res.status(404).json(result);
+    }
+    res.json(result);
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+// 获取Docker日志，支持 ?start=&end=（字节范围）、?tail=N（最后N行）、?lineOffset=&lineLimit=（按行分页）
+// ?raw=1 时直接下载日志文件，支持Range请求头
 apiRouter.get('/docker/logs/:dockerId', async (req, res) => {
   const { dockerId } = req.params;
   const { logFile = 'run.log' } = req.query;
@@ -63,15 +226,81 @@ apiRouter.get('/docker/logs/:dockerId', async (req, res) => {
     });
   }
   
+  if (isRawRequest(req.query)) {
+    try {
+      const info = await API.getDockerFileInfo(dockerId, 'logs', logFile);
+      if (!info.success) {
+        return res.status(404).json(info);
+      }
+      // 已归档的日志是压缩文件，解压后的内容按需发送
+      if (info.data.archived) {
+        return await httpCache.sendArchivedFile(req, res, info.data.path, {
+          size: info.data.size,
+          mtimeMs: info.data.mtimeMs,
+          contentType: 'text/plain; charset=utf-8'
+        });
+      }
+      return await httpCache.sendRawFile(res, info.data.path, { contentType: 'text/plain; charset=utf-8' });
+    } catch (error) {
+      return res.status(500).json({ success: false, error: error.message });
+    }
+  }
+  
+  let logQuery;
   try {
-    const result = await API.getDockerLogs(dockerId, logFile);
-    res.json(result);
+    logQuery = logReader.parseLogQuery(req.query, API.config.logReadLimit);
+  } catch (error) {
+    return res.status(400).json({ success: false, error: error.message });
+  }
+  
+  try {
+    const info = await API.getDockerFileInfo(dockerId, 'logs', logFile);
+    if (!info.success) {
+      // 文件不存在等情况沿用原有的错误信息
+      return res.json(await API.getDockerLogs(dockerId, logFile));
+    }
+    
+    // 日志只会追加，大小和修改时间不变即可返回304
+    if (httpCache.notModified(req, res, {
+      etag: httpCache.etag('log', info.data.size, Math.floor(info.data.mtimeMs)),
+      lastModified: info.data.mtimeMs
+    })) {
+      return;
+    }
+    
+    // 边读边写出JSON，不把整个日志读入内存
+    await logReader.sendLog(res, info.data.path, info.data.size, logQuery);
   } catch (error) {
     res.status(500).json({ success: false, error: error.message });
   }
 });
 
-// 获取Docker输出
+// 流式跟踪Docker日志（SSE），支持 ?since=<字节偏移量> 或 Last-Event-ID 断点续传
+apiRouter.get('/docker/logs/:dockerId/stream', async (req, res) => {
+  const { dockerId } = req.params;
+  const { logFile = 'run.log' } = req.query;
+
+  const sinceValue = req.query.since !== undefined ? req.query.since : req.get('Last-Event-ID');
+  const since = logStream.parseByteOffset(sinceValue);
+  if (sinceValue !== undefined && since === null) {
+    return res.status(400).json({
+      success: false,
+      error: '无效的since参数，必须为非负整数'
+    });
+  }
+
+  try {
+    const result = await API.openDockerLogStream(dockerId, logFile, since || 0);
+    if (!result.success) {
+      return res.status(500).json(result);
+    }
+    logStream.sendLogStream(req, res, result.data, since || 0);
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+// 获取Docker输出，?raw=1 时直接下载输出文件
 apiRouter.get('/docker/output/:dockerId', async (req, res) => {
   const { dockerId } = req.params;
   const { outputFile = 'output.json' } = req.query;
@@ -84,6 +313,25 @@ apiRouter.get('/docker/output/:dockerId', async (req, res) => {
   }
   
   try {
+    // 输出文件会被整体替换，按内容哈希（以及返回中附带的scenario配置版本）判断是否变化
+    const info = await API.getDockerFileInfo(dockerId, 'outputs', outputFile);
+    
+    // ?raw=1 时直接下载输出文件，支持Range请求头
+    if (isRawRequest(req.query)) {
+      if (!info.success) {
+        return res.status(404).json(info);
+      }
+      return await httpCache.sendRawFile(res, info.data.path);
+    }
+    
+    if (info.success) {
+      const contentHash = await httpCache.fileHash(info.data.path, info.data);
+      const catalogVersion = await scenarioManager.getCatalogVersion();
+      if (httpCache.notModified(req, res, { etag: httpCache.etag('output', contentHash, catalogVersion) })) {
+        return;
+      }
+    }
+    
     const result = await API.getDockerOutput(dockerId, outputFile);
     res.json(result);
   } catch (error) {
@@ -102,8 +350,26 @@ apiRouter.get('/docker/list/:username', async (req, res) => {
     });
   }
   
+  const { options, error } = parseHistoryQuery(req.query);
+  if (error) {
+    return res.status(400).json({ success: false, error });
+  }
+  
+  try {
+    const result = await API.getUserDockers(username, options);
+    res.json(result);
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+// 获取各Docker主机的容量和已承诺的资源
+apiRouter.get('/docker/capacity', async (req, res) => {
   try {
-    const result = await API.getUserDockers(username);
+    const result = await API.getCapacity();
+    if (!result.success) {
+      return res.status(500).json(result);
+    }
     res.json(result);
   } catch (error) {
     res.status(500).json({ success: false, error: error.message });
@@ -123,6 +389,38 @@ apiRouter.get('/docker/status/:dockerId', async (req, res) => {
   
   try {
     const result = await API.getDockerStatus(dockerId);
+    // 状态来自容器状态缓存，按返回内容生成验证器
+    if (result.success && httpCache.notModified(req, res, {
+      etag: httpCache.etag('status', httpCache.hashContent(JSON.stringify(result.data)))
+    })) {
+      return;
+    }
+    res.json(result);
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+// 获取运行快照：状态、日志游标之后的新内容和有变化的输出
+apiRouter.get('/docker/snapshot/:dockerId', async (req, res) => {
+  const { dockerId } = req.params;
+  const { logFile = 'run.log', outputFile = 'output.json', outputVersion = '' } = req.query;
+  
+  const logCursor = logStream.parseByteOffset(req.query.logCursor);
+  if (req.query.logCursor !== undefined && logCursor === null) {
+    return res.status(400).json({
+      success: false,
+      error: '无效的logCursor参数，必须为非负整数'
+    });
+  }
+  
+  try {
+    const result = await API.getDockerSnapshot(dockerId, {
+      logFile,
+      logCursor: logCursor || 0,
+      outputFile,
+      outputVersion
+    });
     res.json(result);
   } catch (error) {
     res.status(500).json({ success: false, error: error.message });
@@ -182,9 +480,15 @@ apiRouter.post('/docker/cleanup', async (req, res) => {
 // 获取所有scenario的name和description
 apiRouter.get('/scenarios', async (req, res) => {
   try {
+    const version = await scenarioManager.getCatalogVersion();
+    if (httpCache.notModified(req, res, { etag: httpCache.etag('scenarios', version) })) {
+      return;
+    }
+    
     const scenarios = await scenarioManager.getAllScenarios();
     res.json({
       success: true,
+      version,
       scenarios
     });
   } catch (error) {
@@ -208,6 +512,11 @@ apiRouter.get('/scenarios/:scenarioId', async (req, res) => {
   
   try {
     const yamlContent = await scenarioManager.getScenarioYaml(scenarioId);
+    const version = await scenarioManager.getCatalogVersion();
+    if (httpCache.notModified(req, res, { etag: httpCache.etag('scenario', scenarioId, version) })) {
+      return;
+    }
+    
     res.json({
       success: true,
       content: yamlContent
@@ -297,6 +606,16 @@ apiRouter.post('/scenarios/:scenarioId/settings/:username', async (req, res) =>
   }
 });
 
+// Prometheus监控指标
+apiRouter.get('/metrics', async (req, res) => {
+  try {
+    res.set('Content-Type', metrics.contentType);
+    res.end(await metrics.collect());
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
 // 注册API路由
 app.use('/api', apiRouter);
 
@@ -310,6 +629,9 @@ const initCleanupTask = async () => {
     const cleanupJob = API.initCleanupScheduler('0 0 * * *');
     console.log('Docker和Volume定时清理任务已启动');
     
+    // 多个副本时只有领导者执行定时清理任务
+    await API.initLeaderElection();
+    
     // 也可以手动触发一次清理（用于测试）
     // await API.cleanupDockerResources(1);
   } catch (error) {
@@ -317,10 +639,89 @@ const initCleanupTask = async () => {
   }
 };
 
-// 启动服务器
-app.listen(port, () => {
-  console.log(`RESTful API服务器运行在 http://localhost:${port}`);
+// 加载Scenario目录，启动准入控制和容器状态缓存，接管后端重启前已存在的卷读取器，启动日志保留期限检查和启动队列worker池
+const initRunTracking = async () => {
+  try {
+    await scenarioManager.initCatalog();
+  } catch (error) {
+    console.error('加载Scenario目录失败:', error);
+  }
   
-  // 初始化定时清理任务
-  initCleanupTask();
+  try {
+    // 容器状态事件会释放或重新计入容量预留，先于状态缓存启动
+    await API.initAdmission();
+  } catch (error) {
+    console.error('启动准入控制失败:', error);
+  }
+  
+  try {
+    await API.initContainerState();
+  } catch (error) {
+    console.error('启动容器状态缓存失败:', error);
+  }
+  
+  try {
+    await API.initRunIndex();
+  } catch (error) {
+    console.error('回填运行时间索引失败:', error);
+  }
+  
+  try {
+    await API.initVolumeReaders();
+  } catch (error) {
+    console.error('接管卷读取器失败:', error);
+  }
+  
+  try {
+    await API.initLogRetention();
+  } catch (error) {
+    console.error('启动日志保留期限检查失败:', error);
+  }
+  
+  API.initResultSweep();
+  
+  try {
+    await API.initRunQueue();
+  } catch (error) {
+    console.error('启动队列worker池启动失败:', error);
+  }
+  
+  try {
+    await API.initWarmPool();
+  } catch (error) {
+    console.error('启动预热池失败:', error);
+  }
+};
+
+// 启动自检：无法确定共享卷时直接退出，而不是在第一次启动或读取时才失败
+const selfCheck = async () => {
+  try {
+    await API.initSharedVolume();
+  } catch (error) {
+    console.error('启动自检失败，无法确定共享卷:', error.message);
+    process.exit(1);
+  }
+};
+
+// 退出前释放领导者租约，让其他副本立即接任定时任务
+process.on('SIGTERM', async () => {
+  try {
+    await API.stopLeaderElection();
+  } catch (error) {
+    console.error('退出领导者选举失败:', error.message);
+  }
+  process.exit(0);
+});
+
+// 启动服务器
+selfCheck().then(() => {
+  app.listen(port, () => {
+    console.log(`RESTful API服务器运行在 http://localhost:${port}`);
+    
+    // 初始化定时清理任务
+    initCleanupTask();
+    
+    // 加载Scenario目录，初始化容器状态缓存、卷读取器和启动队列
+    initRunTracking();
+  });
 });
\ No newline at end of file
@@ -0,0 +1,89 @@
+/**
+ * 内存tar归档模块
+ *
+ * 生成ustar格式的tar包，供Docker的putArchive接口把少量文件和目录直接写入容器（包括挂载的卷），
+ * 不需要再启动busybox容器复制文件。
+ */
+const { Readable } = require('stream');
+
+// tar的块大小
+const BLOCK_SIZE = 512;
+
+/**
+ * 把数字写成以NUL结尾的八进制字段
+ * @param {Buffer} header - 头部
+ * @param {number} value - 数值
+ * @param {number} offset - 字段偏移
+ * @param {number} length - 字段长度
+ */
+function writeOctal(header, value, offset, length) {
+  header.write(value.toString(8).padStart(length - 1, '0'), offset, length - 1, 'ascii');
+}
+
+/**
+ * 生成一个条目的头部
+ * @param {object} entry - { name, type, mode, size }
+ * @returns {Buffer} 512字节的头部
+ */
+function createHeader({ name, type, mode, size }) {
+  if (Buffer.byteLength(name) > 100) {
+    throw new Error(`tar条目名称过长: ${name}`);
+  }
+
+  const header = Buffer.alloc(BLOCK_SIZE);
+  header.write(name, 0, 100, 'utf8');
+  writeOctal(header, mode, 100, 8);
+  writeOctal(header, 0, 108, 8); // uid
+  writeOctal(header, 0, 116, 8); // gid
+  writeOctal(header, size, 124, 12);
+  writeOctal(header, Math.floor(Date.now() / 1000), 136, 12);
+  header.write(type === 'dir' ? '5' : '0', 156, 1, 'ascii');
+  header.write('ustar\u000000', 257, 8, 'ascii');
+
+  // 校验和按校验和字段为空格计算
+  header.fill(' ', 148, 156);
+  let checksum = 0;
+  for (const byte of header) {
+    checksum += byte;
+  }
+  header.write(`${checksum.toString(8).padStart(6, '0')}\u0000 `, 148, 8, 'ascii');
+  return header;
+}
+
+/**
+ * 生成tar包
+ * @param {Array<object>} entries - [{ name, type: 'dir'|'file', mode, content }]，目录名以/结尾
+ * @returns {Buffer} tar包内容
+ */
+function createTar(entries) {
+  const blocks = [];
+  for (const entry of entries) {
+    const content = entry.type === 'dir' ? Buffer.alloc(0) : Buffer.from(entry.content || '');
+    const mode = entry.mode || (entry.type === 'dir' ? 0o777 : 0o666);
+    blocks.push(createHeader({ name: entry.name, type: entry.type, mode, size: content.length }));
+    if (content.length > 0) {
+      blocks.push(content);
+      const padding = (BLOCK_SIZE - (content.length % BLOCK_SIZE)) % BLOCK_SIZE;
+      blocks.push(Buffer.alloc(padding));
+    }
+  }
+  // 两个全零块表示归档结束
+  blocks.push(Buffer.alloc(BLOCK_SIZE * 2));
+  return Buffer.concat(blocks);
+}
+
+/**
+ * 把文件和目录写入容器的指定路径（容器可以处于已创建未启动的状态）
+ * @param {object} container - dockerode容器对象
+ * @param {string} targetPath - 容器内的目标目录
+ * @param {Array<object>} entries - createTar的条目
+ * @returns {Promise<void>}
+ */
+async function putEntries(container, targetPath, entries) {
+  await container.putArchive(Readable.from([createTar(entries)]), { path: targetPath });
+}
+
+module.exports = {
+  createTar,
+  putEntries
+};
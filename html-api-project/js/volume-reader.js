@@ -0,0 +1,471 @@
+/**
+ * 运行卷读取器管理模块
+ *
+ * 每个运行中的子docker会配套一个长期存在的busybox读取器容器（reader-<containerName>），
+ * 它同时挂载子docker的volume（/source，只读）和共享卷（/dest），按固定间隔把
+ * logs和outputs目录增量同步到 /shared-mounts/<containerName> 下。
+ * 这样日志和输出的读取就只是一次本地文件读取，不再需要每次请求都创建busybox容器。
+ *
+ * 生命周期：
+ * - 首次读取或启动子docker时创建读取器
+ * - 子docker退出后停止读取器，读取器收到SIGTERM时会做最后一次同步
+ * - 已退出的子docker只做一次性同步，并在Redis中记录readerFinalizedAt，之后直接读本地文件
+ * - 完成最终同步后通知API模块（onFinalized），由它把结果保存到结果存储并回收运行的volume
+ * - 清理或删除子docker前先释放读取器，否则volume仍被占用无法删除
+ *
+ * 读取器创建在子docker所在的Docker主机上（运行记录的host字段），
+ * 各主机上名称相同的共享卷需要指向同一存储，后端才能读到同步的文件。
+ */
+const fs = require('fs');
+const path = require('path');
+const containerState = require('./container-state');
+const metrics = require('./metrics');
+const launchTrace = require('./launch-trace');
+
+// 共享卷在后端容器中的挂载路径
+const SHARED_MOUNTS_PATH = '/shared-mounts';
+
+// 同步间隔（秒）
+const SYNC_INTERVAL = Number(process.env.READER_SYNC_INTERVAL) || 1;
+
+// 等待读取器完成首次同步的最长时间（毫秒）
+const READY_TIMEOUT = 5000;
+
+// 读取器容器的标签，用于重启后重新接管
+const READER_LABEL = 'workmate.reader';
+
+// 就绪标记文件，读取器每完成一轮同步都会更新它
+const READY_MARKER = '.reader-ready';
+
+// 首次同步到非空日志的时间标记文件，用于启动时间线（一次性同步时不写入，时间不准确）
+const FIRST_LOG_MARKER = '.first-log';
+
+// 读取器容器内执行的同步脚本（busybox sh）
+// 日志只追加新写入的字节；输出文件整体替换，避免后端读到写了一半的JSON
+const SYNC_SCRIPT = [
+  'DEST="/dest/$RUN_NAME"',
+  'sync_once() {',
+  '  for dir in logs outputs; do',
+  '    mkdir -p "$DEST/$dir"',
+  '    for f in /source/$dir/*; do',
+  '      [ -f "$f" ] || continue',
+  '      d="$DEST/$dir/$(basename "$f")"',
+  '      s=$(wc -c < "$f")',
+  '      ds=0',
+  '      [ -f "$d" ] && ds=$(wc -c < "$d")',
+  '      if [ "$dir" = logs ]; then',
+  '        if [ "$ds" -gt 0 ] && [ "$s" -gt "$ds" ]; then',
+  '          tail -c +$((ds + 1)) "$f" | head -c $((s - ds)) >> "$d"',
+  '        elif [ "$s" -ne "$ds" ]; then',
+  '          cp -f "$f" "$d"',
+  '        fi',
+  `        if [ "$ONCE" != 1 ] && [ "$s" -gt 0 ] && [ ! -f "$DEST/${FIRST_LOG_MARKER}" ]; then`,
+  `          date -u +%Y-%m-%dT%H:%M:%SZ > "$DEST/${FIRST_LOG_MARKER}"`,
+  '        fi',
+  '      elif [ "$s" -ne "$ds" ] || ! cmp -s "$f" "$d"; then',
+  '        cp -f "$f" "$d.tmp" && mv -f "$d.tmp" "$d"',
+  '      fi',
+  '    done',
+  '  done',
+  '}',
+  'if [ "$ONCE" = 1 ]; then sync_once; exit 0; fi',
+  "trap 'sync_once; exit 0' TERM INT",
+  'while true; do',
+  '  sync_once',
+  `  touch "$DEST/${READY_MARKER}"`,
+  '  sleep "$SYNC_INTERVAL" & wait $!',
+  'done'
+].join('\n');
+
+const VolumeReader = {
+    // Docker主机池和Redis客户端，由API模块注入
+    hosts: null,
+    redisClient: null,
+    getSharedVolumeName: null,
+    revalidateSharedVolume: null,
+    // 运行完成最终同步后的回调：(runInfo) => Promise
+    onFinalized: null,
+
+    // 运行中的读取器：containerName -> { container, dockerId, ready }
+    readers: new Map(),
+
+    // 正在建立中的同步操作，避免并发请求重复创建读取器
+    pending: new Map(),
+
+    // 已完成最终同步的运行（containerName集合）
+    finalized: new Set(),
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { hosts, redisClient, getSharedVolumeName, revalidateSharedVolume, onFinalized }
+     */
+    configure({ hosts, redisClient, getSharedVolumeName, revalidateSharedVolume, onFinalized }) {
+        this.hosts = hosts;
+        this.redisClient = redisClient;
+        this.getSharedVolumeName = getSharedVolumeName;
+        this.revalidateSharedVolume = revalidateSharedVolume;
+        this.onFinalized = onFinalized;
+    },
+
+    /**
+     * 获取运行在共享卷中的镜像目录
+     * @param {string} containerName - 子docker名称
+     * @returns {string} 本地目录路径
+     */
+    mirrorPath(containerName) {
+        return path.join(SHARED_MOUNTS_PATH, containerName);
+    },
+
+    /**
+     * 判断运行的镜像目录是否已经是最终状态（子docker已退出且完成最后一次同步）
+     * @param {string} containerName - 子docker名称
+     * @returns {boolean}
+     */
+    isFinal(containerName) {
+        return this.finalized.has(containerName);
+    },
+
+    /**
+     * 确保运行的logs和outputs已同步到本地镜像目录
+     * 运行中的子docker由读取器持续同步，已退出的只同步一次
+     * @param {object} runInfo - Redis中的docker信息（containerId、containerName、volumeName、readerFinalizedAt）
+     * @returns {Promise<string>} 本地镜像目录路径
+     */
+    async ensureSynced(runInfo) {
+        const { containerId, containerName } = runInfo;
+
+        if (runInfo.readerFinalizedAt) {
+            this.finalized.add(containerName);
+        }
+        if (this.finalized.has(containerName)) {
+            return this.mirrorPath(containerName);
+        }
+
+        const reader = this.readers.get(containerName);
+        if (reader) {
+            await reader.ready;
+            return this.mirrorPath(containerName);
+        }
+
+        if (!this.pending.has(containerName)) {
+            const task = this.establish(runInfo)
+                .finally(() => this.pending.delete(containerName));
+            this.pending.set(containerName, task);
+        }
+        await this.pending.get(containerName);
+
+        const established = this.readers.get(containerName);
+        if (established) {
+            await established.ready;
+        }
+        console.log(`运行 ${containerName || containerId} 的文件已同步到本地`);
+        return this.mirrorPath(containerName);
+    },
+
+    /**
+     * 根据子docker当前状态，启动长期读取器或做一次性同步
+     * @param {object} runInfo - Redis中的docker信息
+     */
+    async establish(runInfo) {
+        const { containerId, containerName } = runInfo;
+
+        const state = await containerState.get(containerId);
+        if (!state) {
+            // 子docker已被删除，本地镜像目录就是能拿到的全部内容
+            this.finalized.add(containerName);
+            return;
+        }
+        const running = state.status === 'running' || state.status === 'paused';
+
+        this.prepareMirror(containerName);
+
+        if (running) {
+            await metrics.timeVolumeSync('reader', async () => {
+                await this.startReader(runInfo);
+                await this.readers.get(containerName).ready;
+            });
+        } else {
+            await metrics.timeVolumeSync('once', () => this.syncOnce(runInfo));
+            await this.markFinalized(runInfo);
+        }
+    },
+
+    /**
+     * 在共享卷中预先创建镜像目录（由后端用户创建，方便后续清理）
+     * @param {string} containerName - 子docker名称
+     */
+    prepareMirror(containerName) {
+        const mirror = this.mirrorPath(containerName);
+        for (const dir of ['logs', 'outputs']) {
+            const dirPath = path.join(mirror, dir);
+            if (!fs.existsSync(dirPath)) {
+                fs.mkdirSync(dirPath, { recursive: true, mode: 0o777 });
+            }
+        }
+    },
+
+    /**
+     * 读取器容器的创建配置
+     * @param {object} runInfo - Redis中的docker信息
+     * @param {boolean} once - 是否只同步一次
+     * @returns {Promise<object>} createContainer参数
+     */
+    async readerConfig(runInfo, once) {
+        const { containerId, containerName, volumeName } = runInfo;
+        const sharedVolumeName = await this.getSharedVolumeName();
+        const randomSuffix = Math.random().toString(36).substring(2, 8);
+
+        return {
+            Image: 'busybox:latest',
+            name: once ? `sync-once-${containerName}-${randomSuffix}` : `reader-${containerName}`,
+            Cmd: ['sh', '-c', SYNC_SCRIPT],
+            Env: [
+                `RUN_NAME=${containerName}`,
+                `SYNC_INTERVAL=${SYNC_INTERVAL}`,
+                `ONCE=${once ? 1 : 0}`
+            ],
+            Labels: once ? {} : {
+                [READER_LABEL]: containerName,
+                'workmate.run-id': containerId,
+                'workmate.volume': volumeName
+            },
+            HostConfig: {
+                Binds: [
+                    `${volumeName}:/source:ro`,
+                    `${sharedVolumeName}:/dest`
+                ],
+                AutoRemove: true
+            }
+        };
+    },
+
+    /**
+     * 创建读取器容器，共享卷已不存在时重新确定共享卷后重试一次
+     * @param {object} runInfo - Redis中的docker信息
+     * @param {boolean} once - 是否只同步一次
+     * @returns {Promise<object>} 读取器容器
+     */
+    async createReaderContainer(runInfo, once) {
+        const docker = this.hosts.forRun(runInfo);
+        try {
+            return await docker.createContainer(await this.readerConfig(runInfo, once));
+        } catch (error) {
+            if (!this.revalidateSharedVolume || !(await this.revalidateSharedVolume(error))) {
+                throw error;
+            }
+            return docker.createContainer(await this.readerConfig(runInfo, once));
+        }
+    },
+
+    /**
+     * 对已退出的子docker做一次性同步
+     * @param {object} runInfo - Redis中的docker信息
+     */
+    async syncOnce(runInfo) {
+        const container = await this.createReaderContainer(runInfo, true);
+        await container.start();
+        const data = await container.wait();
+        if (data.StatusCode !== 0) {
+            throw new Error(`一次性同步容器退出状态码非0: ${data.StatusCode}`);
+        }
+    },
+
+    /**
+     * 为运行中的子docker启动长期读取器
+     * @param {object} runInfo - Redis中的docker信息
+     */
+    async startReader(runInfo) {
+        const { containerName } = runInfo;
+        const markerPath = path.join(this.mirrorPath(containerName), READY_MARKER);
+
+        // 删除旧的就绪标记，等待新读取器完成第一轮同步
+        fs.rmSync(markerPath, { force: true });
+
+        let container;
+        try {
+            container = await this.createReaderContainer(runInfo, false);
+            await container.start();
+            console.log(`已为 ${containerName} 启动卷读取器`);
+        } catch (error) {
+            if (error.statusCode !== 409) {
+                throw error;
+            }
+            // 同名读取器已存在（例如后端重启前创建的），直接接管
+            container = this.hosts.forRun(runInfo).getContainer(`reader-${containerName}`);
+        }
+
+        this.register(runInfo, container, this.waitForMarker(markerPath));
+    },
+
+    /**
+     * 登记读取器并监听子docker退出
+     * @param {object} runInfo - Redis中的docker信息
+     * @param {object} container - 读取器容器
+     * @param {Promise} ready - 首次同步完成的Promise
+     */
+    register(runInfo, container, ready) {
+        const { containerId, containerName } = runInfo;
+        this.readers.set(containerName, { container, dockerId: containerId, ready });
+
+        this.hosts.forRun(runInfo).getContainer(containerId).wait()
+            .catch(error => console.error(`等待 ${containerName} 退出失败，停止读取器: ${error.message}`))
+            .then(() => this.finalize(runInfo))
+            .catch(error => console.error(`结束 ${containerName} 的卷读取器失败: ${error.message}`));
+    },
+
+    /**
+     * 轮询等待就绪标记出现
+     * @param {string} markerPath - 标记文件路径
+     * @returns {Promise<void>}
+     */
+    waitForMarker(markerPath) {
+        return new Promise(resolve => {
+            const deadline = Date.now() + READY_TIMEOUT;
+            const check = () => {
+                if (fs.existsSync(markerPath) || Date.now() > deadline) {
+                    resolve();
+                } else {
+                    setTimeout(check, 100);
+                }
+            };
+            check();
+        });
+    },
+
+    /**
+     * 子docker退出后停止读取器（读取器会在退出前做最后一次同步）
+     * @param {object} runInfo - Redis中的docker信息
+     */
+    async finalize(runInfo) {
+        const { containerName } = runInfo;
+        const reader = this.readers.get(containerName);
+        if (!reader) return;
+
+        try {
+            await reader.container.stop({ t: 10 });
+            await reader.container.wait();
+        } catch (error) {
+            // 读取器可能已经退出并被自动删除
+            console.log(`停止 ${containerName} 的卷读取器时出现非致命错误: ${error.message}`);
+        }
+        this.readers.delete(containerName);
+
+        // 子docker被重启时（restart期间也会触发退出），重新创建读取器
+        const state = await containerState.inspect(runInfo.containerId);
+        if (state && state.status === 'running') {
+            await this.startReader(runInfo);
+            return;
+        }
+
+        await this.markFinalized(runInfo);
+        console.log(`${containerName} 已退出，卷读取器完成最终同步`);
+    },
+
+    /**
+     * 记录运行已完成最终同步
+     * @param {object} runInfo - Redis中的docker信息
+     */
+    async markFinalized(runInfo) {
+        const { containerId, containerName } = runInfo;
+        this.finalized.add(containerName);
+        try {
+            const pipeline = this.redisClient.multi();
+            pipeline.hSet(`docker:${containerId}`, 'readerFinalizedAt', new Date().toISOString());
+            const firstLogAt = this.firstLogTime(containerName);
+            if (firstLogAt) {
+                launchTrace.recordFirstLog(pipeline, containerId, firstLogAt);
+            }
+            await pipeline.exec();
+        } catch (error) {
+            console.error(`记录 ${containerName} 最终同步状态失败: ${error.message}`);
+        }
+        if (this.onFinalized) {
+            this.onFinalized(runInfo).catch(error => {
+                console.error(`保存 ${containerName} 的运行结果失败: ${error.message}`);
+            });
+        }
+    },
+
+    /**
+     * 读取器首次同步到非空日志的时间
+     * @param {string} containerName - 子docker名称
+     * @returns {string|null} ISO时间，尚未出现日志时返回null
+     */
+    firstLogTime(containerName) {
+        try {
+            return fs.readFileSync(path.join(this.mirrorPath(containerName), FIRST_LOG_MARKER), 'utf8').trim() || null;
+        } catch (error) {
+            return null;
+        }
+    },
+
+    /**
+     * 子docker被重新启动时，撤销最终同步标记，下次读取会重新创建读取器
+     * @param {object} runInfo - Redis中的docker信息
+     */
+    async reopen(runInfo) {
+        const { containerId, containerName } = runInfo;
+        this.finalized.delete(containerName);
+        await this.redisClient.hDel(`docker:${containerId}`, 'readerFinalizedAt');
+    },
+
+    /**
+     * 释放运行的读取器（删除子docker或volume之前调用）
+     * @param {object} runInfo - Redis中的docker信息（containerName、host）
+     */
+    async release(runInfo) {
+        const { containerName } = runInfo;
+        const reader = this.readers.get(containerName);
+        this.readers.delete(containerName);
+        this.finalized.delete(containerName);
+
+        const container = reader ? reader.container : this.hosts.forRun(runInfo).getContainer(`reader-${containerName}`);
+        try {
+            await container.remove({ force: true });
+            console.log(`已释放 ${containerName} 的卷读取器`);
+        } catch (error) {
+            // 读取器不存在时忽略
+            if (error.statusCode !== 404) {
+                console.log(`释放 ${containerName} 的卷读取器时出现非致命错误: ${error.message}`);
+            }
+        }
+    },
+
+    /**
+     * 后端启动时接管所有主机上已存在的读取器容器
+     * @returns {Promise<number>} 接管的读取器数量
+     */
+    async adopt() {
+        let adopted = 0;
+        for (const host of this.hosts.names()) {
+            const docker = this.hosts.get(host);
+            let containers;
+            try {
+                containers = await docker.listContainers({
+                    all: true,
+                    filters: { label: [READER_LABEL] }
+                });
+            } catch (error) {
+                console.error(`列出Docker主机 ${host} 上的卷读取器失败: ${error.message}`);
+                continue;
+            }
+
+            for (const item of containers) {
+                const containerName = item.Labels[READER_LABEL];
+                const runInfo = {
+                    containerId: item.Labels['workmate.run-id'],
+                    containerName,
+                    volumeName: item.Labels['workmate.volume'],
+                    host
+                };
+                this.register(runInfo, docker.getContainer(item.Id), Promise.resolve());
+            }
+            adopted += containers.length;
+        }
+
+        console.log(`接管了 ${adopted} 个卷读取器`);
+        return adopted;
+    }
+};
+
+module.exports = VolumeReader;
@@ -0,0 +1,361 @@
+/**
+ * 预热池模块
+ *
+ * 为在scenario配置中声明了 docker.warmPool 的scenario预先准备运行资源：
+ * 已创建的 volume-* 卷（含logs、input、outputs目录）和挂载该卷、已创建但未启动的运行容器。
+ * 启动运行时直接领取一份，用putArchive写入输入后即可启动，省去创建卷和创建容器。
+ *
+ * - 池中的条目保存在Redis列表 warm:<scenarioId> 中，LPOP领取，多个后端进程之间不会重复领取
+ * - 后台定期补充，所有scenario的条目总数不超过全局上限
+ * - 容器的环境变量只能在创建时指定：运行带有settings时，在预热的卷上重新创建容器
+ * - 镜像已更新、scenario的资源限制已改变或条目超过最长保留时间时丢弃该条目
+ * - 补充和核对持有分布式锁 warm-pool，多个后端副本中同一时间只有一个在维护预热池
+ */
+const crypto = require('crypto');
+const runWorkspace = require('./run-workspace');
+const runResources = require('./run-resources');
+const distributedLock = require('./distributed-lock');
+
+// 所有scenario的预热条目总数上限
+const MAX_TOTAL = Number(process.env.WARM_POOL_MAX) || 8;
+
+// 预热条目的最长保留时间（秒），超过后丢弃重建，避免长期使用旧镜像
+const MAX_AGE = Number(process.env.WARM_POOL_MAX_AGE) || 3600;
+
+// 后台补充的检查间隔（毫秒）
+const REFILL_INTERVAL = Number(process.env.WARM_POOL_REFILL_INTERVAL) || 30000;
+
+// 维护预热池使用的锁名称
+const POOL_LOCK = 'warm-pool';
+
+// 记录所有预热列表的集合，用于回收已取消预热的scenario的条目
+const POOL_KEYS = 'warm:scenarios';
+
+// 预热容器的标签，值为scenario ID
+const POOL_LABEL = 'workmate.pool';
+
+const { WORKMATE_PATH } = runWorkspace;
+
+const WarmPool = {
+    // 依赖，由API模块注入
+    docker: null,
+    redisClient: null,
+    // 确保镜像可用：(imageName, policy) => Promise<{ image }>
+    ensureImage: null,
+    // 获取所有scenario配置：() => Promise<Array<{ id, config }>>
+    listScenarios: null,
+
+    // 进行中的补充操作
+    refilling: null,
+    timer: null,
+
+    /**
+     * 注入依赖
+     * @param {object} deps - { docker, redisClient, ensureImage, listScenarios }
+     */
+    configure({ docker, redisClient, ensureImage, listScenarios }) {
+        this.docker = docker;
+        this.redisClient = redisClient;
+        this.ensureImage = ensureImage;
+        this.listScenarios = listScenarios;
+    },
+
+    /**
+     * 预热列表的Redis键
+     * @param {string} scenarioId - scenario ID
+     * @returns {string}
+     */
+    poolKey(scenarioId) {
+        return `warm:${scenarioId}`;
+    },
+
+    /**
+     * 启动后台补充（只会启动一次）
+     */
+    async start() {
+        if (this.timer) return;
+        await this.maintain(() => this.reconcile());
+        this.timer = setInterval(() => this.refill(), REFILL_INTERVAL);
+        this.refill();
+    },
+
+    /**
+     * 根据scenario配置计算每个scenario的目标数量，总数不超过全局上限
+     * @returns {Promise<Array<object>>} [{ scenarioId, image, pullPolicy, resources, size }]
+     */
+    async targets() {
+        const targets = [];
+        let total = 0;
+        for (const { id, config } of await this.listScenarios()) {
+            const docker = config.docker || {};
+            const image = docker.image || config.image;
+            const requested = Number(docker.warmPool) || 0;
+            if (!image || requested <= 0) continue;
+
+            const size = Math.min(requested, MAX_TOTAL - total);
+            total += size;
+            targets.push({
+                scenarioId: id,
+                image,
+                pullPolicy: docker.imagePullPolicy,
+                resources: runResources.hostConfig(runResources.fromScenario(config)),
+                size
+            });
+        }
+        return targets;
+    },
+
+    /**
+     * 补充预热池（同一时间只执行一次）
+     * @returns {Promise<void>}
+     */
+    refill() {
+        if (!this.refilling) {
+            this.refilling = this.maintain(() => this.fillAll())
+                .catch(error => console.error(`补充预热池失败: ${error.message}`))
+                .finally(() => { this.refilling = null; });
+        }
+        return this.refilling;
+    },
+
+    /**
+     * 持有预热池的锁执行维护操作，其他副本正在维护时直接跳过
+     * 预热容器只在持有锁时创建，核对时不会误删其他副本正在创建的容器
+     * @param {Function} fn - 异步操作
+     * @returns {Promise<boolean>} 是否执行了操作
+     */
+    maintain(fn) {
+        return distributedLock.ifUnlocked(this.redisClient, POOL_LOCK, fn, { ttl: 60000 });
+    },
+
+    /**
+     * 按目标数量补充或缩减每个scenario的预热条目
+     */
+    async fillAll() {
+        const targets = await this.targets();
+        const wanted = new Map(targets.map(target => [this.poolKey(target.scenarioId), target.size]));
+
+        // 回收已取消预热或缩小了数量的scenario的多余条目
+        for (const key of await this.redisClient.sMembers(POOL_KEYS)) {
+            const size = wanted.get(key) || 0;
+            while (await this.redisClient.lLen(key) > size) {
+                const raw = await this.redisClient.rPop(key);
+                if (!raw) break;
+                await this.destroy(JSON.parse(raw));
+            }
+            if (size === 0) {
+                await this.redisClient.sRem(POOL_KEYS, key);
+            }
+        }
+
+        for (const target of targets) {
+            try {
+                await this.fill(target);
+            } catch (error) {
+                console.error(`为scenario ${target.scenarioId} 补充预热池失败: ${error.message}`);
+            }
+        }
+    },
+
+    /**
+     * 把一个scenario的预热条目补充到目标数量
+     * @param {object} target - { scenarioId, image, pullPolicy, resources, size }
+     */
+    async fill(target) {
+        const key = this.poolKey(target.scenarioId);
+        await this.redisClient.sAdd(POOL_KEYS, key);
+        const { image } = await this.ensureImage(target.image, target.pullPolicy);
+        while (await this.redisClient.lLen(key) < target.size) {
+            const entry = await this.provision(target.scenarioId, image, target.resources);
+            await this.redisClient.rPush(key, JSON.stringify(entry));
+            console.log(`已为scenario ${target.scenarioId} 预热运行容器 ${entry.containerName}`);
+        }
+    },
+
+    /**
+     * 创建一份预热资源：卷、目录结构和未启动的运行容器
+     * @param {string} scenarioId - scenario ID
+     * @param {string} image - 规范化的镜像名称
+     * @param {object} resources - HostConfig中的资源字段
+     * @returns {Promise<object>} { containerId, containerName, volumeName, image, imageId, resources, createdAt }
+     */
+    async provision(scenarioId, image, resources) {
+        const alphaNumeric = image.replace(/[^a-zA-Z0-9\-]/g, '');
+        const containerName = `${alphaNumeric}-${crypto.randomBytes(5).toString('hex')}`;
+        const volumeName = `volume-${containerName}`;
+
+        await this.docker.createVolume({ Name: volumeName, Driver: 'local' });
+        try {
+            const container = await this.docker.createContainer(this.containerConfig({
+                image, containerName, volumeName, scenarioId, resources, pooled: true
+            }));
+            await runWorkspace.stage(container);
+            const info = await container.inspect();
+            return {
+                containerId: info.Id,
+                containerName,
+                volumeName,
+                image,
+                imageId: info.Image,
+                resources,
+                createdAt: new Date().toISOString()
+            };
+        } catch (error) {
+            await this.destroy({ containerName, volumeName });
+            throw error;
+        }
+    },
+
+    /**
+     * 运行容器的创建配置（与 API.startDocker 的配置保持一致）
+     * @param {object} params - { image, containerName, volumeName, scenarioId, username, env, resources, pooled }
+     * @returns {object} createContainer参数
+     */
+    containerConfig({ image, containerName, volumeName, scenarioId, username = '', env, resources, pooled = false }) {
+        const config = {
+            Image: image,
+            name: containerName,
+            Tty: true,
+            Labels: {
+                'workmate.managed': 'true',
+                'workmate.user': username,
+                'workmate.scenario': scenarioId || ''
+            },
+            HostConfig: {
+                Binds: [`${volumeName}:${WORKMATE_PATH}`],
+                NetworkMode: 'host',
+                ...resources
+            }
+        };
+        if (pooled) {
+            config.Labels[POOL_LABEL] = scenarioId;
+        }
+        if (env && env.length > 0) {
+            config.Env = env;
+        }
+        return config;
+    },
+
+    /**
+     * 领取一份预热资源，写入输入并准备好可以直接启动的容器
+     * @param {object} request - { scenarioId, image, inputs, env, resources, username }，image为规范化的镜像名称，resources为HostConfig中的资源字段
+     * @returns {Promise<object|null>} { container, containerName, volumeName }，没有可用条目时返回null
+     */
+    async claim({ scenarioId, image, inputs, env, resources, username }) {
+        const key = this.poolKey(scenarioId);
+        let entry = null;
+        let imageId = null;
+        for (;;) {
+            const raw = await this.redisClient.lPop(key);
+            if (!raw) break;
+            const candidate = JSON.parse(raw);
+            if (candidate.image !== image) {
+                // 请求使用的镜像与预热的镜像不同，放回条目，按常规流程启动
+                await this.redisClient.lPush(key, raw);
+                break;
+            }
+            if (imageId === null) {
+                // 本地镜像的当前ID，镜像更新后旧的预热容器不再使用
+                imageId = (await this.docker.getImage(image).inspect()).Id;
+            }
+            const age = Date.now() - Date.parse(candidate.createdAt);
+            const sameResources = JSON.stringify(candidate.resources || {}) === JSON.stringify(resources || {});
+            if (candidate.imageId === imageId && sameResources && age < MAX_AGE * 1000) {
+                entry = candidate;
+                break;
+            }
+            // 镜像已更新、资源限制已改变或条目过旧
+            this.destroy(candidate);
+        }
+        // 补充被领取或丢弃的条目，不阻塞本次启动
+        this.refill();
+        if (!entry) {
+            return null;
+        }
+
+        try {
+            let container = this.docker.getContainer(entry.containerId);
+            let containerName = entry.containerName;
+            // 确认预热容器仍然存在且未被启动
+            const { State } = await container.inspect();
+            if (State.Status !== 'created') {
+                throw new Error(`预热容器状态为 ${State.Status}`);
+            }
+            if (env && env.length > 0) {
+                // 环境变量只能在创建时指定，在预热的卷上重新创建容器
+                this.docker.getContainer(entry.containerId).remove({ force: true })
+                    .catch(error => console.error(`删除预热容器 ${entry.containerName} 失败: ${error.message}`));
+                containerName = `${entry.containerName}-${crypto.randomBytes(3).toString('hex')}`;
+                container = await this.docker.createContainer(this.containerConfig({
+                    image, containerName, volumeName: entry.volumeName, scenarioId, username, env, resources
+                }));
+            }
+            await runWorkspace.stage(container, { inputs, directories: false });
+            return { container, containerName, volumeName: entry.volumeName };
+        } catch (error) {
+            // 预热容器可能已被外部删除，回退到常规启动
+            console.error(`使用预热条目 ${entry.containerName} 失败: ${error.message}`);
+            this.destroy(entry);
+            return null;
+        }
+    },
+
+    /**
+     * 删除预热资源
+     * @param {object} entry - { containerName, volumeName }
+     */
+    async destroy({ containerName, volumeName }) {
+        try {
+            await this.docker.getContainer(containerName).remove({ force: true });
+        } catch (error) {
+            if (error.statusCode !== 404) {
+                console.error(`删除预热容器 ${containerName} 失败: ${error.message}`);
+            }
+        }
+        try {
+            await this.docker.getVolume(volumeName).remove();
+        } catch (error) {
+            if (error.statusCode !== 404) {
+                console.error(`删除预热卷 ${volumeName} 失败: ${error.message}`);
+            }
+        }
+    },
+
+    /**
+     * 后端启动时核对预热列表：丢弃容器已不存在的条目，删除不在任何列表中的预热容器
+     */
+    async reconcile() {
+        const listed = new Set();
+        for (const key of await this.redisClient.sMembers(POOL_KEYS)) {
+            const entries = (await this.redisClient.lRange(key, 0, -1)).map(raw => JSON.parse(raw));
+            for (const entry of entries) {
+                listed.add(entry.containerId);
+            }
+        }
+
+        const containers = await this.docker.listContainers({
+            all: true,
+            filters: { label: [POOL_LABEL], status: ['created'] }
+        });
+        const existing = new Set(containers.map(item => item.Id));
+
+        for (const key of await this.redisClient.sMembers(POOL_KEYS)) {
+            for (const raw of await this.redisClient.lRange(key, 0, -1)) {
+                if (!existing.has(JSON.parse(raw).containerId)) {
+                    await this.redisClient.lRem(key, 0, raw);
+                }
+            }
+        }
+
+        // 例如后端在预热过程中重启留下的容器
+        for (const item of containers) {
+            if (!listed.has(item.Id)) {
+                const containerName = (item.Names[0] || '').replace(/^\//, '');
+                const volume = (item.Mounts || []).find(mount => mount.Destination === WORKMATE_PATH);
+                await this.destroy({ containerName, volumeName: volume ? volume.Name : `volume-${containerName}` });
+            }
+        }
+    }
+};
+
+module.exports = WarmPool;
@@ -148,6 +148,7 @@ def test_start_docker():
     print_test_header("启动Docker容器")
     
     result = call_api('/docker/start', 'POST', {
+        "wait": True,
         "dockerName": "alpine:latest",
         "username": USER_TEST,
         "options": {
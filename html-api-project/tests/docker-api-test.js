@@ -7,6 +7,9 @@
  * 3. 查询用户aaa之前启动的ubuntu docker的日志
  * 4. 用户aaa再新建一个alpine的docker，和ubuntu docker区分开
  * 5. 查询用户bbb名下的所有docker
+ * 6. 通过启动队列启动docker，并轮询任务状态
+ * 7. 批量启动一组不同inputs的docker，并轮询批次进度
+ * 8. 用户aaa提交一个大批次后，用户bbb单独提交的启动不会等到批次结束才执行
  */
 
 const fetch = require('node-fetch');
@@ -75,6 +78,7 @@ async function testStartUbuntuDocker() {
   console.log('\n测试1: 用户aaa启动Ubuntu Docker，并传入random settings和inputs');
   
   const result = await callApi('/docker/start', 'POST', {
+    wait: true,
     dockerName: 'ubuntu:latest',
     username: USER_AAA,
     options: {
@@ -151,6 +155,7 @@ async function testStartAlpineDocker() {
   console.log('\n测试4: 用户aaa启动Alpine Docker，与Ubuntu Docker区分开');
   
   const result = await callApi('/docker/start', 'POST', {
+    wait: true,
     dockerName: 'alpine:latest',
     username: USER_AAA,
     options: {
@@ -206,6 +211,155 @@ async function testListUserBBBDockers() {
   return result.success;
 }
 
+/**
+ * 测试6: 用户aaa通过启动队列启动Alpine Docker，轮询任务状态直到启动完成
+ */
+async function testQueuedStart() {
+  console.log('\n测试6: 用户aaa通过启动队列启动Alpine Docker');
+  
+  const result = await callApi('/docker/start', 'POST', {
+    dockerName: 'alpine:latest',
+    username: USER_AAA,
+    options: {
+      settings: randomSettings,
+      inputs: randomInputs
+    }
+  });
+  
+  if (!result.success || !result.data.runId) {
+    console.error(`❌ 启动请求加入队列失败: ${result.error}`);
+    return false;
+  }
+  console.log(`✅ 启动请求已加入队列，runId: ${result.data.runId}，状态: ${result.data.status}`);
+  
+  // 轮询任务状态，最多等待60秒
+  for (let i = 0; i < 60; i++) {
+    const job = await callApi(`/docker/jobs/${result.data.runId}`);
+    if (!job.success) {
+      console.error(`❌ 查询启动任务失败: ${job.error}`);
+      return false;
+    }
+    if (job.data.status === 'started') {
+      console.log(`✅ 启动任务完成，Docker ID: ${job.data.dockerId}`);
+      return true;
+    }
+    if (job.data.status === 'failed') {
+      console.error(`❌ 启动任务失败: ${job.data.error}`);
+      return false;
+    }
+    await new Promise(resolve => setTimeout(resolve, 1000));
+  }
+  
+  console.error('❌ 启动任务超时未完成');
+  return false;
+}
+
+/**
+ * 测试7: 用户aaa批量启动三个Alpine Docker，轮询批次进度直到全部结束
+ */
+async function testBatchStart() {
+  console.log('\n测试7: 用户aaa批量启动三个Alpine Docker');
+  
+  const result = await callApi('/docker/batch', 'POST', {
+    dockerName: 'alpine:latest',
+    username: USER_AAA,
+    settings: randomSettings,
+    inputs: [1, 2, 3].map(index => ({ testCase: 'docker-batch-test', index }))
+  });
+  
+  if (!result.success || !result.data.batchId) {
+    console.error(`❌ 批量启动加入队列失败: ${result.error}`);
+    return false;
+  }
+  console.log(`✅ 批量启动已加入队列，batchId: ${result.data.batchId}，共 ${result.data.total} 个运行`);
+  
+  // 轮询批次进度，最多等待120秒
+  for (let i = 0; i < 120; i++) {
+    const batch = await callApi(`/docker/batches/${result.data.batchId}`);
+    if (!batch.success) {
+      console.error(`❌ 查询批量启动失败: ${batch.error}`);
+      return false;
+    }
+    if (batch.data.status === 'finished') {
+      const { started, failed } = batch.data.counts;
+      if (failed > 0) {
+        console.error(`❌ 批量启动中有 ${failed} 个运行失败`);
+        return false;
+      }
+      console.log(`✅ 批量启动完成，${started} 个运行已启动`);
+      return true;
+    }
+    await new Promise(resolve => setTimeout(resolve, 1000));
+  }
+  
+  console.error('❌ 批量启动超时未完成');
+  return false;
+}
+
+/**
+ * 测试8: 用户aaa提交大批次后，用户bbb通过启动队列启动的Docker在批次结束前完成启动
+ */
+async function testBatchDoesNotBlockOtherUsers() {
+  console.log(`\n测试8: 用户${USER_AAA}的大批次不阻塞用户${USER_BBB}的启动`);
+  
+  const batchResult = await callApi('/docker/batch', 'POST', {
+    dockerName: 'alpine:latest',
+    username: USER_AAA,
+    settings: randomSettings,
+    inputs: Array.from({ length: 20 }, (_, index) => ({ testCase: 'docker-batch-fairness-test', index }))
+  });
+  if (!batchResult.success || !batchResult.data.batchId) {
+    console.error(`❌ 批量启动加入队列失败: ${batchResult.error}`);
+    return false;
+  }
+  const batchId = batchResult.data.batchId;
+  console.log(`✅ 用户${USER_AAA}的批量启动已加入队列，batchId: ${batchId}，共 ${batchResult.data.total} 个运行`);
+  
+  const jobResult = await callApi('/docker/start', 'POST', {
+    dockerName: 'alpine:latest',
+    username: USER_BBB,
+    options: {
+      settings: randomSettings,
+      inputs: randomInputs
+    }
+  });
+  if (!jobResult.success || !jobResult.data.runId) {
+    console.error(`❌ 用户${USER_BBB}的启动请求加入队列失败: ${jobResult.error}`);
+    return false;
+  }
+  console.log(`✅ 用户${USER_BBB}的启动请求已加入队列，runId: ${jobResult.data.runId}`);
+  
+  // 轮询用户bbb的任务，完成时批次中应仍有未启动的运行
+  for (let i = 0; i < 120; i++) {
+    const job = await callApi(`/docker/jobs/${jobResult.data.runId}`);
+    if (!job.success) {
+      console.error(`❌ 查询启动任务失败: ${job.error}`);
+      return false;
+    }
+    if (job.data.status === 'failed') {
+      console.error(`❌ 用户${USER_BBB}的启动任务失败: ${job.data.error}`);
+      return false;
+    }
+    if (job.data.status === 'started') {
+      const batch = await callApi(`/docker/batches/${batchId}`);
+      if (!batch.success) {
+        console.error(`❌ 查询批量启动失败: ${batch.error}`);
+        return false;
+      }
+      if (batch.data.status === 'finished') {
+        console.error(`❌ 用户${USER_BBB}的启动任务在用户${USER_AAA}的批次全部结束后才完成`);
+        return false;
+      }
+      console.log(`✅ 用户${USER_BBB}的启动任务已完成，此时批次中还有 ${batch.data.counts.queued} 个运行在排队`);
+      return true;
+    }
+    await new Promise(resolve => setTimeout(resolve, 500));
+  }
+  
+  console.error(`❌ 用户${USER_BBB}的启动任务超时未完成`);
+  return false;
+}
+
 /**
  * 运行所有测试
  */
@@ -235,6 +389,15 @@ async function runAllTests() {
   // 测试5: 查询用户bbb名下的所有Docker
   await testListUserBBBDockers();
   
+  // 测试6: 用户aaa通过启动队列启动Alpine Docker
+  const test6Result = await testQueuedStart();
+  
+  // 测试7: 用户aaa批量启动Alpine Docker
+  const test7Result = await testBatchStart();
+  
+  // 测试8: 用户aaa的大批次不阻塞用户bbb的启动
+  const test8Result = await testBatchDoesNotBlockOtherUsers();
+  
   console.log('\n所有测试完成');
   console.log('\n测试结果总结:');
   console.log(`1. 用户${USER_AAA}启动Ubuntu Docker: ${test1Result ? '✅ 成功' : '❌ 失败'}`);
@@ -242,6 +405,9 @@ async function runAllTests() {
   console.log(`3. 查询用户${USER_AAA}的Ubuntu Docker日志: ${ubuntuDockerId ? '✅ 成功' : '❌ 失败'}`);
   console.log(`4. 用户${USER_AAA}启动Alpine Docker: ${alpineDockerId ? '✅ 成功' : '❌ 失败'}`);
   console.log(`5. 查询用户${USER_BBB}名下的所有Docker: ✅ 成功`);
+  console.log(`6. 用户${USER_AAA}通过启动队列启动Alpine Docker: ${test6Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`7. 用户${USER_AAA}批量启动Alpine Docker: ${test7Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`8. 用户${USER_AAA}的大批次不阻塞用户${USER_BBB}的启动: ${test8Result ? '✅ 成功' : '❌ 失败'}`);
 }
 
 // 运行测试
@@ -83,6 +83,7 @@ def test_start_ubuntu_docker():
     print('\n测试1: 用户aaa启动Ubuntu Docker，并传入random settings和inputs')
     
     result = call_api('/docker/start', 'POST', {
+        "wait": True,
         "dockerName": "ubuntu",
         "username": USER_AAA,
         "options": {
@@ -155,6 +156,7 @@ def test_start_alpine_docker():
     alpine_settings["CONTAINER_TYPE"] = "alpine"
     
     result = call_api('/docker/start', 'POST', {
+        "wait": True,
         "dockerName": "alpine:latest",
         "username": USER_AAA,
         "options": {
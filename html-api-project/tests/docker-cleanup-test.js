@@ -70,6 +70,7 @@ async function testStartTestDocker() {
   console.log('\n测试1: 启动测试用Docker容器');
   
   const result = await callApi('/docker/start', 'POST', {
+    wait: true,
     dockerName: 'alpine:latest',
     username: TEST_USER,
     options: {
@@ -0,0 +1,129 @@
+/**
+ * Docker列表查询性能基准测试脚本
+ *
+ * 测试内容：
+ * 1. 为基准测试用户写入不同数量的运行记录（10、50、100、500、5000条）
+ * 2. 分别以并发数1（逐个inspect）和默认并发数调用API.getUserDockers读取第一页
+ * 3. 输出列表延迟与运行记录数量的关系（第一页只读取一页的记录，延迟不应随记录数量增长）
+ *
+ * 需要能访问Redis和docker-socket-proxy，建议在backend容器中运行：
+ *   docker compose exec backend node tests/docker-list-benchmark.js
+ */
+
+const API = require('../js/api.js');
+const runIndex = require('../js/run-index');
+
+// 基准测试用户
+const BENCH_USER = 'list-benchmark-user';
+
+// 运行记录数量
+const RUN_COUNTS = [10, 50, 100, 500, 5000];
+
+// 每组重复次数
+const REPEAT = 3;
+
+/**
+ * 写入指定数量的运行记录
+ * 记录对应的容器并不存在，inspect会返回404，但每次请求仍完整经过Docker API
+ * @param {number} count - 运行记录数量
+ * @returns {Promise<Array<string>>} 写入的Docker ID列表
+ */
+async function seedRuns(count) {
+  const redisClient = await API.initRedisClient();
+  const dockerIds = [];
+
+  const pipeline = redisClient.multi();
+  const start = Date.now() - count * 1000;
+  for (let i = 0; i < count; i++) {
+    const dockerId = `bench${String(i).padStart(59, '0')}`;
+    const createdAt = new Date(start + i * 1000).toISOString();
+    dockerIds.push(dockerId);
+    pipeline.sAdd(`user:${BENCH_USER}:dockers`, dockerId);
+    pipeline.hSet(`docker:${dockerId}`, {
+      containerId: dockerId,
+      containerName: `bench-${i}`,
+      name: 'alpine:latest',
+      username: BENCH_USER,
+      createdAt,
+      volumeName: `volume-bench-${i}`
+    });
+    runIndex.addCreated(pipeline, dockerId, createdAt, { username: BENCH_USER });
+  }
+  await pipeline.execAsPipeline();
+
+  return dockerIds;
+}
+
+/**
+ * 删除基准测试写入的运行记录
+ * @param {Array<string>} dockerIds - Docker ID列表
+ */
+async function clearRuns(dockerIds) {
+  const redisClient = await API.initRedisClient();
+  const pipeline = redisClient.multi();
+  for (const dockerId of dockerIds) {
+    pipeline.del(`docker:${dockerId}`);
+    pipeline.zRem(runIndex.CREATED_INDEX, dockerId);
+  }
+  pipeline.del(`user:${BENCH_USER}:dockers`);
+  pipeline.del(runIndex.userIndexKey(BENCH_USER));
+  await pipeline.execAsPipeline();
+}
+
+/**
+ * 测量getUserDockers读取第一页的平均耗时
+ * @param {number} concurrency - inspect并发数
+ * @returns {Promise<number>} 平均耗时（毫秒）
+ */
+async function measure(concurrency) {
+  API.config.inspectConcurrency = concurrency;
+  let total = 0;
+
+  for (let i = 0; i < REPEAT; i++) {
+    const start = process.hrtime.bigint();
+    const result = await API.getUserDockers(BENCH_USER);
+    total += Number(process.hrtime.bigint() - start) / 1e6;
+
+    if (!result.success) {
+      throw new Error(`获取Docker列表失败: ${result.error}`);
+    }
+  }
+
+  return total / REPEAT;
+}
+
+/**
+ * 运行基准测试
+ */
+async function runBenchmark() {
+  const defaultConcurrency = API.config.inspectConcurrency;
+  console.log(`开始Docker列表查询基准测试（默认并发数: ${defaultConcurrency}）...`);
+
+  const rows = [];
+  for (const count of RUN_COUNTS) {
+    const dockerIds = await seedRuns(count);
+    try {
+      const sequential = await measure(1);
+      const parallel = await measure(defaultConcurrency);
+      rows.push({ count, sequential, parallel });
+      console.log(`${count} 条记录: 并发1 ${sequential.toFixed(1)}ms, 并发${defaultConcurrency} ${parallel.toFixed(1)}ms`);
+    } finally {
+      await clearRuns(dockerIds);
+    }
+  }
+
+  console.log('\n基准测试结果:');
+  console.log('记录数\t并发1(ms)\t默认并发(ms)\t加速比');
+  for (const row of rows) {
+    console.log(`${row.count}\t${row.sequential.toFixed(1)}\t\t${row.parallel.toFixed(1)}\t\t${(row.sequential / row.parallel).toFixed(2)}x`);
+  }
+}
+
+// 运行基准测试
+runBenchmark()
+  .catch(error => {
+    console.error('基准测试过程中发生错误:', error);
+  })
+  .finally(() => {
+    process.exit(0);
+  });
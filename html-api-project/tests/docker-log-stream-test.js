@@ -0,0 +1,224 @@
+/**
+ * Docker日志流式跟踪API测试脚本
+ *
+ * 测试内容：
+ * 1. 启动一个持续输出日志的测试容器
+ * 2. 通过SSE端点读取日志，验证事件格式和字节偏移量
+ * 3. 使用since参数断点续传，验证只返回新增的字节
+ * 4. 验证无效的since参数被拒绝
+ */
+
+const fetch = require('node-fetch');
+const { promisify } = require('util');
+const sleep = promisify(setTimeout);
+
+// API基础URL
+const API_BASE_URL = 'http://localhost:3000/api';
+
+// 测试用户
+const TEST_USER = 'log-stream-test-user';
+
+// 存储Docker ID
+let testDockerId = null;
+
+/**
+ * 发送API请求
+ * @param {string} endpoint - API端点
+ * @param {string} method - HTTP方法
+ * @param {object} body - 请求体
+ * @returns {Promise<object>} - 响应对象
+ */
+async function callApi(endpoint, method = 'GET', body = null) {
+  const options = {
+    method,
+    headers: {
+      'Content-Type': 'application/json'
+    }
+  };
+
+  if (body) {
+    options.body = JSON.stringify(body);
+  }
+
+  try {
+    const response = await fetch(`${API_BASE_URL}${endpoint}`, options);
+    return await response.json();
+  } catch (error) {
+    console.error(`API请求失败: ${error.message}`);
+    return { success: false, error: error.message };
+  }
+}
+
+/**
+ * 读取SSE日志流，收集指定时间内的事件
+ * @param {string} endpoint - API端点
+ * @param {number} durationMs - 最长读取时间
+ * @returns {Promise<Array>} - 解析后的事件列表
+ */
+async function readEvents(endpoint, durationMs = 5000) {
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), durationMs);
+  const events = [];
+  let buffer = '';
+
+  try {
+    const response = await fetch(`${API_BASE_URL}${endpoint}`, { signal: controller.signal });
+    for await (const chunk of response.body) {
+      buffer += chunk.toString();
+      let index;
+      while ((index = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, index);
+        buffer = buffer.slice(index + 2);
+        if (block.startsWith(':')) continue;
+        const event = { event: 'message' };
+        for (const line of block.split('\n')) {
+          if (line.startsWith('id: ')) event.id = Number(line.slice(4));
+          if (line.startsWith('event: ')) event.event = line.slice(7);
+          if (line.startsWith('data: ')) event.data = JSON.parse(line.slice(6));
+        }
+        events.push(event);
+      }
+    }
+  } catch (error) {
+    if (error.name !== 'AbortError') {
+      throw error;
+    }
+  } finally {
+    clearTimeout(timer);
+  }
+
+  return events;
+}
+
+/**
+ * 测试1: 启动持续输出日志的测试容器
+ */
+async function testStartTestDocker() {
+  console.log('\n测试1: 启动持续输出日志的测试容器');
+
+  const result = await callApi('/docker/start', 'POST', {
+    wait: true,
+    dockerName: 'alpine:latest',
+    username: TEST_USER,
+    options: {
+      settings: { TEST_MODE: 'true' },
+      inputs: JSON.stringify({ testCase: 'docker-log-stream-test' })
+    }
+  });
+
+  if (result.success) {
+    testDockerId = result.data.containerId;
+    console.log(`✅ 测试用Docker容器启动成功，ID: ${testDockerId}`);
+  } else {
+    console.error(`❌ 测试用Docker容器启动失败: ${result.error}`);
+  }
+
+  return result.success;
+}
+
+/**
+ * 测试2: 从头读取日志流
+ */
+async function testStreamFromStart() {
+  console.log('\n测试2: 从头读取日志流');
+
+  const events = await readEvents(`/docker/logs/${testDockerId}/stream`);
+  const openEvent = events.find(event => event.event === 'open');
+  const logEvents = events.filter(event => event.event === 'log');
+
+  if (!openEvent || openEvent.data.offset !== 0) {
+    console.error('❌ 未收到offset为0的open事件');
+    return null;
+  }
+
+  // 偏移量应当单调递增，且等于已推送内容的字节数
+  let received = 0;
+  for (const event of logEvents) {
+    received += Buffer.byteLength(event.data, 'utf8');
+    if (event.id !== received) {
+      console.error(`❌ 事件id ${event.id} 与累计字节数 ${received} 不一致`);
+      return null;
+    }
+  }
+
+  console.log(`✅ 收到 ${logEvents.length} 个log事件，共 ${received} 字节`);
+  return received;
+}
+
+/**
+ * 测试3: 使用since参数断点续传
+ * @param {number} since - 上次读取到的字节偏移量
+ */
+async function testResumeWithSince(since) {
+  console.log(`\n测试3: 从偏移量 ${since} 续传日志流`);
+
+  const events = await readEvents(`/docker/logs/${testDockerId}/stream?since=${since}`, 3000);
+  const openEvent = events.find(event => event.event === 'open');
+  const firstLog = events.find(event => event.event === 'log');
+
+  if (!openEvent || openEvent.data.offset !== since) {
+    console.error('❌ open事件的offset与since参数不一致');
+    return false;
+  }
+
+  if (firstLog && firstLog.id <= since) {
+    console.error(`❌ 续传返回了已读取过的内容，事件id: ${firstLog.id}`);
+    return false;
+  }
+
+  console.log('✅ 续传只返回了since之后的新内容');
+  return true;
+}
+
+/**
+ * 测试4: 无效的since参数
+ */
+async function testInvalidSince() {
+  console.log('\n测试4: 无效的since参数');
+
+  const result = await callApi(`/docker/logs/${testDockerId}/stream?since=-1`);
+
+  if (!result.success) {
+    console.log(`✅ 服务器正确拒绝了无效参数: ${result.error}`);
+    return true;
+  }
+
+  console.error('❌ 服务器未拒绝无效的since参数');
+  return false;
+}
+
+/**
+ * 运行所有测试
+ */
+async function runAllTests() {
+  console.log('开始Docker日志流式跟踪API测试...');
+
+  const test1Result = await testStartTestDocker();
+  if (!test1Result) {
+    console.error('测试1失败，无法继续后续测试');
+    return;
+  }
+
+  // 等待容器产生日志
+  await sleep(3000);
+
+  const received = await testStreamFromStart();
+  const test2Result = received !== null;
+  const test3Result = test2Result ? await testResumeWithSince(received) : false;
+  const test4Result = await testInvalidSince();
+
+  // 清理测试容器
+  await callApi('/docker/state', 'POST', { dockerId: testDockerId, action: 'remove', username: TEST_USER });
+
+  console.log('\n所有测试完成');
+  console.log('\n测试结果总结:');
+  console.log(`1. 启动测试用Docker容器: ${test1Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`2. 从头读取日志流: ${test2Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`3. 使用since参数断点续传: ${test3Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`4. 无效的since参数: ${test4Result ? '✅ 成功' : '❌ 失败'}`);
+}
+
+// 运行测试
+runAllTests().catch(error => {
+  console.error('测试过程中发生错误:', error);
+});
@@ -71,6 +71,7 @@ async function testStartDockerAndDirectoryCreation() {
   console.log('\n测试1: 启动Docker容器并验证目录创建');
   
   const result = await callApi('/docker/start', 'POST', {
+    wait: true,
     dockerName: 'alpine:latest',
     username: TEST_USER,
     options: {
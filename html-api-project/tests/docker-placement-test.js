@@ -0,0 +1,167 @@
+/**
+ * 多主机Docker放置测试脚本
+ *
+ * 启动几个只实现 /containers/json 的替身Docker API服务器，直接测试 docker-hosts 模块：
+ * 1. 解析DOCKER_HOSTS配置
+ * 2. 选择受管容器运行数最少的主机
+ * 3. 保留名额后，并发的放置会避开刚选中的主机
+ * 4. 无法连接的主机不参与选择
+ */
+
+const http = require('http');
+
+// 替身主机上运行中的受管容器数量
+const HOST_LOADS = { alpha: 3, beta: 1, gamma: 2 };
+
+/**
+ * 启动一个替身Docker API服务器
+ * @param {number} runningCount - 返回的运行中受管容器数量
+ * @returns {Promise<object>} { server, port }
+ */
+function startStandIn(runningCount) {
+  const server = http.createServer((req, res) => {
+    if (!/\/containers\/json/.test(req.url)) {
+      res.writeHead(404, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({ message: 'not found' }));
+      return;
+    }
+    const containers = Array.from({ length: runningCount }, (_, index) => ({
+      Id: `container-${index}`,
+      State: 'running',
+      Labels: { 'workmate.managed': 'true' }
+    }));
+    res.writeHead(200, { 'Content-Type': 'application/json' });
+    res.end(JSON.stringify(containers));
+  });
+  return new Promise(resolve => {
+    server.listen(0, '127.0.0.1', () => resolve({ server, port: server.address().port }));
+  });
+}
+
+/**
+ * 测试1: 解析DOCKER_HOSTS配置
+ */
+function testParseHosts(dockerHosts, ports) {
+  console.log('\n测试1: 解析DOCKER_HOSTS配置');
+
+  const names = dockerHosts.names();
+  if (names.join(',') !== 'alpha,beta,gamma,offline' || dockerHosts.primaryName() !== 'alpha') {
+    console.error(`❌ 主机列表不正确: ${names.join(',')}`);
+    return false;
+  }
+  const beta = dockerHosts.hosts.find(entry => entry.name === 'beta');
+  if (beta.host !== '127.0.0.1' || beta.port !== ports.beta) {
+    console.error(`❌ 主机地址解析不正确: ${JSON.stringify(beta)}`);
+    return false;
+  }
+  console.log(`✅ 解析出 ${names.length} 台主机，主主机为 ${dockerHosts.primaryName()}`);
+  return true;
+}
+
+/**
+ * 测试2: 选择运行数最少的主机
+ */
+async function testPlaceLeastLoaded(dockerHosts) {
+  console.log('\n测试2: 选择运行数最少的主机');
+
+  const host = await dockerHosts.place();
+  if (host !== 'beta') {
+    console.error(`❌ 选择了 ${host}，预期为 beta`);
+    return false;
+  }
+  console.log('✅ 选择了运行数最少的主机 beta');
+  return true;
+}
+
+/**
+ * 测试3: 保留名额后并发的放置避开刚选中的主机
+ */
+async function testReservation(dockerHosts) {
+  console.log('\n测试3: 保留名额后并发的放置避开刚选中的主机');
+
+  let release;
+  const launching = dockerHosts.reserve('beta', () => new Promise(resolve => { release = resolve; }));
+  // beta保留两个名额后负载为3，应选择gamma
+  const second = dockerHosts.reserve('beta', () => new Promise(resolve => setTimeout(resolve, 50)));
+  const host = await dockerHosts.place();
+  release();
+  await Promise.all([launching, second]);
+
+  if (host !== 'gamma') {
+    console.error(`❌ 保留名额后选择了 ${host}，预期为 gamma`);
+    return false;
+  }
+  const after = await dockerHosts.place();
+  if (after !== 'beta') {
+    console.error(`❌ 名额释放后选择了 ${after}，预期为 beta`);
+    return false;
+  }
+  console.log('✅ 保留名额计入负载，启动完成后释放');
+  return true;
+}
+
+/**
+ * 测试4: 无法连接的主机不参与选择
+ */
+async function testOfflineHostSkipped(dockerHosts) {
+  console.log('\n测试4: 无法连接的主机不参与选择');
+
+  const loads = await Promise.all(dockerHosts.names().map(name =>
+    dockerHosts.load(name).then(() => 'ok', () => 'offline')));
+  if (loads[3] !== 'offline') {
+    console.error('❌ 离线主机未报告错误');
+    return false;
+  }
+  const host = await dockerHosts.place();
+  if (host === 'offline') {
+    console.error('❌ 选择了离线主机');
+    return false;
+  }
+  console.log(`✅ 跳过离线主机，选择了 ${host}`);
+  return true;
+}
+
+/**
+ * 运行所有测试
+ */
+async function runAllTests() {
+  console.log('开始多主机Docker放置测试...');
+
+  const standIns = {};
+  const ports = {};
+  for (const [name, count] of Object.entries(HOST_LOADS)) {
+    standIns[name] = await startStandIn(count);
+    ports[name] = standIns[name].port;
+  }
+
+  // 离线主机使用一个已关闭的端口
+  const closed = await startStandIn(0);
+  await new Promise(resolve => closed.server.close(resolve));
+
+  process.env.DOCKER_HOSTS = [
+    ...Object.keys(HOST_LOADS).map(name => `${name}=127.0.0.1:${ports[name]}`),
+    `offline=127.0.0.1:${closed.port}`
+  ].join(',');
+  const dockerHosts = require('../js/docker-hosts');
+
+  const test1Result = testParseHosts(dockerHosts, ports);
+  const test2Result = await testPlaceLeastLoaded(dockerHosts);
+  const test3Result = await testReservation(dockerHosts);
+  const test4Result = await testOfflineHostSkipped(dockerHosts);
+
+  for (const { server } of Object.values(standIns)) {
+    server.close();
+  }
+
+  console.log('\n所有测试完成');
+  console.log('\n测试结果总结:');
+  console.log(`1. 解析DOCKER_HOSTS配置: ${test1Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`2. 选择运行数最少的主机: ${test2Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`3. 保留名额: ${test3Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`4. 跳过离线主机: ${test4Result ? '✅ 成功' : '❌ 失败'}`);
+}
+
+// 运行测试
+runAllTests().catch(error => {
+  console.error('测试过程中发生错误:', error);
+});
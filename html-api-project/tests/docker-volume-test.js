@@ -77,6 +77,7 @@ async function testStartDockerWithVolumes() {
   console.log('\n测试1: 启动Docker容器并验证volumes');
   
   const result = await callApi('/docker/start', 'POST', {
+    wait: true,
     dockerName: 'alpine:latest',
     username: TEST_USER,
     options: {
@@ -0,0 +1,98 @@
+/**
+ * Redis命令耗时指标测试脚本
+ *
+ * 测试内容：
+ * 1. 通过API模块的Redis客户端（已接入metrics.instrumentRedis）执行GET，指标中出现command="GET"的样本
+ * 2. 执行MULTI事务，指标中出现command="MULTI"的样本
+ *
+ * 需要能访问Redis，建议在backend容器中运行：
+ *   docker compose exec backend node tests/redis-metrics-test.js
+ */
+
+const API = require('../js/api.js');
+const metrics = require('../js/metrics');
+
+// 测试使用的键
+const TEST_KEY = 'metrics-test:key';
+
+// Redis命令耗时指标名称
+const METRIC_NAME = 'workmate_redis_command_duration_seconds';
+
+/**
+ * 读取某个命令的耗时样本数
+ * @param {string} command - 命令标签
+ * @returns {Promise<number>} 样本数（所有result标签之和）
+ */
+async function sampleCount(command) {
+  const metric = await metrics.register.getSingleMetric(METRIC_NAME).get();
+  return metric.values
+    .filter(sample => sample.metricName === `${METRIC_NAME}_count` && sample.labels.command === command)
+    .reduce((sum, sample) => sum + sample.value, 0);
+}
+
+/**
+ * 测试1: GET命令被计时
+ */
+async function testGetRecorded(redisClient) {
+  console.log('\n测试1: GET命令被计时');
+
+  const before = await sampleCount('GET');
+  await redisClient.get(TEST_KEY);
+  const after = await sampleCount('GET');
+  if (after !== before + 1) {
+    console.error(`❌ GET样本数应增加1，实际从 ${before} 变为 ${after}`);
+    return false;
+  }
+
+  const text = await metrics.collect();
+  if (!text.includes(`${METRIC_NAME}_count{command="GET",result="ok"}`)) {
+    console.error('❌ 指标输出中没有command="GET"的样本');
+    return false;
+  }
+  console.log('✅ GET命令的耗时已记录');
+  return true;
+}
+
+/**
+ * 测试2: MULTI事务按整批计时
+ */
+async function testMultiRecorded(redisClient) {
+  console.log('\n测试2: MULTI事务按整批计时');
+
+  const before = await sampleCount('MULTI');
+  await redisClient.multi()
+    .set(TEST_KEY, 'value')
+    .del(TEST_KEY)
+    .exec();
+  const after = await sampleCount('MULTI');
+  if (after !== before + 1) {
+    console.error(`❌ MULTI样本数应增加1，实际从 ${before} 变为 ${after}`);
+    return false;
+  }
+  console.log('✅ MULTI事务的耗时已记录');
+  return true;
+}
+
+/**
+ * 运行所有测试
+ */
+async function runAllTests() {
+  console.log('开始Redis命令耗时指标测试...');
+
+  const redisClient = await API.initRedisClient();
+
+  const test1Result = await testGetRecorded(redisClient);
+  const test2Result = await testMultiRecorded(redisClient);
+
+  await redisClient.quit();
+
+  console.log('\n所有测试完成');
+  console.log('\n测试结果总结:');
+  console.log(`1. GET命令被计时: ${test1Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`2. MULTI事务按整批计时: ${test2Result ? '✅ 成功' : '❌ 失败'}`);
+}
+
+// 运行测试
+runAllTests().catch(error => {
+  console.error('测试过程中发生错误:', error);
+});
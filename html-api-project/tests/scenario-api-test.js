@@ -4,6 +4,8 @@
  * 测试内容：
  * 1. 测试获取所有scenario列表API
  * 2. 测试获取特定scenario的yaml文件API
+ * 3. 测试获取不存在的scenario
+ * 4. 测试scenario列表的条件请求（ETag / 304）
  */
 
 const fetch = require('node-fetch');
@@ -125,6 +127,36 @@ async function testGetNonExistentScenario() {
   return !result.success; // 这个测试期望失败，所以取反
 }
 
+/**
+ * 测试4: 带If-None-Match请求scenario列表，未变化时应返回304
+ */
+async function testConditionalScenarios() {
+  console.log('\n测试4: scenario列表的条件请求');
+  
+  try {
+    const first = await fetch(`${API_BASE_URL}/scenarios`);
+    const etag = first.headers.get('etag');
+    if (!etag) {
+      console.error('❌ scenario列表响应中没有ETag');
+      return false;
+    }
+    console.log(`ETag: ${etag}`);
+    
+    const second = await fetch(`${API_BASE_URL}/scenarios`, {
+      headers: { 'If-None-Match': etag }
+    });
+    if (second.status === 304) {
+      console.log('✅ scenario目录未变化，服务器返回304');
+      return true;
+    }
+    console.error(`❌ 期望304，实际返回 ${second.status}`);
+    return false;
+  } catch (error) {
+    console.error(`API请求失败: ${error.message}`);
+    return false;
+  }
+}
+
 /**
  * 运行所有测试
  */
@@ -140,11 +172,15 @@ async function runAllTests() {
   // 测试3: 获取不存在的scenario
   const test3Result = await testGetNonExistentScenario();
   
+  // 测试4: scenario列表的条件请求
+  const test4Result = await testConditionalScenarios();
+  
   console.log('\n所有测试完成');
   console.log('\n测试结果总结:');
   console.log(`1. 获取所有scenario列表: ${test1Result ? '✅ 成功' : '❌ 失败'}`);
   console.log(`2. 获取特定scenario的yaml文件: ${test2Result ? '✅ 成功' : '❌ 失败'}`);
   console.log(`3. 获取不存在的scenario: ${test3Result ? '✅ 成功' : '❌ 失败'}`);
+  console.log(`4. scenario列表的条件请求: ${test4Result ? '✅ 成功' : '❌ 失败'}`);
 }
 
 // 运行测试